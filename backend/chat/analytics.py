@@ -0,0 +1,93 @@
+from collections import Counter
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import DailyChatStats, DailyTopicStats, SessionStats
+
+# the admin dashboard is cached under this namespace until the rollups change
+DASHBOARD_KEY = 'analytics:dashboard'
+
+
+def classify(result):
+    """Topic of a message from its retrieval result: the best candidate's FAQ, if any."""
+    if result.candidates:
+        faq = result.candidates[0][1]
+        return faq.id, faq.category
+    return None, ''
+
+
+def _bump(model, lookup, **increments):
+    """Atomically add to counters on the row matching lookup, creating it if needed."""
+    updates = {field: F(field) + n for field, n in increments.items()}
+    if model.objects.filter(**lookup).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **increments)
+    except IntegrityError:
+        # created by a concurrent writer in the meantime
+        model.objects.filter(**lookup).update(**updates)
+
+
+def record_chats(chats):
+    """Fold a batch of logged ChatSession rows into the daily/topic/session rollups."""
+    days = {}
+    topics = Counter()
+    sessions = {}
+    for chat in chats:
+        day = timezone.localdate(chat.timestamp)
+        stats = days.setdefault(day, Counter())
+        stats['messages'] += 1
+        if not chat.topic:
+            stats['unmatched'] += 1
+        else:
+            topics[(day, chat.topic)] += 1
+        seen = sessions.get(chat.session_id)
+        if seen is None:
+            sessions[chat.session_id] = [1, chat.timestamp, chat.timestamp]
+        else:
+            seen[0] += 1
+            seen[1] = min(seen[1], chat.timestamp)
+            seen[2] = max(seen[2], chat.timestamp)
+
+    with transaction.atomic():
+        for session_id, (count, first_seen, last_seen) in sessions.items():
+            updated = SessionStats.objects.filter(session_id=session_id).update(
+                messages=F('messages') + count, last_seen=last_seen
+            )
+            if updated:
+                continue
+            try:
+                with transaction.atomic():
+                    SessionStats.objects.create(
+                        session_id=session_id, messages=count,
+                        first_seen=first_seen, last_seen=last_seen
+                    )
+                days[timezone.localdate(first_seen)]['new_sessions'] += 1
+            except IntegrityError:
+                SessionStats.objects.filter(session_id=session_id).update(
+                    messages=F('messages') + count, last_seen=last_seen
+                )
+
+        for day, stats in days.items():
+            _bump(DailyChatStats, {'date': day}, **stats)
+        for (day, topic), count in topics.items():
+            _bump(DailyTopicStats, {'date': day, 'topic': topic}, count=count)
+    # new chats reach the cached dashboard within CHAT_ANALYTICS['CACHE_TTL'];
+    # touching the cache here would cost every chat write and stop it ever hitting
+
+
+def forget_dashboard():
+    cache.delete(DASHBOARD_KEY)
+
+
+def record_chat(chat):
+    record_chats([chat])
+
+
+def reset_rollups():
+    DailyChatStats.objects.all().delete()
+    DailyTopicStats.objects.all().delete()
+    SessionStats.objects.all().delete()
+    forget_dashboard()
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from faq.text import normalize, terms, words
+
+NAMESPACE = 'answer'
+
+# words that point back into the conversation ("is it free?", "what about those?")
+FOLLOW_UP_WORDS = frozenset("""
+about above also again else he her him it its same she that their them then these they this those
+""".split())
+
+
+def is_follow_up(message):
+    """Whether a message probably leans on the conversation: it refers back, or is
+    too short to stand alone. Errs towards yes."""
+    return len(terms(message)) < 2 or not FOLLOW_UP_WORDS.isdisjoint(words(message))
+
+
+class AnswerCache:
+    """LLM answers with a TTL, kept in the default (two-tier) cache. With Redis
+    behind it every worker shares them and they survive restarts; without it
+    each process keeps its own until it exits.
+
+    Keys cover the normalised message plus the id and content version of every
+    FAQ handed to the model, so an edited FAQ never serves an old answer. Each
+    process tracks the answers it stored, with the FAQ ids behind them so edits
+    and deletes evict them early; past MAX_ENTRIES the least recently used is
+    deleted from the cache too.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        with self._lock:
+            self._entries = OrderedDict()
+            self._by_faq = {}
+            self.hits = 0
+            self.misses = 0
+
+    def clear(self):
+        cache.invalidate_namespace(NAMESPACE)
+        self._reset()
+
+    @property
+    def config(self):
+        return settings.CHAT_ANSWER_CACHE
+
+    def make_key(self, message, relevant_faqs, history=None):
+        """Return the cache key for this question, or None if it shouldn't be cached."""
+        if not self.config['ENABLED']:
+            return None
+        parts = [normalize(message)]
+        parts.extend(f'{faq.id}:{faq.version}' for faq in sorted(relevant_faqs, key=lambda f: f.id))
+        mode = self.config['HISTORY']
+        if history and mode == 'bypass':
+            return None
+        if history and (mode == 'key' or (mode == 'followup' and is_follow_up(message))):
+            parts.append(json.dumps(
+                [(m.get('role'), m.get('content')) for m in history], sort_keys=True
+            ))
+        return hashlib.sha256('\x1e'.join(parts).encode()).hexdigest()
+
+    def _count(self, key, answer):
+        with self._lock:
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+        return answer
+
+    def get(self, key):
+        return self._count(key, cache.get(f'{NAMESPACE}:{key}'))
+
+    async def aget(self, key):
+        return self._count(key, await cache.aget(f'{NAMESPACE}:{key}'))
+
+    def set(self, key, answer, relevant_faqs):
+        cache.set(f'{NAMESPACE}:{key}', answer, timeout=self.config['TTL'])
+        faq_ids = frozenset(faq.id for faq in relevant_faqs)
+        expires = time.monotonic() + self.config['TTL']
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (expires, faq_ids)
+            for faq_id in faq_ids:
+                self._by_faq.setdefault(faq_id, set()).add(key)
+            evicted = []
+            while len(self._entries) > self.config['MAX_ENTRIES']:
+                evicted.append(next(iter(self._entries)))
+                self._drop(evicted[-1])
+        if evicted:
+            cache.delete_many([f'{NAMESPACE}:{key}' for key in evicted])
+
+    def invalidate_faq(self, faq_id):
+        with self._lock:
+            keys = list(self._by_faq.get(faq_id, ()))
+            for key in keys:
+                self._drop(key)
+        cache.delete_many([f'{NAMESPACE}:{key}' for key in keys])
+
+    def _drop(self, key):
+        item = self._entries.pop(key, None)
+        if item is None:
+            return
+        for faq_id in item[1]:
+            keys = self._by_faq.get(faq_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_faq[faq_id]
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': sum(1 for expires, _ in self._entries.values() if expires > now),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+
+answer_cache = AnswerCache()
@@ -0,0 +1,80 @@
+from django.core.cache import cache
+from rest_framework.permissions import BasePermission
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from .models import Profile
+
+# a user's current token version is cached so checking a token costs no query; a role
+# change deletes it from the shared cache, which other processes notice within its LOCAL_TTL
+TOKEN_VERSION_TTL = 60
+
+
+def _version_key(user_id):
+    return f'token_version:{user_id}'
+
+
+def get_token_version(user_id):
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        version = Profile.objects.filter(user_id=user_id).values_list('token_version', flat=True).first()
+        cache.set(_version_key(user_id), version, timeout=TOKEN_VERSION_TTL)
+    return version
+
+
+def forget_token_version(user_id):
+    cache.delete(_version_key(user_id))
+
+
+class RoleRefreshToken(RefreshToken):
+    """Refresh token (and the access tokens made from it) carrying the user's role
+    and token version, so admin checks can be made from the token alone."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        profile = Profile.objects.get(user=user)
+        token['role'] = profile.role
+        token['ver'] = profile.token_version
+        return token
+
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = RoleRefreshToken
+
+
+class RoleTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = RoleRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        current = Profile.objects.filter(user_id=user_id).values_list('token_version', flat=True).first()
+        if current is None or refresh.payload.get('ver') != current:
+            raise InvalidToken('Token was issued before a role change; log in again.')
+        return super().validate(attrs)
+
+
+class IsAdminRole(BasePermission):
+    """Admin-only access, decided from the JWT's role claim without loading the user.
+
+    Tokens whose version is older than the user's (the role changed since) are
+    refused. Requests authenticated some other way (a full User, or a token
+    issued before the claim existed) fall back to the user's Profile.
+    """
+
+    message = 'Forbidden'
+
+    def has_permission(self, request, view):
+        user = request.user
+        if not user or not user.is_authenticated:
+            return False
+        token = request.auth
+        if token is not None and 'role' in token:
+            user_id = token[api_settings.USER_ID_CLAIM]
+            return token['role'] == 'admin' and token.get('ver') == get_token_version(user_id)
+        profile = getattr(user, 'profile', None)
+        if profile is not None:
+            return profile.role == 'admin'
+        return Profile.objects.filter(user_id=user.id, role='admin').exists()
@@ -0,0 +1,244 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from statistics import median
+from django.contrib.auth.models import User
+from django.db import close_old_connections
+from rest_framework.test import APIClient
+from faq.models import KnowledgeBase
+from faq.text import normalize_keywords
+from .analytics import record_chats
+from .models import ChatSession
+from .utils import retrieve_faqs
+
+CATEGORIES = ['Admissions', 'Fees', 'Housing', 'Library', 'IT Support', 'Registration', 'Exams', 'Sports']
+SYLLABLES = ['ka', 'lo', 'mi', 'ten', 'ra', 'su', 'vo', 'ne', 'dal', 'pir', 'gu', 'zo', 'fen', 'tri', 'bo', 'ha']
+FILLER = ['how', 'do', 'i', 'the', 'is', 'what', 'where', 'can', 'my', 'for', 'about', 'please']
+
+SCENARIOS = ('faq_hit', 'llm_miss', 'analytics', 'logs')
+
+
+def make_vocabulary(rng, size):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def seed_faqs(count, rng, batch_size=1000):
+    """Create `count` FAQs with four keywords each from a made-up vocabulary."""
+    vocabulary = make_vocabulary(rng, max(200, count * 2))
+    faqs = []
+    for i in range(count):
+        keywords = rng.sample(vocabulary, 4)
+        faqs.append(KnowledgeBase(
+            category=rng.choice(CATEGORIES),
+            question=f'Question {i} about {" ".join(keywords[:2])}?',
+            answer=f'Answer {i}: ' + ' '.join(rng.choices(vocabulary, k=30)),
+            keywords=', '.join(keywords),
+            normalized_keywords=normalize_keywords(', '.join(keywords)),
+        ))
+    KnowledgeBase.objects.bulk_create(faqs, batch_size=batch_size)
+    return list(KnowledgeBase.objects.values_list('keywords', flat=True))
+
+
+# chat sessions the load scenarios spread their requests over (ids must be random UUIDs)
+LOAD_SESSIONS = [str(uuid.UUID(int=i, version=4)) for i in range(50)]
+
+
+def seed_logs(count, rng, batch_size=1000, sessions=200):
+    """Create `count` chat logs (about a third unmatched) and their analytics rollups."""
+    for start in range(0, count, batch_size):
+        chats = [
+            ChatSession(
+                session_id=f'bench-{rng.randrange(sessions)}',
+                message=f'seeded question {i}',
+                response='seeded answer',
+                topic='' if rng.random() < 0.3 else rng.choice(CATEGORIES),
+            )
+            for i in range(start, min(start + batch_size, count))
+        ]
+        ChatSession.objects.bulk_create(chats)
+        record_chats(chats)
+
+
+def hit_messages(keywords, rng):
+    """Questions that contain two keywords of a random FAQ, so retrieval answers directly."""
+    while True:
+        words = [k.strip() for k in rng.choice(keywords).split(',')]
+        yield ' '.join(rng.sample(FILLER, 3) + rng.sample(words, 2))
+
+
+def miss_messages(rng):
+    """Questions no FAQ matches; each is unique so the answer cache never serves them."""
+    n = 0
+    while True:
+        n += 1
+        yield f'{" ".join(rng.sample(FILLER, 4))} unrelated topic number {n}'
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(name, latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    ms = lambda v: None if v is None else round(v * 1000, 2)
+    return {
+        'scenario': name,
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'max_ms': ms(latencies[-1] if latencies else None),
+    }
+
+
+def run_load(request_fn, total, concurrency):
+    """Call request_fn(client, i) `total` times over `concurrency` threads.
+
+    request_fn returns the response; anything but a 2xx counts as an error.
+    With concurrency 1 it runs on the calling thread (and its connection).
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker():
+        client = APIClient()
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                break
+            started = time.perf_counter()
+            try:
+                ok = 200 <= request_fn(client, i).status_code < 300
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+        if concurrency > 1:
+            close_old_connections()
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        worker()
+    else:
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return latencies, errors[0], time.perf_counter() - started
+
+
+def run_benchmark(scenarios, requests, concurrency, keywords, seed=0):
+    """Run each scenario against the data already in the database; returns one summary per scenario."""
+    rng = random.Random(seed)
+    admin = User.objects.filter(username='bench-admin').first()
+    if admin is None:
+        admin = User.objects.create_user(username='bench-admin', password='bench')
+        admin.profile.role = 'admin'
+        admin.profile.save()
+    hits = hit_messages(keywords, rng)
+    misses = miss_messages(rng)
+    message_lock = threading.Lock()
+
+    def chat(messages):
+        def send(client, i):
+            with message_lock:
+                message = next(messages)
+            return client.post('/api/chat/', {'message': message, 'session_id': LOAD_SESSIONS[i % len(LOAD_SESSIONS)]}, format='json')
+        return send
+
+    def admin_get(path, params=None):
+        def send(client, i):
+            client.force_authenticate(user=admin)
+            return client.get(path, params)
+        return send
+
+    requests_for = {
+        'faq_hit': chat(hits),
+        'llm_miss': chat(misses),
+        'analytics': admin_get('/api/admin/analytics/'),
+        'logs': admin_get('/api/admin/chat-logs/', {'limit': 50}),
+    }
+    # build the retrieval index up front so the first request isn't timed doing it
+    retrieve_faqs('warm up')
+    results = []
+    for name in scenarios:
+        latencies, errors, elapsed = run_load(requests_for[name], requests, concurrency)
+        results.append(summarize(name, latencies, errors, elapsed))
+    return results
+
+
+# run in a fresh interpreter by measure_startup: time importing the server entry point
+# (django.setup plus any warm-up) and the first two requests that follow
+STARTUP_SCRIPT = """
+import json, os, sys, time, uuid
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+from django.conf import settings
+settings.DATABASES['default']['NAME'] = sys.argv[1]
+import core.wsgi
+imported = time.perf_counter()
+from django.test import Client
+from django.test.utils import setup_test_environment
+setup_test_environment()
+client = Client()
+timings = []
+for i in range(2):
+    t = time.perf_counter()
+    res = client.post('/api/chat/', {'message': sys.argv[2], 'session_id': str(uuid.uuid4())}, content_type='application/json')
+    timings.append(time.perf_counter() - t)
+    assert res.status_code == 200, res.status_code
+print(json.dumps({'import': imported - started, 'first': timings[0], 'second': timings[1]}))
+"""
+
+
+def measure_startup(db_name, message, runs=3):
+    """Start `runs` fresh server processes with warm-up off and on, against db_name.
+
+    Reports the median time to import core.wsgi, and to serve the first and
+    second chat requests afterwards (an FAQ hit, so no LLM call). The processes
+    cache in memory, never in Redis.
+    """
+    results = []
+    for warm in (False, True):
+        env = {
+            **os.environ, 'CHAT_WARMUP': str(warm), 'CHAT_LLM_PROVIDER': 'fake',
+            # set, so .env can't fill it in
+            'REDIS_URL': '',
+        }
+        samples = []
+        for _ in range(runs):
+            out = subprocess.run(
+                [sys.executable, '-c', STARTUP_SCRIPT, str(db_name), message],
+                env=env, capture_output=True, text=True, check=True,
+            )
+            samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        ms = lambda key: round(median(s[key] for s in samples) * 1000, 2)
+        results.append({
+            'warmup': 'on' if warm else 'off',
+            'import_ms': ms('import'),
+            'first_request_ms': ms('first'),
+            'second_request_ms': ms('second'),
+        })
+    return results
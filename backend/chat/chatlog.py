@@ -0,0 +1,149 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from .analytics import classify, record_chat, record_chats
+from .memory import aremember_turn
+from .models import ChatSession
+
+logger = logging.getLogger(__name__)
+
+
+def _write(chats):
+    """Insert a batch of ChatSession rows and fold them into the analytics rollups."""
+    with transaction.atomic():
+        ChatSession.objects.bulk_create(chats)
+        record_chats(chats)
+
+
+class ChatLogBuffer:
+    """Queue of unsaved ChatSession rows written by a background thread.
+
+    Rows are flushed with bulk_create once BATCH_SIZE are waiting or
+    FLUSH_INTERVAL seconds have passed. The thread starts with the first row,
+    and whatever is still queued is written when the process exits.
+    """
+
+    def __init__(self):
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def config(self):
+        return settings.CHAT_LOG
+
+    def put(self, chat):
+        """Queue a row; returns False (caller writes it itself) if the queue is full."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(chat)
+            return True
+        except queue.Full:
+            return False
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self._queue is None:
+                self._queue = queue.Queue(maxsize=self.config['MAX_QUEUE'])
+                atexit.register(self.drain)
+            self._thread = threading.Thread(target=self._run, name='chat-log-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, stop = self._collect()
+            if batch:
+                self._flush(batch)
+
+    def _collect(self):
+        """Block for the first row, then gather more until the batch is full or the interval is up."""
+        batch = []
+        item = self._queue.get()
+        if item is None:
+            return batch, True
+        batch.append(item)
+        deadline = time.monotonic() + self.config['FLUSH_INTERVAL']
+        while len(batch) < self.config['BATCH_SIZE']:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _flush(self, batch):
+        close_old_connections()
+        try:
+            _write(batch)
+        except Exception:
+            logger.exception('Bulk insert of %d chat logs failed, retrying one by one', len(batch))
+            for chat in batch:
+                try:
+                    chat.pk = None
+                    _write([chat])
+                except Exception:
+                    logger.exception('Dropped chat log for session %s', chat.session_id)
+
+    def drain(self, timeout=10):
+        """Write everything still queued and stop the writer thread."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def pending(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+
+chat_log_buffer = ChatLogBuffer()
+
+
+def _make_chat(session_id, message, response, result, prompt_tokens, completion_tokens):
+    faq_id, topic = classify(result)
+    return ChatSession(
+        session_id=session_id,
+        message=message,
+        response=response,
+        matched_faq_id=faq_id,
+        topic=topic,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens
+    )
+
+
+def _save(chat):
+    with transaction.atomic():
+        chat.save()
+        record_chat(chat)
+
+
+async def alog_chat(session_id, message, response, result, prompt_tokens=None, completion_tokens=None):
+    """Store one exchange, classified by its retrieval result, and update the
+    analytics rollups and the session's conversation memory.
+
+    With CHAT_LOG['MODE'] = 'buffered' the row is queued for the background
+    writer instead of being inserted before the response goes out. Queuing
+    never blocks; a direct write goes through a thread because the row and
+    its rollups are saved in one transaction.
+    """
+    chat = _make_chat(session_id, message, response, result, prompt_tokens, completion_tokens)
+    if settings.CHAT_LOG['MODE'] != 'buffered' or not chat_log_buffer.put(chat):
+        await sync_to_async(_save)(chat)
+    # memory is updated straight away so the next message sees this turn even if the row is still queued
+    await aremember_turn(session_id, message, response)
+    return chat
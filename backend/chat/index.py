@@ -0,0 +1,235 @@
+import hashlib
+import heapq
+import threading
+from collections import namedtuple
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from faq.models import KnowledgeBase, aget_faq_version, get_faq_version
+from faq.text import normalize_keywords, phrases_in
+from .prompt import estimate_tokens, faq_snippet
+
+# lightweight copy of a KnowledgeBase row, built once per FAQ instead of per request
+# version is a content hash, so anything keyed on it goes stale when the FAQ is edited;
+# snippet is the FAQ pre-rendered for the LLM prompt
+FAQEntry = namedtuple('FAQEntry', [
+    'id', 'category', 'question', 'answer', 'keywords', 'version', 'snippet', 'snippet_tokens',
+])
+
+BACKENDS = {
+    'keyword': 'chat.index.KeywordIndex',
+    'tfidf': 'chat.vectors.VectorIndex',
+}
+
+
+def parse_keywords(normalized):
+    return frozenset(k for k in normalized.split(',') if k)
+
+
+def faq_content_version(faq):
+    content = '\x1f'.join([faq.category, faq.question, faq.answer, faq.keywords])
+    return hashlib.blake2b(content.encode(), digest_size=8).hexdigest()
+
+
+def make_entry(faq):
+    snippet = faq_snippet(faq.question, faq.answer)
+    return FAQEntry(
+        id=faq.pk,
+        category=faq.category,
+        question=faq.question,
+        answer=faq.answer,
+        # unsaved instances (tests, previews) haven't been normalised yet
+        keywords=parse_keywords(faq.normalized_keywords or normalize_keywords(faq.keywords)),
+        version=faq_content_version(faq),
+        snippet=snippet,
+        snippet_tokens=estimate_tokens(snippet),
+    )
+
+
+def top_candidates(scored, top_n):
+    # bounded heap instead of sorting every hit; ties go to the oldest FAQ
+    return heapq.nsmallest(top_n, scored, key=lambda x: (-x[0], x[1].id))
+
+
+class FAQIndex:
+    """Process-wide in-memory copy of the knowledge base, shaped for fast lookups.
+
+    Built lazily from the database on first use. Saves and deletes in this
+    process patch it in place (see chat.models); other processes notice the
+    bumped FAQ version and rebuild on their next lookup.
+
+    Subclasses fill in _add, _discard and _score. search and asearch differ only
+    in how a stale index is reloaded; scoring itself is in-memory either way.
+    """
+
+    # score a candidate needs to be answered directly, unless settings override it
+    default_threshold = None
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.entries = {}
+            self.version = None
+            self._clear()
+
+    def rebuild(self, only_if_stale=False):
+        version = get_faq_version()
+        entries = [make_entry(faq) for faq in KnowledgeBase.objects.all()]
+        self._load(entries, version, only_if_stale)
+
+    async def arebuild(self, only_if_stale=False):
+        version = await aget_faq_version()
+        entries = [make_entry(faq) async for faq in KnowledgeBase.objects.all()]
+        # building can take a while on a big knowledge base; keep it off the event loop
+        await sync_to_async(self._load, thread_sensitive=False)(entries, version, only_if_stale)
+
+    def _load(self, entries, version, only_if_stale=False):
+        with self._build_lock:
+            if only_if_stale and self.version == version:
+                return  # a concurrent rebuild got there first
+            # build aside and swap in, so searches carry on in the meantime
+            built = type(self)()
+            for entry in entries:
+                built.entries[entry.id] = entry
+            built._add_many(entries)
+            state = {name: value for name, value in vars(built).items() if not name.endswith('_lock')}
+            with self._lock:
+                vars(self).update(state)
+                self.version = version
+
+    def ensure_fresh(self):
+        if self.version is None or self.version != get_faq_version():
+            self.rebuild(only_if_stale=True)
+
+    async def aensure_fresh(self):
+        if self.version is None or self.version != await aget_faq_version():
+            await self.arebuild(only_if_stale=True)
+
+    def search(self, message, top_n):
+        """Return up to top_n (score, entry) pairs, best first."""
+        self.ensure_fresh()
+        return self._score(message, top_n)
+
+    async def asearch(self, message, top_n):
+        await self.aensure_fresh()
+        return self._score(message, top_n)
+
+    def upsert(self, faq, version=None):
+        entry = make_entry(faq)
+        with self._lock:
+            self._remove(entry.id)
+            self.entries[entry.id] = entry
+            self._add(entry)
+            self._advance(version)
+
+    def remove(self, faq_id, version=None):
+        with self._lock:
+            self._remove(faq_id)
+            self._advance(version)
+
+    def _remove(self, faq_id):
+        old = self.entries.pop(faq_id, None)
+        if old is not None:
+            self._discard(old)
+
+    def _advance(self, version):
+        # only claim the new version if ours was the change right before it,
+        # otherwise another process edited too and the next lookup rebuilds
+        if version is not None and self.version is not None and version == self.version + 1:
+            self.version = version
+
+    def _clear(self):
+        raise NotImplementedError
+
+    def _add(self, entry):
+        raise NotImplementedError
+
+    def _add_many(self, entries):
+        # a freshly cleared index; backends that can build in bulk override this
+        for entry in entries:
+            self._add(entry)
+
+    def _discard(self, entry):
+        raise NotImplementedError
+
+    def _score(self, message, top_n):
+        raise NotImplementedError
+
+
+class KeywordIndex(FAQIndex):
+    """Inverted index: keyword phrase -> set of FAQ ids. Score is the number of keyword hits.
+
+    Keywords and messages go through the same faq.text normalisation, and a
+    multi-word keyword only counts when its words appear together in order.
+    """
+
+    default_threshold = 2
+
+    def _clear(self):
+        self.postings = {}
+        self.longest = 1
+
+    def _add(self, entry):
+        for keyword in entry.keywords:
+            self.postings.setdefault(keyword, set()).add(entry.id)
+            self.longest = max(self.longest, keyword.count(' ') + 1)
+
+    def _discard(self, entry):
+        for keyword in entry.keywords:
+            ids = self.postings.get(keyword)
+            if ids is not None:
+                ids.discard(entry.id)
+                if not ids:
+                    del self.postings[keyword]
+
+    def _score(self, message, top_n):
+        counts = {}
+        with self._lock:
+            for phrase in phrases_in(message, self.longest):
+                for faq_id in self.postings.get(phrase, ()):
+                    counts[faq_id] = counts.get(faq_id, 0) + 1
+            scored = [(score, self.entries[faq_id]) for faq_id, score in counts.items()]
+        return top_candidates(scored, top_n)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_faq_index(backend=None):
+    """Return the shared index for a retrieval backend (the configured one by default)."""
+    backend = backend or settings.CHAT_RETRIEVAL['BACKEND']
+    index = _indexes.get(backend)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(backend)
+            if index is None:
+                index = import_string(BACKENDS[backend])()
+                _indexes[backend] = index
+    return index
+
+
+def get_match_threshold(index):
+    threshold = settings.CHAT_RETRIEVAL.get('THRESHOLD')
+    return index.default_threshold if threshold is None else threshold
+
+
+def loaded_indexes():
+    return list(_indexes.values())
+
+
+def reset_indexes():
+    for index in loaded_indexes():
+        index.reset()
+
+
+@receiver(setting_changed)
+def retrieval_setting_changed(setting, **kwargs):
+    if setting == 'CHAT_RETRIEVAL':
+        reset_indexes()
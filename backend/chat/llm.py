@@ -0,0 +1,427 @@
+import asyncio
+import random
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from .prompt import estimate_tokens
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMUnavailable(LLMError):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+
+class TransientLLMError(LLMError):
+    """A failure worth retrying (used by the fake provider)."""
+
+
+# worth retrying with any provider; providers add their own in transient_errors
+TRANSIENT_ERRORS = (
+    TransientLLMError,
+    TimeoutError,
+    asyncio.TimeoutError,
+)
+
+# answer text plus the token usage reported by the provider (estimated for the fake one)
+Completion = namedtuple('Completion', ['text', 'prompt_tokens', 'completion_tokens'])
+
+# upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures and lets one trial call
+    through after `reset_after` seconds; a success closes it again."""
+
+    def __init__(self, threshold, reset_after):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.times_opened = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        """'closed' or 'trial' if a call may go ahead, None if not. The trial
+        call must end in record_success, record_failure or release_trial."""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return 'closed'
+            if state == 'half-open' and not self.trial_running:
+                self.trial_running = True
+                return 'trial'
+            return None
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.threshold:
+                if self.opened_at is None or self.trial_running:
+                    self.times_opened += 1
+                self.opened_at = time.monotonic()
+                self.trial_running = False
+
+    def release_trial(self):
+        # the trial was cancelled before it said anything about the upstream;
+        # stay half-open so the next call gets to try
+        with self._lock:
+            self.trial_running = False
+
+
+class GroqProvider:
+    """Groq chat completions over pooled HTTP connections.
+
+    The SDK (a few hundred ms to import) is loaded and the clients created on
+    first use; the SDK's own retries are turned off because the gateway does its own.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._client = None
+        self._async_client = None
+
+    def preload(self):
+        # import the SDK without opening connections, which must not cross a fork
+        import groq  # noqa: F401
+        import httpx  # noqa: F401
+
+    @property
+    def transient_errors(self):
+        import groq
+        return (
+            groq.APIConnectionError,  # includes APITimeoutError
+            groq.RateLimitError,
+            groq.InternalServerError,
+        )
+
+    def _limits(self):
+        import httpx
+        pool = self.config['POOL_SIZE']
+        return httpx.Limits(max_connections=pool, max_keepalive_connections=pool)
+
+    @property
+    def client(self):
+        if self._client is None:
+            import groq
+            import httpx
+            self._client = groq.Groq(
+                api_key=settings.GROQ_API_KEY,
+                max_retries=0,
+                http_client=httpx.Client(limits=self._limits()),
+            )
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            import groq
+            import httpx
+            self._async_client = groq.AsyncGroq(
+                api_key=settings.GROQ_API_KEY,
+                max_retries=0,
+                http_client=httpx.AsyncClient(limits=self._limits()),
+            )
+        return self._async_client
+
+    def _params(self, messages, timeout):
+        return {
+            'model': self.config['MODEL'],
+            'messages': messages,
+            'max_tokens': self.config['MAX_TOKENS'],
+            'temperature': self.config['TEMPERATURE'],
+            'timeout': timeout,
+        }
+
+    def _completion(self, response):
+        usage = response.usage
+        return Completion(
+            response.choices[0].message.content.strip(),
+            usage.prompt_tokens if usage else None,
+            usage.completion_tokens if usage else None,
+        )
+
+    def complete(self, messages, timeout):
+        response = self.client.chat.completions.create(**self._params(messages, timeout))
+        return self._completion(response)
+
+    async def acomplete(self, messages, timeout):
+        response = await self.async_client.chat.completions.create(**self._params(messages, timeout))
+        return self._completion(response)
+
+    async def astream(self, messages, timeout):
+        stream = await self.async_client.chat.completions.create(
+            stream=True, **self._params(messages, timeout)
+        )
+        async for chunk in stream:
+            token = chunk.choices[0].delta.content if chunk.choices else None
+            if token:
+                yield token
+
+
+class FakeProvider:
+    """Offline stand-in for load tests: waits FAKE_LATENCY seconds, fails
+    FAKE_ERROR_RATE of the time, and answers with a canned sentence."""
+
+    def __init__(self, config):
+        self.config = config
+
+    transient_errors = ()
+
+    def preload(self):
+        pass
+
+    def _answer(self, messages):
+        if random.random() < self.config['FAKE_ERROR_RATE']:
+            raise TransientLLMError('fake provider error')
+        text = f"(simulated answer) You asked: {messages[-1]['content']}"
+        prompt_tokens = sum(estimate_tokens(m['content']) for m in messages)
+        return Completion(text, prompt_tokens, estimate_tokens(text))
+
+    def complete(self, messages, timeout):
+        latency = self.config['FAKE_LATENCY']
+        if latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError('fake provider timed out')
+        time.sleep(latency)
+        return self._answer(messages)
+
+    async def acomplete(self, messages, timeout):
+        latency = self.config['FAKE_LATENCY']
+        if latency > timeout:
+            await asyncio.sleep(timeout)
+            raise TimeoutError('fake provider timed out')
+        await asyncio.sleep(latency)
+        return self._answer(messages)
+
+    async def astream(self, messages, timeout):
+        words = (await self.acomplete(messages, timeout)).text.split(' ')
+        for i, word in enumerate(words):
+            yield word if i == 0 else ' ' + word
+
+
+PROVIDERS = {
+    'groq': GroqProvider,
+    'fake': FakeProvider,
+}
+
+
+class LLMGateway:
+    """Single way out to the LLM: deadlines, jittered retries, circuit breaker, metrics.
+
+    TIMEOUT is the deadline for the whole call, retries included. While the
+    breaker is open calls fail immediately with LLMUnavailable so the chat
+    view can fall back without waiting on a dead upstream.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.provider = PROVIDERS[config['PROVIDER']](config)
+        self.breaker = CircuitBreaker(config['BREAKER_THRESHOLD'], config['BREAKER_RESET'])
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = {}
+        self.retries = 0
+        self.short_circuited = 0
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+        self.latency_sum = 0.0
+        self.latency_count = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def _count_tokens(self, completion):
+        with self._lock:
+            self.prompt_tokens += completion.prompt_tokens or 0
+            self.completion_tokens += completion.completion_tokens or 0
+
+    def _observe(self, started, error=None):
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self.latency_sum += elapsed
+            self.latency_count += 1
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if elapsed <= bound:
+                    self.latency_buckets[i] += 1
+            if error is not None:
+                name = type(error).__name__
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def _begin(self):
+        """Return (start time, whether this call is the breaker's half-open trial)."""
+        with self._lock:
+            self.calls += 1
+        admitted = self.breaker.allow()
+        if admitted is None:
+            with self._lock:
+                self.short_circuited += 1
+            raise LLMUnavailable('LLM circuit breaker is open')
+        return time.monotonic(), admitted == 'trial'
+
+    @contextmanager
+    def _releasing(self, trial):
+        # a trial ended by cancellation (CancelledError) or a closed stream
+        # (GeneratorExit) never reaches record_success/record_failure
+        try:
+            yield
+        except BaseException as e:
+            if trial and not isinstance(e, Exception):
+                self.breaker.release_trial()
+            raise
+
+    def _backoff(self, attempt):
+        # full jitter: random delay up to BACKOFF * 2^attempt
+        return random.uniform(0, self.config['BACKOFF'] * (2 ** attempt))
+
+    def _next_attempt(self, error, attempt, deadline):
+        """Return how long to sleep before retrying, or re-raise if we shouldn't."""
+        transient = TRANSIENT_ERRORS + self.provider.transient_errors
+        if not isinstance(error, transient) or attempt >= self.config['MAX_RETRIES']:
+            return None
+        delay = self._backoff(attempt)
+        if time.monotonic() + delay >= deadline:
+            return None
+        with self._lock:
+            self.retries += 1
+        return delay
+
+    def complete(self, messages):
+        started, trial = self._begin()
+        deadline = started + self.config['TIMEOUT']
+        attempt = 0
+        with self._releasing(trial):
+            while True:
+                try:
+                    answer = self.provider.complete(messages, timeout=deadline - time.monotonic())
+                except Exception as e:
+                    delay = self._next_attempt(e, attempt, deadline)
+                    if delay is None:
+                        self.breaker.record_failure()
+                        self._observe(started, e)
+                        raise
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+                self.breaker.record_success()
+                self._observe(started)
+                self._count_tokens(answer)
+                return answer
+
+    async def acomplete(self, messages):
+        started, trial = self._begin()
+        deadline = started + self.config['TIMEOUT']
+        attempt = 0
+        with self._releasing(trial):
+            while True:
+                remaining = deadline - time.monotonic()
+                try:
+                    answer = await asyncio.wait_for(
+                        self.provider.acomplete(messages, timeout=remaining), remaining
+                    )
+                except Exception as e:
+                    delay = self._next_attempt(e, attempt, deadline)
+                    if delay is None:
+                        self.breaker.record_failure()
+                        self._observe(started, e)
+                        raise
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                self.breaker.record_success()
+                self._observe(started)
+                self._count_tokens(answer)
+                return answer
+
+    async def astream(self, messages):
+        """Stream tokens; retries only happen before the first token is sent."""
+        started, trial = self._begin()
+        deadline = started + self.config['TIMEOUT']
+        attempt = 0
+        parts = []
+        with self._releasing(trial):
+            while True:
+                try:
+                    async with asyncio.timeout(deadline - time.monotonic()):
+                        async for token in self.provider.astream(messages, timeout=deadline - time.monotonic()):
+                            parts.append(token)
+                            yield token
+                except Exception as e:
+                    delay = None if parts else self._next_attempt(e, attempt, deadline)
+                    if delay is None:
+                        self.breaker.record_failure()
+                        self._observe(started, e)
+                        raise
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                self.breaker.record_success()
+                self._observe(started)
+                # streams don't report usage, so count them with the local estimate
+                self._count_tokens(Completion(
+                    '', sum(estimate_tokens(m['content']) for m in messages), estimate_tokens(''.join(parts))
+                ))
+                return
+
+    def stats(self):
+        with self._lock:
+            return {
+                'provider': self.config['PROVIDER'],
+                'breaker_state': self.breaker.state,
+                'breaker_opened': self.breaker.times_opened,
+                'calls': self.calls,
+                'retries': self.retries,
+                'short_circuited': self.short_circuited,
+                'errors': dict(self.errors),
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens,
+                'latency_seconds': {
+                    'count': self.latency_count,
+                    'sum': round(self.latency_sum, 6),
+                    'buckets': dict(zip(LATENCY_BUCKETS, self.latency_buckets)),
+                },
+            }
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway(settings.CHAT_LLM)
+    return _gateway
+
+
+def reset_gateway():
+    global _gateway
+    _gateway = None
+
+
+@receiver(setting_changed)
+def llm_setting_changed(setting, **kwargs):
+    if setting in ('CHAT_LLM', 'GROQ_API_KEY'):
+        reset_gateway()
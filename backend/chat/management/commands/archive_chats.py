@@ -0,0 +1,72 @@
+import gzip
+import json
+from datetime import timedelta
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from chat.models import ArchivedChatSession, ChatSession
+
+ARCHIVE_FIELDS = [
+    'id', 'session_id', 'message', 'response', 'timestamp',
+    'matched_faq_id', 'topic', 'prompt_tokens', 'completion_tokens',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Move chat logs older than N days out of the ChatSession table, either into '
+        'the ArchivedChatSession table or into gzipped JSONL files.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help='Archive logs older than this many days.')
+        parser.add_argument('--to', choices=['table', 'jsonl'], default='table')
+        parser.add_argument('--output-dir', default='archive', help='Where JSONL files go (with --to jsonl).')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows would move.')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        old_logs = ChatSession.objects.filter(timestamp__lt=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(f'{old_logs.count()} chat logs older than {cutoff:%Y-%m-%d} would be archived.')
+            return
+
+        out = None
+        if options['to'] == 'jsonl':
+            output_dir = Path(options['output_dir'])
+            output_dir.mkdir(parents=True, exist_ok=True)
+            path = output_dir / f'chat-logs-before-{cutoff:%Y%m%d}-{timezone.now():%Y%m%d%H%M%S}.jsonl.gz'
+            out = gzip.open(path, 'wt', encoding='utf-8')
+
+        moved = 0
+        try:
+            while True:
+                # oldest first, one index range per batch; each batch is copied and deleted atomically
+                batch = list(old_logs.order_by('timestamp', 'id').values(*ARCHIVE_FIELDS)[:options['batch_size']])
+                if not batch:
+                    break
+                with transaction.atomic():
+                    if out is None:
+                        ArchivedChatSession.objects.bulk_create(
+                            [ArchivedChatSession(**row) for row in batch], ignore_conflicts=True
+                        )
+                    else:
+                        for row in batch:
+                            row['timestamp'] = row['timestamp'].isoformat()
+                            out.write(json.dumps(row) + '\n')
+                        # make sure the rows are on disk before they leave the database
+                        out.flush()
+                    ChatSession.objects.filter(id__in=[row['id'] for row in batch]).delete()
+                moved += len(batch)
+                self.stdout.write(f'Archived {moved} chat logs...')
+        finally:
+            if out is not None:
+                out.close()
+
+        where = f'to {path}' if out is not None else 'to the archive table'
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} chat logs older than {cutoff:%Y-%m-%d} {where}.'))
@@ -0,0 +1,111 @@
+import json
+import random
+import tempfile
+from pathlib import Path
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from chat.answer_cache import answer_cache
+from chat.benchmark import SCENARIOS, hit_messages, measure_startup, run_benchmark, seed_faqs, seed_logs
+from chat.chatlog import chat_log_buffer
+from chat.index import reset_indexes
+from core.cache import throwaway_caches
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test the chat pipeline offline: seed a throwaway test database with synthetic '
+        'FAQs and chat logs, answer LLM calls with the fake provider, and report '
+        'p50/p95/p99 latency and throughput per scenario.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--faqs', type=int, default=1000, help='Synthetic knowledge base size.')
+        parser.add_argument('--logs', type=int, default=10000, help='Synthetic chat logs to seed.')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario.')
+        parser.add_argument('--concurrency', type=int, default=1, help='Client threads per scenario.')
+        parser.add_argument('--latency', type=float, default=0.05, help='Fake LLM latency in seconds.')
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f'Comma-separated: {", ".join(SCENARIOS)}.')
+        parser.add_argument('--retrieval', choices=['keyword', 'tfidf'], default=settings.CHAT_RETRIEVAL['BACKEND'])
+        parser.add_argument('--log-mode', choices=['sync', 'buffered'], default=settings.CHAT_LOG['MODE'])
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--startup', type=int, default=0, metavar='RUNS',
+            help='Also start RUNS fresh server processes with warm-up off and on, timing import and first requests.',
+        )
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this file.')
+
+    def handle(self, *args, **options):
+        scenarios = [s.strip() for s in options['scenarios'].split(',') if s.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(sorted(unknown))}')
+
+        overrides = {
+            'CHAT_LLM': {**settings.CHAT_LLM, 'PROVIDER': 'fake', 'FAKE_LATENCY': options['latency'], 'FAKE_ERROR_RATE': 0},
+            'CHAT_RETRIEVAL': {**settings.CHAT_RETRIEVAL, 'BACKEND': options['retrieval']},
+            'CHAT_LOG': {**settings.CHAT_LOG, 'MODE': options['log_mode']},
+            'RATELIMIT_RATES': {route: '1000000000/s' for route in settings.RATELIMIT_RATES},
+            # cleared below, so never the real Redis
+            'CACHES': throwaway_caches(settings.CACHES),
+        }
+
+        # a throwaway database like the test runner's (test_<name> on Postgres); SQLite gets a
+        # temporary file rather than shared-cache memory, which locks whole tables under concurrent writes
+        tmp = tempfile.TemporaryDirectory()
+        if connection.vendor == 'sqlite':
+            connection.settings_dict['TEST']['NAME'] = str(Path(tmp.name) / 'benchmark.sqlite3')
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(**overrides):
+                for cache in caches.all():
+                    cache.clear()
+                reset_indexes()
+                answer_cache.clear()
+                rng = random.Random(options['seed'])
+
+                self.stdout.write(f"Seeding {options['faqs']} FAQs and {options['logs']} chat logs...")
+                keywords = seed_faqs(options['faqs'], rng)
+                seed_logs(options['logs'], rng)
+
+                results = run_benchmark(
+                    scenarios, options['requests'], options['concurrency'], keywords, seed=options['seed']
+                )
+                chat_log_buffer.drain()
+                startup = None
+                if options['startup']:
+                    # the subprocesses open the test database by name; release it first
+                    connection.close()
+                    message = next(hit_messages(keywords, rng))
+                    startup = measure_startup(connection.settings_dict['NAME'], message, options['startup'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            tmp.cleanup()
+
+        self.report(results, startup, options)
+
+    def report(self, results, startup, options):
+        columns = ['scenario', 'requests', 'errors', 'throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms']
+        self.stdout.write(
+            f"\n{options['faqs']} FAQs, {options['logs']} logs, concurrency {options['concurrency']}, "
+            f"fake LLM latency {options['latency']}s, retrieval {options['retrieval']}, logging {options['log_mode']}\n"
+        )
+        self.stdout.write(''.join(f'{c:>15}' for c in columns))
+        for row in results:
+            self.stdout.write(''.join(f'{"-" if row[c] is None else row[c]:>15}' for c in columns))
+        if startup:
+            columns = ['warmup', 'import_ms', 'first_request_ms', 'second_request_ms']
+            self.stdout.write(f"\nFresh process startup, median of {options['startup']} runs\n")
+            self.stdout.write(''.join(f'{c:>19}' for c in columns))
+            for row in startup:
+                self.stdout.write(''.join(f'{row[c]:>19}' for c in columns))
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump({'options': {k: options[k] for k in (
+                    'faqs', 'logs', 'requests', 'concurrency', 'latency', 'retrieval', 'log_mode', 'seed'
+                )}, 'results': results, 'startup': startup}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['json_path']}"))
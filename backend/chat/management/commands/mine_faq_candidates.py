@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from chat.mining import mine_candidates
+
+
+class Command(BaseCommand):
+    help = (
+        'Cluster the questions the LLM answered since the last run into FAQ candidates, '
+        'so admins can turn frequent ones into knowledge base entries.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Messages read and committed at a time.')
+        parser.add_argument('--limit', type=int, help='Process at most this many messages.')
+
+    def handle(self, *args, **options):
+        run = mine_candidates(batch_size=options['batch_size'], limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Clustered {run.messages} messages: {run.created} new candidates, '
+            f'{run.updated} grown (up to chat {run.last_chat_id})'
+        ))
@@ -0,0 +1,73 @@
+import json
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from chat.models import ChatSession
+from chat.replay import parse_config, run_replay
+
+ROWS = [
+    'messages', 'faq_hits', 'hit_rate', 'llm_calls', 'logged_llm_calls',
+    'llm_calls_avoided', 'tokens_avoided', 'retrieval_per_second', 'rows_per_second',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay logged chat messages through the current knowledge base under one or more '
+        'retrieval configurations, and report how many each would answer straight from an '
+        'FAQ, the LLM calls and tokens that would save, and the score distribution.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--config', action='append', dest='configs', metavar='BACKEND[:THRESHOLD]',
+            help='Retrieval setup to replay, e.g. "keyword" or "tfidf:0.3". Repeat to compare '
+                 'side by side. Defaults to the configured backend and threshold.',
+        )
+        parser.add_argument('--since', help='Only messages logged on or after this date (YYYY-MM-DD).')
+        parser.add_argument('--until', help='Only messages logged before this date (YYYY-MM-DD).')
+        parser.add_argument('--limit', type=int, help='Replay at most this many messages.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Scoring processes.')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Messages per unit of work.')
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this file.')
+
+    def handle(self, *args, **options):
+        specs = options['configs']
+        if not specs:
+            retrieval = settings.CHAT_RETRIEVAL
+            threshold = retrieval.get('THRESHOLD')
+            specs = [retrieval['BACKEND'] if threshold is None else f"{retrieval['BACKEND']}:{threshold}"]
+        try:
+            configs = [parse_config(spec) for spec in specs]
+        except ValueError as e:
+            raise CommandError(e)
+
+        logs = ChatSession.objects.all()
+        for option, lookup in (('since', 'timestamp__date__gte'), ('until', 'timestamp__date__lt')):
+            if options[option]:
+                day = parse_date(options[option])
+                if day is None:
+                    raise CommandError(f'--{option} must be a date (YYYY-MM-DD)')
+                logs = logs.filter(**{lookup: day})
+
+        results = run_replay(
+            configs, logs, workers=options['workers'],
+            chunk_size=options['chunk_size'], limit=options['limit'],
+        )
+        self.report(results, options)
+
+    def report(self, results, options):
+        width = max(15, *(len(r['config']) + 2 for r in results))
+        self.stdout.write(f'{"":<22}' + ''.join(f'{r["config"]:>{width}}' for r in results))
+        for row in ROWS:
+            values = ['-' if r[row] is None else r[row] for r in results]
+            self.stdout.write(f'{row:<22}' + ''.join(f'{v:>{width}}' for v in values))
+        self.stdout.write('\nTop score distribution (score: messages)')
+        for r in results:
+            buckets = ', '.join(f'{bucket}: {count}' for bucket, count in r['score_distribution'].items())
+            self.stdout.write(f'  {r["config"]} (threshold {r["threshold"]}): {buckets or "-"}')
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump({'results': results}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['json_path']}"))
@@ -0,0 +1,118 @@
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from .models import ChatSession
+from .prompt import estimate_tokens, truncate_to_tokens
+
+# sessions without an id are shared by every such client, so they get no memory
+ANONYMOUS_SESSION = 'anonymous'
+
+
+def parse_session_id(value):
+    """The session id a chat request sent, or ANONYMOUS_SESSION without one.
+
+    A session's history goes to whoever presents its id, so ids must be random
+    (version 4) UUIDs, as the frontend makes with crypto.randomUUID(); anything
+    else raises ValueError.
+    """
+    if value is None or value == '' or value == ANONYMOUS_SESSION:
+        return ANONYMOUS_SESSION
+    try:
+        parsed = uuid.UUID(str(value))
+    except ValueError:
+        raise ValueError('session_id must be a UUID')
+    if parsed.version != 4:
+        raise ValueError('session_id must be a random (version 4) UUID')
+    return str(parsed)
+
+
+def _key(session_id):
+    return f'chat_memory:{session_id}'
+
+
+def _recent_rows(session_id):
+    return (
+        ChatSession.objects
+        .filter(session_id=session_id)
+        .order_by('-timestamp', '-id')
+        .values_list('message', 'response')[:settings.CHAT_MEMORY['MAX_TURNS']]
+    )
+
+
+def _load(rows):
+    """Rebuild a session's memory from its most recent ChatSession rows (newest first)."""
+    budget = settings.CHAT_MEMORY['HISTORY_TOKENS']
+    turns = [[message, truncate_to_tokens(response, budget // 2)] for message, response in reversed(rows)]
+    memory = {'turns': turns, 'summary': []}
+    _compact(memory)
+    return memory
+
+
+def _turn_tokens(turn):
+    return estimate_tokens(turn[0]) + estimate_tokens(turn[1])
+
+
+def _compact(memory):
+    """Fold the oldest turns into the summary until the rest fit the history budget."""
+    config = settings.CHAT_MEMORY
+    turns = memory['turns']
+    while turns and (
+        len(turns) > config['MAX_TURNS']
+        or sum(_turn_tokens(t) for t in turns) > config['HISTORY_TOKENS']
+    ):
+        question, _ = turns.pop(0)
+        memory['summary'].append(truncate_to_tokens(question, 25))
+    # the summary keeps the most recent earlier questions that fit its own budget
+    summary = memory['summary']
+    while summary and sum(estimate_tokens(s) for s in summary) > config['SUMMARY_TOKENS']:
+        summary.pop(0)
+
+
+async def _aget(session_id):
+    memory = await cache.aget(_key(session_id))
+    if memory is None:
+        memory = _load([row async for row in _recent_rows(session_id)])
+        await cache.aset(_key(session_id), memory, timeout=settings.CHAT_MEMORY['TTL'])
+    return memory
+
+
+async def aget_history(session_id):
+    """Prior turns of a conversation as chat messages, within the configured token budget.
+
+    Older turns that no longer fit are reduced to a one-line summary of what
+    the user asked, sent first as a system message.
+    """
+    if not session_id or session_id == ANONYMOUS_SESSION:
+        return []
+    return _as_messages(await _aget(session_id))
+
+
+def _as_messages(memory):
+    history = []
+    if memory['summary']:
+        history.append({
+            'role': 'system',
+            'content': 'Earlier in this conversation the user asked: ' + '; '.join(memory['summary'])
+        })
+    for question, answer in memory['turns']:
+        history.append({'role': 'user', 'content': question})
+        history.append({'role': 'assistant', 'content': answer})
+    return history
+
+
+async def aremember_turn(session_id, message, response):
+    """Add a finished exchange to the session's cached memory."""
+    if not session_id or session_id == ANONYMOUS_SESSION:
+        return
+    memory = await cache.aget(_key(session_id))
+    if memory is None:
+        # nothing cached yet; the next read rebuilds from the database, which includes this turn
+        return
+    _add_turn(memory, message, response)
+    await cache.aset(_key(session_id), memory, timeout=settings.CHAT_MEMORY['TTL'])
+
+
+def _add_turn(memory, message, response):
+    budget = settings.CHAT_MEMORY['HISTORY_TOKENS']
+    memory['turns'].append([message, truncate_to_tokens(response, budget // 2)])
+    _compact(memory)
@@ -0,0 +1,335 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# upper bounds (seconds) for request and stage timings
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _labels(self.labelnames, labels), value) for labels, value in sorted(self._values.items())]
+
+
+class Histogram:
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def observe(self, value, *labels):
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[0][i] += 1
+                    break
+            counts[1] += value
+            counts[2] += 1
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for labels, (buckets, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, buckets):
+                    cumulative += n
+                    out.append((f'{self.name}_bucket', _labels(self.labelnames, labels, [('le', _number(bound))]), cumulative))
+                out.append((f'{self.name}_bucket', _labels(self.labelnames, labels, [('le', '+Inf')]), count))
+                out.append((f'{self.name}_sum', _labels(self.labelnames, labels), round(total, 6)))
+                out.append((f'{self.name}_count', _labels(self.labelnames, labels), count))
+        return out
+
+
+class Registry:
+    """Metrics kept in this process, rendered in the Prometheus text format.
+
+    Collectors are callables run at scrape time that yield
+    (name, kind, help, samples) for figures other modules already keep.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        self.collectors.append(fn)
+        return fn
+
+    def reset(self):
+        for metric in self.metrics:
+            metric.reset()
+
+    def render(self):
+        families = [(m.name, m.kind, m.help, m.samples()) for m in self.metrics]
+        for collect in self.collectors:
+            families.extend(collect())
+        lines = []
+        for name, kind, help, samples in families:
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(f'{sample}{labels} {_number(value)}' for sample, labels, value in samples)
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Time to produce a response, by route.', ['route', 'method', 'status']
+)
+request_queries = registry.histogram(
+    'http_request_db_queries', 'Database queries per request, by route.', ['route'], buckets=QUERY_BUCKETS
+)
+stage_duration = registry.histogram(
+    'chat_stage_duration_seconds', 'Time spent in each stage of the chat pipeline.', ['stage']
+)
+stage_queries = registry.histogram(
+    'chat_stage_db_queries', 'Database queries per chat pipeline stage.', ['stage'], buckets=QUERY_BUCKETS
+)
+chat_answers = registry.counter(
+    'chat_answers_total', 'Chat replies by where the answer came from (faq, llm or fallback).', ['source']
+)
+chat_errors = registry.counter(
+    'chat_errors_total', 'Chat replies whose LLM answer failed, by endpoint and error type.', ['endpoint', 'error']
+)
+slow_requests = registry.counter('http_slow_requests_total', 'Requests slower than METRICS SLOW_REQUEST.', ['route'])
+
+
+class RequestMetrics:
+    """What one request did: database queries so far and the time spent in each span."""
+
+    def __init__(self):
+        self.queries = 0
+        self.spans = {}
+
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    # on every connection, so queries the async ORM runs on its worker thread count
+    # too: sync_to_async carries the request's context over to that thread
+    current = _current.get()
+    if current is not None:
+        current.queries += 1
+    return execute(sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+@contextmanager
+def span(stage):
+    """Time one stage of the chat pipeline and count the queries it ran."""
+    current = _current.get()
+    queries = current.queries if current is not None else 0
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_duration.observe(elapsed, stage)
+        if current is not None:
+            stage_queries.observe(current.queries - queries, stage)
+            current.spans[stage] = round(current.spans.get(stage, 0) + elapsed, 6)
+
+
+def record_answer(source):
+    chat_answers.inc(source)
+
+
+class MetricsMiddleware:
+    """Times every request, counts its queries, and logs the slow ones with their span breakdown.
+
+    Works in both sync and async stacks; queries are counted by count_query on
+    whichever connection runs them.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        # a connection opened before this module was imported missed the signal
+        install_query_counter(None, connection)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, metrics, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, metrics, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, metrics, elapsed):
+        match = request.resolver_match
+        route = '/' + match.route if match is not None else 'unmatched'
+        request_duration.observe(elapsed, route, request.method, response.status_code)
+        request_queries.observe(metrics.queries, route)
+        if elapsed >= settings.METRICS['SLOW_REQUEST']:
+            slow_requests.inc(route)
+            logger.warning(json.dumps({
+                'event': 'slow_request',
+                'method': request.method,
+                'route': route,
+                'status': response.status_code,
+                'duration_ms': round(elapsed * 1000, 1),
+                'db_queries': metrics.queries,
+                'spans_ms': {stage: round(seconds * 1000, 1) for stage, seconds in metrics.spans.items()},
+            }))
+
+
+# figures the LLM gateway, caches and request coalescing already keep, read at scrape time
+@registry.collector
+def collect_component_stats():
+    from django.core.cache import cache as default_cache
+    from .answer_cache import answer_cache
+    from .chatlog import chat_log_buffer
+    from .llm import get_gateway
+    from .singleflight import llm_flights
+
+    llm = get_gateway().stats()
+    latency = llm['latency_seconds']
+    yield 'llm_calls_total', 'counter', 'Calls made to the LLM gateway.', [('llm_calls_total', '', llm['calls'])]
+    yield 'llm_retries_total', 'counter', 'LLM attempts retried after a transient error.', [('llm_retries_total', '', llm['retries'])]
+    yield 'llm_short_circuited_total', 'counter', 'LLM calls refused while the circuit breaker was open.', [
+        ('llm_short_circuited_total', '', llm['short_circuited'])
+    ]
+    yield 'llm_errors_total', 'counter', 'Failed LLM calls by exception type.', [
+        ('llm_errors_total', _labels(['type'], [name]), count) for name, count in sorted(llm['errors'].items())
+    ]
+    yield 'llm_tokens_total', 'counter', 'Tokens used, by direction.', [
+        ('llm_tokens_total', _labels(['kind'], ['prompt']), llm['prompt_tokens']),
+        ('llm_tokens_total', _labels(['kind'], ['completion']), llm['completion_tokens']),
+    ]
+    yield 'llm_circuit_open', 'gauge', '1 while the LLM circuit breaker is open or half-open.', [
+        ('llm_circuit_open', '', int(llm['breaker_state'] != 'closed'))
+    ]
+    yield 'llm_request_duration_seconds', 'histogram', 'LLM call time including retries.', [
+        *(('llm_request_duration_seconds_bucket', _labels([], [], [('le', _number(bound))]), count)
+          for bound, count in latency['buckets'].items()),
+        ('llm_request_duration_seconds_bucket', '{le="+Inf"}', latency['count']),
+        ('llm_request_duration_seconds_sum', '', latency['sum']),
+        ('llm_request_duration_seconds_count', '', latency['count']),
+    ]
+
+    cache = answer_cache.stats()
+    yield 'chat_answer_cache_lookups_total', 'counter', 'Answer cache lookups by result.', [
+        ('chat_answer_cache_lookups_total', _labels(['result'], ['hit']), cache['hits']),
+        ('chat_answer_cache_lookups_total', _labels(['result'], ['miss']), cache['misses']),
+    ]
+    yield 'chat_answer_cache_hit_ratio', 'gauge', 'Share of answer cache lookups that hit.', [
+        ('chat_answer_cache_hit_ratio', '', round(cache['hit_ratio'], 4))
+    ]
+    yield 'chat_answer_cache_entries', 'gauge', 'Answers currently cached.', [('chat_answer_cache_entries', '', cache['entries'])]
+
+    shared = default_cache.stats()
+    yield 'cache_lookups_total', 'counter', 'Default cache lookups by key namespace and where they were answered.', [
+        ('cache_lookups_total', _labels(['namespace', 'result'], [namespace, result]), counts[field])
+        for namespace, counts in shared.items()
+        for result, field in (('local_hit', 'local_hits'), ('shared_hit', 'shared_hits'), ('miss', 'misses'))
+    ]
+    yield 'cache_local_entries', 'gauge', 'Entries held in this process\'s cache tier, by namespace.', [
+        ('cache_local_entries', _labels(['namespace'], [namespace]), counts['local_entries'])
+        for namespace, counts in shared.items()
+    ]
+
+    flights = llm_flights.stats()
+    yield 'chat_coalesced_requests_total', 'counter', 'Chat requests that shared another request\'s LLM call.', [
+        ('chat_coalesced_requests_total', '', flights['coalesced'])
+    ]
+    yield 'chat_llm_in_flight', 'gauge', 'Distinct LLM calls in progress.', [('chat_llm_in_flight', '', flights['in_flight'])]
+    yield 'chat_log_queue_pending', 'gauge', 'Chat logs waiting for the background writer.', [
+        ('chat_log_queue_pending', '', chat_log_buffer.pending())
+    ]
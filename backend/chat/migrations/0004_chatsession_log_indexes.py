@@ -0,0 +1,22 @@
+# Generated by Django 6.0.2 on 2026-10-17 22:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_analytics_rollups'),
+        ('faq', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['timestamp', 'id'], name='chat_log_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['session_id', 'timestamp', 'id'], name='chat_log_session_time_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.2 on 2026-10-17 22:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_chatsession_token_usage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedChatSession',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('session_id', models.CharField(max_length=100)),
+                ('message', models.TextField()),
+                ('response', models.TextField()),
+                ('timestamp', models.DateTimeField()),
+                ('matched_faq_id', models.BigIntegerField(blank=True, null=True)),
+                ('topic', models.CharField(blank=True, max_length=100)),
+                ('prompt_tokens', models.PositiveIntegerField(blank=True, null=True)),
+                ('completion_tokens', models.PositiveIntegerField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['timestamp', 'id'], name='chat_archive_time_idx'), models.Index(fields=['session_id', 'timestamp'], name='chat_archive_session_idx')],
+            },
+        ),
+    ]
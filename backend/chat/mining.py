@@ -0,0 +1,204 @@
+import hashlib
+from collections import Counter
+from datetime import timedelta
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from faq.models import CandidateMiningRun, FAQCandidate
+from faq.text import terms
+from .models import ChatSession
+from .utils import retrieve_faqs
+
+# MinHash: NUM_PERM hashes per message, split into BANDS bands for locality-sensitive
+# hashing. Two messages share a band (and get compared) with high probability once
+# their term sets' Jaccard similarity passes about (1 / BANDS) ** (1 / ROWS) = 0.5.
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+MERSENNE = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+# fixed, so signatures stored by earlier runs stay comparable
+_rng = np.random.RandomState(1)
+PERM_A = _rng.randint(1, (1 << 61) - 1, size=NUM_PERM, dtype=np.uint64)
+PERM_B = _rng.randint(0, (1 << 61) - 1, size=NUM_PERM, dtype=np.uint64)
+
+KEYWORDS = 5      # terms proposed as keywords
+TERMS_KEPT = 20   # per-candidate term counts kept for choosing keywords later
+
+
+def _term_hash(term):
+    return int.from_bytes(hashlib.blake2b(term.encode(), digest_size=4).digest(), 'little')
+
+
+def minhash(term_set):
+    """MinHash signature (NUM_PERM uint32s) of a set of terms."""
+    hashes = np.array([_term_hash(t) for t in term_set], dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        permuted = np.bitwise_and((PERM_A[:, None] * hashes[None, :] + PERM_B[:, None]) % MERSENNE, MAX_HASH)
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of the term sets behind two signatures."""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def cluster_key(cluster):
+    # unsaved model instances aren't hashable
+    return id(cluster) if isinstance(cluster, FAQCandidate) else cluster
+
+
+class ClusterIndex:
+    """LSH buckets over cluster signatures. A cluster is either the pk of a stored
+    candidate (only its signature is loaded) or a candidate created in this run."""
+
+    def __init__(self):
+        self.buckets = {}
+
+    def _keys(self, signature):
+        return [(band, signature[band * ROWS:(band + 1) * ROWS].tobytes()) for band in range(BANDS)]
+
+    def add(self, signature, cluster):
+        for key in self._keys(signature):
+            self.buckets.setdefault(key, []).append((signature, cluster))
+
+    def closest(self, signature, threshold):
+        best, best_score = None, threshold
+        seen = set()
+        for key in self._keys(signature):
+            for other, cluster in self.buckets.get(key, ()):
+                if cluster_key(cluster) in seen:
+                    continue
+                seen.add(cluster_key(cluster))
+                score = similarity(signature, other)
+                if score >= best_score:
+                    best, best_score = cluster, score
+        return best
+
+
+def _keywords(term_counts):
+    return ', '.join(term for term, _ in Counter(term_counts).most_common(KEYWORDS))
+
+
+def _trim(term_counts):
+    return dict(Counter(term_counts).most_common(TERMS_KEPT))
+
+
+def _grow(candidate, members):
+    """Fold (message, timestamp, term_set) members into a candidate."""
+    config = settings.FAQ_MINING
+    term_counts = Counter(candidate.term_counts)
+    for message, timestamp, term_set in members:
+        candidate.count += 1
+        term_counts.update(term_set)
+        if timestamp > candidate.last_seen:
+            candidate.last_seen = timestamp
+        if len(candidate.samples) < config['SAMPLES'] and message not in candidate.samples and message != candidate.question:
+            candidate.samples.append(message)
+    candidate.term_counts = _trim(term_counts)
+    candidate.keywords = _keywords(candidate.term_counts)
+
+
+def _new_candidate(chat, term_set, signature, candidates):
+    # the closest existing FAQ, even below the answer threshold, suggests a category
+    term_counts = _trim(Counter(term_set))
+    return FAQCandidate(
+        question=chat.message,
+        answer=chat.response,
+        keywords=_keywords(term_counts),
+        category=candidates[0][1].category if candidates else '',
+        term_counts=term_counts,
+        signature=signature.tobytes(),
+        first_seen=chat.timestamp,
+        last_seen=chat.timestamp,
+    )
+
+
+def llm_answered(after_id, before_id=None):
+    """Logged messages between after_id and before_id that the LLM answered (cached answers included)."""
+    chats = ChatSession.objects.filter(id__gt=after_id, prompt_tokens__isnull=False)
+    if before_id is not None:
+        chats = chats.filter(id__lt=before_id)
+    return chats
+
+
+def settled_before(after_id):
+    """Id of the first message after after_id logged within FAQ_MINING['LAG'], or None.
+
+    Rows with lower ids may not be committed yet, so a run stops there."""
+    cutoff = timezone.now() - timedelta(seconds=settings.FAQ_MINING['LAG'])
+    return (ChatSession.objects.filter(id__gt=after_id, timestamp__gt=cutoff)
+            .order_by('id').values_list('id', flat=True).first())
+
+
+def mine_candidates(batch_size=1000, limit=None):
+    """Cluster the LLM-answered messages logged since the last run into FAQCandidates.
+
+    Each message joins the most similar existing cluster (new or from earlier
+    runs) if its estimated similarity reaches FAQ_MINING['SIMILARITY'], otherwise
+    it starts a cluster of its own. Messages an FAQ now answers are skipped.
+    Progress is committed per batch, so an interrupted run resumes where it stopped.
+    Messages logged within FAQ_MINING['LAG'] are left for the next run.
+    """
+    threshold = settings.FAQ_MINING['SIMILARITY']
+    start = CandidateMiningRun.objects.order_by('-id').values_list('last_chat_id', flat=True).first() or 0
+    run = CandidateMiningRun.objects.create(last_chat_id=start)
+    before = settled_before(start)
+
+    index = ClusterIndex()
+    for pk, signature in FAQCandidate.objects.values_list('id', 'signature').iterator():
+        index.add(np.frombuffer(bytes(signature), dtype=np.uint32), pk)
+
+    created = set()
+    updated = set()
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = batch_size if remaining is None else min(batch_size, remaining)
+        chats = list(llm_answered(run.last_chat_id, before).order_by('id')[:size])
+        if not chats:
+            break
+        if remaining is not None:
+            remaining -= len(chats)
+
+        new = []
+        grown = {}   # cluster_key -> (cluster, members from this batch)
+        for chat in chats:
+            term_set = set(terms(chat.message))
+            if not term_set:
+                continue
+            result = retrieve_faqs(chat.message, top_n=1)
+            if result.best is not None:
+                continue
+            signature = minhash(term_set)
+            cluster = index.closest(signature, threshold)
+            if cluster is None:
+                cluster = _new_candidate(chat, term_set, signature, result.candidates)
+                index.add(signature, cluster)
+                new.append(cluster)
+            else:
+                grown.setdefault(cluster_key(cluster), (cluster, []))[1].append(
+                    (chat.message, chat.timestamp, term_set)
+                )
+            run.messages += 1
+
+        with transaction.atomic():
+            for candidate in new:
+                _grow(candidate, grown.pop(id(candidate), (None, []))[1])
+            FAQCandidate.objects.bulk_create(new)
+            stored = FAQCandidate.objects.in_bulk([c for c, _ in grown.values() if not isinstance(c, FAQCandidate)])
+            changed = []
+            for cluster, members in grown.values():
+                candidate = cluster if isinstance(cluster, FAQCandidate) else stored.get(cluster)
+                if candidate is None:
+                    continue  # deleted meanwhile
+                _grow(candidate, members)
+                changed.append(candidate)
+                if candidate.pk not in created:
+                    updated.add(candidate.pk)
+            FAQCandidate.objects.bulk_update(changed, ['count', 'samples', 'term_counts', 'keywords', 'last_seen'])
+            created.update(c.pk for c in new)
+            run.last_chat_id = chats[-1].id
+            run.created, run.updated = len(created), len(updated)
+            run.save()
+    return run
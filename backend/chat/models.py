@@ -1,17 +1,98 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
+from faq.models import KnowledgeBase, faqs_bulk_changed, get_faq_version
+from .index import loaded_indexes
+from .answer_cache import answer_cache
 
 class ChatSession(models.Model):
     session_id = models.CharField(max_length=100)
     message = models.TextField()
     response = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
+    # classified once when the message is logged, so analytics never re-match old messages
+    matched_faq = models.ForeignKey(KnowledgeBase, null=True, blank=True, on_delete=models.SET_NULL)
+    topic = models.CharField(max_length=100, blank=True)  # '' = unmatched
+    # LLM usage for this message; null when answered straight from an FAQ
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+    completion_tokens = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # keyset pagination / export of the chat log, optionally per session
+            models.Index(fields=['timestamp', 'id'], name='chat_log_time_idx'),
+            models.Index(fields=['session_id', 'timestamp', 'id'], name='chat_log_session_time_idx'),
+        ]
 
     def __str__(self):
         return f"{self.session_id} - {self.timestamp}"
 
+# cold storage for old chat logs, filled by `manage.py archive_chats` to keep ChatSession small.
+# Rows keep their original id; the analytics rollups already include them and
+# `backfill_analytics` rebuilds from both tables.
+class ArchivedChatSession(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    session_id = models.CharField(max_length=100)
+    message = models.TextField()
+    response = models.TextField()
+    timestamp = models.DateTimeField()
+    matched_faq_id = models.BigIntegerField(null=True, blank=True)
+    topic = models.CharField(max_length=100, blank=True)
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+    completion_tokens = models.PositiveIntegerField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='chat_archive_time_idx'),
+            models.Index(fields=['session_id', 'timestamp'], name='chat_archive_session_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.session_id} - {self.timestamp} (archived)"
+
+# analytics rollups, kept up to date by chat.analytics as messages are logged
+class DailyChatStats(models.Model):
+    date = models.DateField(unique=True)
+    messages = models.PositiveIntegerField(default=0)
+    new_sessions = models.PositiveIntegerField(default=0)
+    unmatched = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.date} - {self.messages} messages"
+
+class DailyTopicStats(models.Model):
+    date = models.DateField()
+    topic = models.CharField(max_length=100)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'topic'], name='unique_daily_topic'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.topic}: {self.count}"
+
+class SessionStats(models.Model):
+    session_id = models.CharField(max_length=100, unique=True)
+    messages = models.PositiveIntegerField(default=0, db_index=True)
+    first_seen = models.DateTimeField()
+    last_seen = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.session_id} - {self.messages} messages"
+
+# shared counters for chat.ratelimit when RATELIMIT_BACKEND = 'database'
+class RateLimitCounter(models.Model):
+    key = models.CharField(max_length=200, unique=True)
+    count = models.PositiveIntegerField(default=0)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.key} = {self.count}"
+
 # profile to add role to user  
 class Profile(models.Model):
     ROLE_CHOICES = [
@@ -21,6 +102,8 @@ class Profile(models.Model):
     ]
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='student')
+    # part of every issued JWT; bumping it invalidates the user's existing tokens
+    token_version = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"{self.user.username} - {self.role}"
@@ -30,4 +113,44 @@ class Profile(models.Model):
 def create_profile(sender, instance, created, **kwargs):
     if created:
         role = 'admin' if instance.is_superuser else 'student'
-        Profile.objects.create(user=instance, role=role)
\ No newline at end of file
+        Profile.objects.create(user=instance, role=role)
+
+# a role change revokes tokens that carry the old role
+@receiver(pre_save, sender=Profile)
+def bump_token_version(sender, instance, **kwargs):
+    if instance.pk is None:
+        return
+    old_role = Profile.objects.filter(pk=instance.pk).values_list('role', flat=True).first()
+    if old_role is not None and old_role != instance.role:
+        instance.token_version += 1
+        from .auth import forget_token_version
+        user_id = instance.user_id
+        transaction.on_commit(lambda: forget_token_version(user_id))
+
+# keep the in-memory FAQ indexes in step with admin edits, without a full reload,
+# and drop cached LLM answers that were built from the old FAQ
+@receiver(post_save, sender=KnowledgeBase)
+def index_faq(sender, instance, **kwargs):
+    def patch():
+        version = get_faq_version()
+        for index in loaded_indexes():
+            index.upsert(instance, version=version)
+        answer_cache.invalidate_faq(instance.pk)
+    transaction.on_commit(patch)
+
+@receiver(post_delete, sender=KnowledgeBase)
+def unindex_faq(sender, instance, **kwargs):
+    faq_id = instance.pk
+    def patch():
+        version = get_faq_version()
+        for index in loaded_indexes():
+            index.remove(faq_id, version=version)
+        answer_cache.invalidate_faq(faq_id)
+    transaction.on_commit(patch)
+
+# a bulk import rebuilds each loaded index once rather than patching it row by row
+@receiver(faqs_bulk_changed)
+def reindex_faqs(sender, **kwargs):
+    for index in loaded_indexes():
+        index.rebuild()
+    answer_cache.clear()
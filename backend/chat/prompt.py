@@ -0,0 +1,95 @@
+import math
+import re
+from collections import namedtuple
+from django.conf import settings
+
+# words, numbers and individual punctuation marks - roughly how BPE tokenizers split English
+TOKEN_PIECES_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text):
+    """Cheap local approximation of an LLM token count.
+
+    Long words are usually split into several tokens, so count one token per
+    4 characters of each word piece (at least one).
+    """
+    return sum(math.ceil(len(piece) / 4) for piece in TOKEN_PIECES_RE.findall(text))
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text down to about max_tokens, on a word boundary."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    used = 0
+    for match in TOKEN_PIECES_RE.finditer(text):
+        used += math.ceil(len(match.group()) / 4)
+        if used > max_tokens:
+            return text[:match.start()].rstrip() + '...'
+    return text
+
+
+# static part of every prompt, built once at import instead of per request
+SYSTEM_PROMPT = """You are GSU SmartAssist, an intelligent chatbot for Gwanda State University (GSU) in Zimbabwe.
+You help students, staff, and prospective applicants with questions about admissions, programmes, fees,
+academic calendar, library services, ICT support, and general university enquiries.
+Be friendly, concise, and professional. If you don't know something specific about GSU,
+say so honestly and suggest they contact the university directly."""
+SYSTEM_PROMPT_TOKENS = estimate_tokens(SYSTEM_PROMPT)
+
+FAQ_CONTEXT_HEADER = "Here is some relevant information from the GSU knowledge base:"
+
+
+def faq_snippet(question, answer):
+    return f"Q: {question}\nA: {answer}"
+
+
+Prompt = namedtuple('Prompt', ['messages', 'tokens'])
+
+
+def render_faq_context(relevant_faqs, budget):
+    """Join the FAQs' prebuilt snippets, best first, within `budget` tokens.
+
+    The first FAQ that doesn't fit has its answer cut short; anything after it is dropped.
+    """
+    parts = []
+    used = estimate_tokens(FAQ_CONTEXT_HEADER)
+    for faq in relevant_faqs:
+        if used + faq.snippet_tokens <= budget:
+            parts.append(faq.snippet)
+            used += faq.snippet_tokens
+            continue
+        room = budget - used - estimate_tokens(faq.question) - 4
+        if room > 10:
+            snippet = faq_snippet(faq.question, truncate_to_tokens(faq.answer, room))
+            parts.append(snippet)
+            used += estimate_tokens(snippet)
+        break
+    if not parts:
+        return '', 0
+    return '\n\n'.join([FAQ_CONTEXT_HEADER] + parts), used
+
+
+def build_prompt(user_message, relevant_faqs, history=None):
+    """Assemble the chat messages for the LLM and estimate their token count."""
+    system_prompt = SYSTEM_PROMPT
+    tokens = SYSTEM_PROMPT_TOKENS
+    if relevant_faqs:
+        context, context_tokens = render_faq_context(
+            relevant_faqs, settings.CHAT_PROMPT['FAQ_CONTEXT_TOKENS']
+        )
+        if context:
+            system_prompt = f"{SYSTEM_PROMPT}\n\n{context}"
+            tokens += context_tokens
+
+    messages = [{"role": "system", "content": system_prompt}]
+
+    # conversation history, already trimmed to its token budget by chat.memory
+    for msg in history or []:
+        messages.append({"role": msg['role'], "content": msg['content']})
+        tokens += estimate_tokens(msg['content'])
+
+    messages.append({"role": "user", "content": user_message})
+    tokens += estimate_tokens(user_message)
+    # a few tokens of chat formatting per message
+    tokens += 4 * len(messages)
+    return Prompt(messages=messages, tokens=tokens)
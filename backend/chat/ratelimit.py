@@ -0,0 +1,152 @@
+import math
+import time
+from datetime import timedelta
+from collections import namedtuple
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import RateLimitCounter
+
+RateLimitResult = namedtuple('RateLimitResult', ['limited', 'limit', 'remaining', 'reset', 'retry_after'])
+
+PERIODS = {'s': 1, 'sec': 1, 'second': 1, 'm': 60, 'min': 60, 'minute': 60,
+           'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+def parse_rate(rate):
+    """'10/min' -> (10, 60)."""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period]
+
+
+class CacheBackend:
+    """Counters in a Django cache using atomic add + incr.
+
+    Point RATELIMIT_USE_CACHE at a Redis cache to share limits between workers;
+    LocMemCache works as a per-process stand-in.
+    """
+
+    def __init__(self):
+        self.cache = caches[settings.RATELIMIT_USE_CACHE]
+
+    async def aincr(self, key, ttl):
+        await self.cache.aadd(key, 0, timeout=ttl)
+        try:
+            return await self.cache.aincr(key)
+        except ValueError:
+            # expired between add and incr
+            await self.cache.aadd(key, 1, timeout=ttl)
+            return 1
+
+    async def adecr(self, key):
+        try:
+            await self.cache.adecr(key)
+        except ValueError:
+            pass
+
+    async def aget(self, key):
+        return await self.cache.aget(key, 0)
+
+
+class DatabaseBackend:
+    """Counters in the RateLimitCounter table, incremented with UPDATE ... SET count = count + 1."""
+
+    def incr(self, key, ttl):
+        now = timezone.now()
+        if not RateLimitCounter.objects.filter(key=key).update(count=F('count') + 1):
+            try:
+                with transaction.atomic():
+                    RateLimitCounter.objects.create(
+                        key=key, count=1, expires_at=now + timedelta(seconds=ttl)
+                    )
+            except IntegrityError:
+                # another worker created it first
+                RateLimitCounter.objects.filter(key=key).update(count=F('count') + 1)
+            # the new window is the natural point to sweep out old ones
+            RateLimitCounter.objects.filter(expires_at__lt=now).delete()
+        return RateLimitCounter.objects.filter(key=key).values_list('count', flat=True).first() or 0
+
+    async def aincr(self, key, ttl):
+        # creating a counter needs an atomic block, which the async ORM doesn't offer
+        return await sync_to_async(self.incr)(key, ttl)
+
+    async def adecr(self, key):
+        await RateLimitCounter.objects.filter(key=key, count__gt=0).aupdate(count=F('count') - 1)
+
+    async def aget(self, key):
+        return await RateLimitCounter.objects.filter(key=key).values_list('count', flat=True).afirst() or 0
+
+
+BACKENDS = {
+    'cache': CacheBackend,
+    'database': DatabaseBackend,
+}
+
+
+async def acheck_rate_limit(route, ident, now=None):
+    """Count a request against `route`'s limit for `ident` (usually the client IP).
+
+    Sliding window counter: the current fixed window's count plus the previous
+    window's count weighted by how much of it still overlaps the sliding
+    window. Rejected requests are not counted.
+    """
+    window = _Window(route, ident, now)
+    backend = BACKENDS[settings.RATELIMIT_BACKEND]()
+    count = await backend.aincr(window.current_key, ttl=window.length * 2)
+    previous = await backend.aget(window.previous_key)
+    result = window.decide(count, previous)
+    if result.limited:
+        await backend.adecr(window.current_key)
+    return result
+
+
+class _Window:
+    """The fixed window `now` falls in for a route and client, and the one before it."""
+
+    def __init__(self, route, ident, now=None):
+        self.limit, self.length = parse_rate(settings.RATELIMIT_RATES[route])
+        now = time.time() if now is None else now
+        current = int(now // self.length)
+        self.elapsed = now - current * self.length
+        prefix = f'rl:{route}:{ident}'
+        self.current_key = f'{prefix}:{current}'
+        self.previous_key = f'{prefix}:{current - 1}'
+
+    def decide(self, count, previous):
+        """Rate limit result for `count` requests in this window and `previous` in the last.
+
+        When limited, the caller takes this request back out of the count.
+        """
+        limit, window, elapsed = self.limit, self.length, self.elapsed
+        weight = 1 - elapsed / window
+        used = previous * weight + count
+        if used <= limit:
+            remaining = max(0, int(limit - used))
+            reset = max(1, math.ceil(window - elapsed))
+            return RateLimitResult(False, limit, remaining, reset, None)
+
+        # the retried request counts too, so it needs room for one more
+        count -= 1
+        if count >= limit:
+            # not before the next window, once enough of this one has slid out
+            retry_after = window - elapsed + window * (1 - (limit - 1) / count)
+        else:
+            # wait until enough of the previous window has slid out
+            retry_after = window * (1 - (limit - count - 1) / previous) - elapsed
+        # rounded first so float noise (20.000000000000004) doesn't add a second
+        retry_after = max(1, math.ceil(round(retry_after, 6)))
+        return RateLimitResult(True, limit, 0, retry_after, retry_after)
+
+
+def rate_limit_headers(result):
+    headers = {
+        'RateLimit-Limit': str(result.limit),
+        'RateLimit-Remaining': str(result.remaining),
+        'RateLimit-Reset': str(result.reset),
+    }
+    if result.limited:
+        headers['Retry-After'] = str(result.retry_after)
+    return headers
@@ -0,0 +1,165 @@
+import itertools
+import math
+import multiprocessing
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from django.db import connections
+from .index import BACKENDS, get_faq_index
+
+# a retrieval setup to replay the log under; threshold is the score for a direct FAQ answer
+ReplayConfig = namedtuple('ReplayConfig', ['label', 'backend', 'threshold'])
+
+
+def parse_config(spec):
+    """'keyword' or 'tfidf:0.3' -> ReplayConfig. Without a threshold the backend's default is used."""
+    backend, _, threshold = spec.partition(':')
+    if backend not in BACKENDS:
+        raise ValueError(f'unknown retrieval backend {backend!r} (choose from {", ".join(BACKENDS)})')
+    if threshold:
+        threshold = float(threshold)
+    else:
+        threshold = get_faq_index(backend).default_threshold
+    return ReplayConfig(spec, backend, threshold)
+
+
+def iter_chunks(queryset, chunk_size, limit=None):
+    """Yield the logged (message, prompt_tokens, completion_tokens) rows in id order,
+    chunk_size at a time. Keyset pagination keeps memory flat however long the log is."""
+    last_id = 0
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        rows = list(
+            queryset.filter(id__gt=last_id).order_by('id')
+            .values_list('id', 'message', 'prompt_tokens', 'completion_tokens')[:size]
+        )
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
+        yield [row[1:] for row in rows]
+
+
+def score_bucket(score, integral):
+    # keyword scores are hit counts (10 and over share a bucket); TF-IDF ones are
+    # cosines in 0..1, bucketed by tenths
+    if integral:
+        return min(int(score), 10)
+    return math.floor(float(score) * 10) / 10
+
+
+def new_tally():
+    return {
+        'messages': 0, 'faq_hits': 0, 'llm_calls': 0, 'logged_llm_calls': 0,
+        'llm_calls_avoided': 0, 'tokens_avoided': 0, 'seconds': 0.0, 'scores': Counter(),
+    }
+
+
+def merge(totals, tallies):
+    for total, tally in zip(totals, tallies):
+        for key, value in tally.items():
+            total[key] += value
+
+
+# set up in the parent before the pool forks, so workers inherit the built indexes
+_indexes = {}
+_configs = ()
+
+
+def build_indexes(configs):
+    global _configs
+    _configs = tuple(configs)
+    _indexes.clear()
+    for config in configs:
+        if config.backend not in _indexes:
+            index = get_faq_index(config.backend)
+            index.rebuild()
+            _indexes[config.backend] = index
+
+
+def replay_chunk(rows):
+    """Score one chunk of logged messages under every config; one tally per config.
+
+    Scores against the indexes as they were built, without the freshness check
+    search() makes, so workers never touch the database or cache.
+    """
+    tallies = []
+    for config in _configs:
+        index = _indexes[config.backend]
+        integral = isinstance(index.default_threshold, int)
+        tally = new_tally()
+        started = time.process_time()
+        for message, prompt_tokens, completion_tokens in rows:
+            candidates = index._score(message, 1)
+            score = candidates[0][0] if candidates else 0
+            tally['scores'][score_bucket(score, integral)] += 1
+            # logged tokens (0 for a cached answer) mean the LLM answered this one at the time
+            answered_by_llm = prompt_tokens is not None
+            tally['logged_llm_calls'] += answered_by_llm
+            if score >= config.threshold:
+                tally['faq_hits'] += 1
+                if answered_by_llm:
+                    tally['llm_calls_avoided'] += 1
+                    tally['tokens_avoided'] += prompt_tokens + (completion_tokens or 0)
+            else:
+                tally['llm_calls'] += 1
+        tally['messages'] = len(rows)
+        tally['seconds'] = time.process_time() - started
+        tallies.append(tally)
+    return tallies
+
+
+def summarize(config, tally, elapsed):
+    messages = tally['messages']
+    return {
+        'config': config.label,
+        'backend': config.backend,
+        'threshold': config.threshold,
+        'messages': messages,
+        'faq_hits': tally['faq_hits'],
+        'hit_rate': round(tally['faq_hits'] / messages, 4) if messages else None,
+        'llm_calls': tally['llm_calls'],
+        'logged_llm_calls': tally['logged_llm_calls'],
+        'llm_calls_avoided': tally['llm_calls_avoided'],
+        'tokens_avoided': tally['tokens_avoided'],
+        # CPU time spent scoring, per process; rows_per_second includes reading the log
+        'retrieval_per_second': round(messages / tally['seconds'], 1) if tally['seconds'] else None,
+        'rows_per_second': round(messages / elapsed, 1) if elapsed else None,
+        'score_distribution': {str(bucket): count for bucket, count in sorted(tally['scores'].items())},
+    }
+
+
+def run_replay(configs, queryset, workers=1, chunk_size=2000, limit=None):
+    """Replay the logged messages in queryset through each retrieval config; one summary per config.
+
+    With more than one worker, chunks are scored in a process pool that forks
+    after the indexes are built. At most two chunks per worker are in flight,
+    so memory stays flat. Without fork (Windows) it runs in this process.
+    """
+    build_indexes(configs)
+    totals = [new_tally() for _ in configs]
+    chunks = iter_chunks(queryset, chunk_size, limit)
+    started = time.perf_counter()
+    if workers <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        for rows in chunks:
+            merge(totals, replay_chunk(rows))
+    else:
+        # the pool forks every worker on its first submit, and they must not share the
+        # parent's database connection: read the first chunk, then close it before submitting
+        first = next(chunks, None)
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(workers, mp_context=context) as pool:
+            pending = set()
+            for rows in itertools.chain([first] if first is not None else [], chunks):
+                pending.add(pool.submit(replay_chunk, rows))
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        merge(totals, future.result())
+            for future in pending:
+                merge(totals, future.result())
+    elapsed = time.perf_counter() - started
+    return [summarize(config, tally, elapsed) for config, tally in zip(configs, totals)]
@@ -0,0 +1,80 @@
+import asyncio
+import concurrent.futures
+import threading
+
+
+class SingleFlight:
+    """Collapse concurrent calls that share a key into one.
+
+    The first caller (the leader) awaits the coroutine function; callers arriving
+    while it is in flight wait up to `timeout` seconds and get the leader's
+    result. If the leader fails they get its exception, and if the wait runs
+    out they get TimeoutError, so the caller's usual fallback applies either way.
+
+    Waiters await the result on their own event loop, which need not be the
+    leader's, instead of blocking a thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.leader_failures = 0
+        self.wait_timeouts = 0
+
+    async def ado(self, key, fn, timeout):
+        with self._lock:
+            future = self._futures.get(key)
+            leader = future is None
+            if leader:
+                # a thread-safe future: under WSGI each request runs on its own event loop,
+                # and waiters on other loops must still be woken when the leader finishes
+                future = self._futures[key] = concurrent.futures.Future()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                result = await fn()
+            except BaseException as e:
+                if isinstance(e, Exception):
+                    with self._lock:
+                        self.leader_failures += 1
+                    future.set_exception(e)
+                else:
+                    # the leader's request was cancelled (client went away); waiters fall back
+                    future.set_exception(TimeoutError('identical in-flight request was cancelled'))
+                raise
+            else:
+                future.set_result(result)
+                return result
+            finally:
+                with self._lock:
+                    del self._futures[key]
+
+        # asyncio.wait leaves the future alone when the timeout runs out
+        waiter = asyncio.wrap_future(future)
+        done, _ = await asyncio.wait([waiter], timeout=timeout)
+        if not done:
+            # not cancelled, as that would cancel the shared future for every other waiter;
+            # mark its eventual error retrieved instead
+            waiter.add_done_callback(lambda f: f.cancelled() or f.exception())
+            with self._lock:
+                self.wait_timeouts += 1
+            raise TimeoutError('timed out waiting for an identical in-flight request')
+        return waiter.result()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._futures),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+                'leader_failures': self.leader_failures,
+                'wait_timeouts': self.wait_timeouts,
+            }
+
+
+llm_flights = SingleFlight()
@@ -1,13 +1,89 @@
-from django.test import TestCase
+import asyncio
+import base64
+import gzip
+import io
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from django.utils import timezone
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, override_settings
+from chat.models import ChatSession
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient
 from faq.models import KnowledgeBase
 from chat.models import Profile
+from chat.index import get_faq_index, reset_indexes
+from chat.vectors import VectorIndex
+from chat.utils import aget_cached_ai_response, retrieve_faqs
+from chat.answer_cache import answer_cache
+from chat.singleflight import SingleFlight
+from chat.ratelimit import acheck_rate_limit
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from chat.models import DailyChatStats, ArchivedChatSession, SessionStats
+from chat.memory import aget_history, parse_session_id
+from chat.chatlog import alog_chat, chat_log_buffer
+from chat.utils import RetrievalResult
+from chat.index import make_entry
+from chat.prompt import build_prompt, estimate_tokens
+from chat.metrics import registry
+from faq.text import normalize_keywords
+from chat.benchmark import LOAD_SESSIONS, SCENARIOS, percentile, run_benchmark, seed_faqs, seed_logs
+from chat.llm import get_gateway, reset_gateway, Completion, LLMUnavailable, TransientLLMError
+from core.cache import TieredCache, throwaway_caches
+from chat import warmup
+from chat.utils import clean_message
+from chat.replay import iter_chunks, parse_config, run_replay
+from chat.mining import mine_candidates, minhash, similarity
+from faq.models import FAQCandidate
+
+# chat requests must carry random UUID session ids
+SESSION = 'f47ac10b-58cc-4372-a567-0e02b2c3d479'
+OTHER_SESSION = '9b2e4c1d-7a3f-4e8b-9c6d-2f1a0b3c4d5e'
+
+# the chat path is async only; these drive its steps from synchronous tests
+cached_answer = async_to_sync(aget_cached_ai_response)
+rate_limit = async_to_sync(acheck_rate_limit)
+history_of = async_to_sync(aget_history)
+
+
+def best_faq(message):
+    return retrieve_faqs(message, top_n=1).best
+
+
+def relevant_faqs(message, top_n=3):
+    return [faq for _, faq in retrieve_faqs(message, top_n).candidates]
+
+
+# the configured caches may be a developer's Redis or a running server's store;
+# tests clear caches freely, so every alias gets a fresh in-process one instead
+throwaway_caches_override = override_settings(CACHES=throwaway_caches(settings.CACHES))
+
+
+def setUpModule():
+    throwaway_caches_override.enable()
+
+
+def tearDownModule():
+    throwaway_caches_override.disable()
 
 class ChatEndpointTests(TestCase):
 
     def setUp(self):
         self.client = APIClient()
+        reset_indexes()
+        caches['ratelimit'].clear()
 
         # create users — signal auto-creates Profile for each
         self.user = User.objects.create_user(username='testuser', password='pass123')
@@ -31,18 +107,27 @@ class ChatEndpointTests(TestCase):
     def test_chat_endpoint_returns_response(self):
         res = self.client.post('/api/chat/', {
             'message': 'how do I apply',
-            'session_id': 'test-session'
+            'session_id': SESSION
         }, format='json')
         self.assertEqual(res.status_code, 200)
-        self.assertIn('response', res.data)
+        self.assertIn('response', res.json())
+
+    async def test_chat_endpoint_under_asgi(self):
+        res = await self.async_client.post('/api/chat/', {
+            'message': 'how do I apply for admission',
+            'session_id': SESSION
+        }, content_type='application/json')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['response'], 'Apply online at the GSU portal.')
+        self.assertTrue(await ChatSession.objects.filter(session_id=SESSION).aexists())
 
     def test_chat_keyword_match_returns_faq_answer(self):
         res = self.client.post('/api/chat/', {
             'message': 'how do I apply for admission',
-            'session_id': 'test-session'
+            'session_id': SESSION
         }, format='json')
         self.assertEqual(res.status_code, 200)
-        self.assertEqual(res.data['response'], 'Apply online at the GSU portal.')
+        self.assertEqual(res.json()['response'], 'Apply online at the GSU portal.')
 
     def test_admin_faqs_endpoint_rejects_unauthenticated(self):
         res = self.client.post('/api/admin/faqs/', {
@@ -75,4 +160,1139 @@ class ChatEndpointTests(TestCase):
 
     def test_chat_logs_rejects_unauthenticated(self):
         res = self.client.get('/api/admin/chat-logs/')
-        self.assertEqual(res.status_code, 401)
\ No newline at end of file
+        self.assertEqual(res.status_code, 401)
+
+
+class FAQIndexTests(TestCase):
+
+    def setUp(self):
+        reset_indexes()
+        self.faq = KnowledgeBase.objects.create(
+            category='Fees',
+            question='How much are tuition fees?',
+            answer='Fees vary by programme.',
+            keywords='fees, tuition, cost'
+        )
+
+    def test_index_ranks_by_keyword_overlap(self):
+        self.assertEqual(best_faq('what are the tuition fees').id, self.faq.id)
+        self.assertIsNone(best_faq('what are the fees'))
+        self.assertEqual([f.id for f in relevant_faqs('fees')], [self.faq.id])
+
+    def test_retrieve_scores_once_for_best_and_candidates(self):
+        other = KnowledgeBase.objects.create(
+            category='Fees',
+            question='How do I pay fees?',
+            answer='Pay at the bursary.',
+            keywords='fees, pay'
+        )
+        result = retrieve_faqs('how do i pay tuition fees', top_n=1)
+        self.assertEqual(len(result.candidates), 1)
+        self.assertEqual(result.candidates[0][0], 2)
+        # equal scores fall back to the oldest FAQ
+        self.assertEqual(result.best.id, self.faq.id)
+        self.assertNotEqual(result.best.id, other.id)
+
+    def test_index_is_patched_on_update_and_delete(self):
+        best_faq('warm up')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.faq.keywords = 'library, books'
+            self.faq.save()
+        self.assertEqual(relevant_faqs('fees'), [])
+        self.assertEqual(best_faq('library books').id, self.faq.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.faq.delete()
+        self.assertIsNone(best_faq('library books'))
+
+
+
+@override_settings(CHAT_RETRIEVAL={'BACKEND': 'tfidf', 'THRESHOLD': None})
+class VectorRetrievalTests(TestCase):
+
+    def setUp(self):
+        reset_indexes()
+        self.fees = KnowledgeBase.objects.create(
+            category='Fees',
+            question='How much are tuition fees?',
+            answer='Tuition fees vary by programme.',
+            keywords='fees, tuition, cost'
+        )
+        self.library = KnowledgeBase.objects.create(
+            category='Library',
+            question='What are the library opening hours?',
+            answer='The library opens at 8am.',
+            keywords='library, hours, books'
+        )
+
+    def test_plural_and_paraphrase_still_match(self):
+        result = retrieve_faqs('what is the fee for tuition?')
+        self.assertEqual(result.best.id, self.fees.id)
+        self.assertEqual(result.candidates[0][1].id, self.fees.id)
+
+    def test_threshold_is_configurable(self):
+        with self.settings(CHAT_RETRIEVAL={'BACKEND': 'tfidf', 'THRESHOLD': 0.99}):
+            self.assertIsNone(retrieve_faqs('library').best)
+
+    def test_new_faq_is_indexed_incrementally(self):
+        retrieve_faqs('warm up')
+        with self.captureOnCommitCallbacks(execute=True):
+            ict = KnowledgeBase.objects.create(
+                category='ICT',
+                question='How do I reset my student email password?',
+                answer='Visit the ICT help desk.',
+                keywords='email, password, reset'
+            )
+        self.assertEqual(retrieve_faqs('reset email password').best.id, ict.id)
+
+    def test_edits_score_like_a_fresh_build(self):
+        index = get_faq_index('tfidf')
+        index.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.library.answer = 'Opening hours are 8am to 10pm, with late opening during exams.'
+            self.library.save()
+            self.fees.delete()
+            KnowledgeBase.objects.create(category='Exams', question='When are exams?', answer='In May.',
+                                         keywords='exams, timetable')
+        fresh = VectorIndex()
+        fresh.rebuild()
+        for message in ('library opening hours', 'exam timetable', 'tuition fees'):
+            edited, rebuilt = index._score(message, 3), fresh._score(message, 3)
+            self.assertEqual([e.id for _, e in edited], [e.id for _, e in rebuilt])
+            for (a, _), (b, _) in zip(edited, rebuilt):
+                self.assertAlmostEqual(a, b, places=5)
+
+
+
+class AnswerCacheTests(TestCase):
+
+    def setUp(self):
+        reset_indexes()
+        answer_cache.clear()
+        self.faq = KnowledgeBase.objects.create(
+            category='Fees',
+            question='How much are tuition fees?',
+            answer='Fees vary by programme.',
+            keywords='fees, tuition, cost'
+        )
+        self.context = relevant_faqs('fees')
+
+    @mock.patch('chat.utils.aget_ai_response', return_value=Completion('LLM answer', 120, 30))
+    def test_repeat_question_is_served_from_cache(self, llm):
+        self.assertEqual(cached_answer('Fees for 2025?', self.context).text, 'LLM answer')
+        cached = cached_answer('  fees for 2025 ', self.context)
+        self.assertEqual(cached, Completion('LLM answer', 0, 0))
+        self.assertEqual(llm.call_count, 1)
+        self.assertEqual(answer_cache.stats()['hits'], 1)
+        self.assertEqual(answer_cache.stats()['misses'], 1)
+
+    @mock.patch('chat.utils.aget_ai_response', return_value=Completion('LLM answer', 120, 30))
+    def test_least_recently_used_answers_are_evicted(self, llm):
+        with self.settings(CHAT_ANSWER_CACHE={**settings.CHAT_ANSWER_CACHE, 'MAX_ENTRIES': 2}):
+            for message in ('fees for 2024', 'fees for 2025', 'fees for 2024', 'fees for 2026'):
+                cached_answer(message, self.context)
+            self.assertEqual(llm.call_count, 3)
+            cached_answer('fees for 2024', self.context)
+            cached_answer('fees for 2025', self.context)
+        self.assertEqual(llm.call_count, 4)
+        self.assertEqual(answer_cache.stats()['entries'], 2)
+
+    @mock.patch('chat.utils.aget_ai_response', return_value=Completion('LLM answer', 120, 30))
+    def test_editing_a_referenced_faq_evicts_answers(self, llm):
+        cached_answer('fees for 2025', self.context)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.faq.answer = 'Fees are listed on the portal.'
+            self.faq.save()
+        self.assertEqual(answer_cache.stats()['entries'], 0)
+        cached_answer('fees for 2025', relevant_faqs('fees'))
+        self.assertEqual(llm.call_count, 2)
+
+    @mock.patch('chat.utils.aget_ai_response', return_value=Completion('LLM answer', 120, 30))
+    def test_history_only_keys_follow_ups_by_default(self, llm):
+        history = [{'role': 'user', 'content': 'hi'}, {'role': 'assistant', 'content': 'hello'}]
+        other = [{'role': 'user', 'content': 'parking'}, {'role': 'assistant', 'content': 'permits'}]
+        # a stand-alone question shares one answer across conversations
+        cached_answer('tuition fees for 2025', self.context, history)
+        cached_answer('tuition fees for 2025', self.context, other)
+        self.assertEqual(llm.call_count, 1)
+        # a follow-up depends on what came before
+        cached_answer('is it refundable?', self.context, history)
+        cached_answer('is it refundable?', self.context, other)
+        cached_answer('is it refundable?', self.context, history)
+        self.assertEqual(llm.call_count, 3)
+        with self.settings(CHAT_ANSWER_CACHE={**settings.CHAT_ANSWER_CACHE, 'HISTORY': 'bypass'}):
+            cached_answer('tuition fees for 2025', self.context, history)
+        self.assertEqual(llm.call_count, 4)
+
+
+
+class ChatStreamTests(TestCase):
+
+    def setUp(self):
+        reset_indexes()
+        answer_cache.clear()
+        KnowledgeBase.objects.create(
+            category='Admissions',
+            question='How do I apply?',
+            answer='Apply online at the GSU portal.',
+            keywords='apply, admission, register'
+        )
+
+    async def read_events(self, message):
+        res = await self.async_client.post(
+            '/api/chat/stream/',
+            {'message': message, 'session_id': SESSION},
+            content_type='application/json'
+        )
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['Content-Type'], 'text/event-stream')
+        body = b''.join([chunk async for chunk in res.streaming_content]).decode()
+        return [block for block in body.split('\n\n') if block]
+
+    def test_bad_requests_carry_rate_limit_headers(self):
+        for body in ('[]', json.dumps({'message': ''}), json.dumps({'message': 'hi', 'session_id': 'abc'})):
+            res = self.client.post('/api/chat/stream/', body, content_type='application/json')
+            self.assertEqual(res.status_code, 400)
+            self.assertIn('RateLimit-Remaining', res)
+
+    async def test_faq_hit_is_sent_in_one_event(self):
+        events = await self.read_events('how do I apply for admission')
+        self.assertEqual(events[0], 'data: {"token": "Apply online at the GSU portal."}')
+        self.assertTrue(events[-1].startswith('event: done'))
+        self.assertEqual(await ChatSession.objects.filter(session_id=SESSION).acount(), 1)
+
+    async def test_llm_tokens_are_relayed_then_logged(self):
+        async def fake_stream(*args, **kwargs):
+            for token in ['Hello', ' there']:
+                yield token
+
+        with mock.patch('chat.views.stream_ai_response', fake_stream):
+            events = await self.read_events('tell me something')
+        self.assertEqual(events[:2], ['data: {"token": "Hello"}', 'data: {"token": " there"}'])
+        log = await ChatSession.objects.aget(session_id=SESSION)
+        self.assertEqual(log.response, 'Hello there')
+
+
+
+FAKE_LLM = {
+    **settings.CHAT_LLM,
+    'PROVIDER': 'fake',
+    'FAKE_LATENCY': 0,
+    'BACKOFF': 0,
+    'MAX_RETRIES': 2,
+    'BREAKER_THRESHOLD': 2,
+    'BREAKER_RESET': 60,
+}
+
+
+@override_settings(CHAT_LLM=FAKE_LLM)
+class LLMGatewayTests(TestCase):
+
+    def setUp(self):
+        reset_gateway()
+
+    def test_fake_provider_answers_offline(self):
+        answer = get_gateway().complete([{'role': 'user', 'content': 'hello'}])
+        self.assertIn('hello', answer.text)
+        self.assertGreater(answer.prompt_tokens, 0)
+        self.assertEqual(get_gateway().stats()['calls'], 1)
+
+    def test_transient_errors_are_retried(self):
+        gateway = get_gateway()
+        flaky = mock.Mock(side_effect=[TransientLLMError('boom'), Completion('ok', 1, 1)])
+        with mock.patch.object(gateway.provider, 'complete', flaky):
+            self.assertEqual(gateway.complete([]).text, 'ok')
+        self.assertEqual(gateway.stats()['retries'], 1)
+
+    def test_breaker_opens_and_skips_upstream(self):
+        gateway = get_gateway()
+        broken = mock.Mock(side_effect=ValueError('bad response'))
+        with mock.patch.object(gateway.provider, 'complete', broken):
+            for _ in range(2):
+                with self.assertRaises(ValueError):
+                    gateway.complete([])
+            with self.assertRaises(LLMUnavailable):
+                gateway.complete([])
+        self.assertEqual(broken.call_count, 2)
+        self.assertEqual(gateway.stats()['breaker_state'], 'open')
+
+    def half_open(self, gateway):
+        gateway.breaker.opened_at = time.monotonic() - gateway.breaker.reset_after
+        self.assertEqual(gateway.breaker.state, 'half-open')
+
+    def test_cancelled_trial_releases_the_breaker(self):
+        gateway = get_gateway()
+        self.half_open(gateway)
+
+        async def hang(messages, timeout):
+            await asyncio.sleep(10)
+
+        async def cancel_trial():
+            with mock.patch.object(gateway.provider, 'acomplete', hang):
+                task = asyncio.ensure_future(gateway.acomplete([]))
+                await asyncio.sleep(0.01)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+
+        asyncio.run(cancel_trial())
+        self.assertFalse(gateway.breaker.trial_running)
+        # still half-open, and the next call is let through as the trial
+        self.assertIn('hello', asyncio.run(gateway.acomplete([{'role': 'user', 'content': 'hello'}])).text)
+        self.assertEqual(gateway.breaker.state, 'closed')
+
+    def test_closed_stream_releases_the_breaker(self):
+        gateway = get_gateway()
+        self.half_open(gateway)
+
+        async def read_one_token():
+            stream = gateway.astream([{'role': 'user', 'content': 'hello there'}])
+            await stream.__anext__()
+            await stream.aclose()
+
+        asyncio.run(read_one_token())
+        self.assertFalse(gateway.breaker.trial_running)
+        self.assertEqual(gateway.breaker.state, 'half-open')
+
+
+
+class SingleFlightTests(TestCase):
+
+    async def test_followers_get_leader_error_and_bounded_wait(self):
+        flights = SingleFlight()
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def failing():
+            started.set()
+            await release.wait()
+            raise ValueError('upstream down')
+
+        leader = asyncio.ensure_future(flights.ado('k', failing, 5))
+        await started.wait()
+        with self.assertRaises(TimeoutError):
+            await flights.ado('k', failing, timeout=0.01)
+        follower = asyncio.ensure_future(flights.ado('k', failing, 5))
+        await asyncio.sleep(0)
+        release.set()
+        for call in (leader, follower):
+            with self.assertRaises(ValueError):
+                await call
+        self.assertEqual(flights.stats()['leader_failures'], 1)
+        self.assertEqual(flights.stats()['wait_timeouts'], 1)
+        self.assertEqual(flights.stats()['in_flight'], 0)
+
+    async def test_async_callers_share_one_call(self):
+        flights = SingleFlight()
+        calls = []
+
+        async def slow():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'answer'
+
+        results = await asyncio.gather(*(flights.ado('k', slow, timeout=5) for _ in range(4)))
+        self.assertEqual(results, ['answer'] * 4)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flights.stats()['coalesced'], 3)
+
+    def test_async_callers_on_different_loops_share_one_call(self):
+        # under WSGI every request runs the async view on an event loop of its own
+        flights = SingleFlight()
+        calls = []
+
+        async def slow():
+            calls.append(1)
+            await asyncio.sleep(0.2)
+            return 'answer'
+
+        results = []
+        def call():
+            started = time.monotonic()
+            results.append((async_to_sync(flights.ado)('k', slow, timeout=3), time.monotonic() - started))
+
+        threads = [threading.Thread(target=call) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([answer for answer, _ in results], ['answer'] * 2)
+        self.assertEqual(flights.stats()['coalesced'], 1)
+        self.assertLess(max(elapsed for _, elapsed in results), 1)
+
+
+
+@override_settings(RATELIMIT_BACKEND='cache', RATELIMIT_RATES={'chat': '3/min', 'chat_stream': '3/min'})
+class RateLimitTests(TestCase):
+
+    def setUp(self):
+        caches['ratelimit'].clear()
+
+    def test_sliding_window_counts_previous_window(self):
+        for _ in range(3):
+            self.assertFalse(rate_limit('chat', '1.2.3.4', now=90).limited)
+        # 15s into the next window, 3 * 0.75 of the old window still counts
+        result = rate_limit('chat', '1.2.3.4', now=135)
+        self.assertTrue(result.limited)
+        self.assertEqual(result.retry_after, 5)
+        self.assertTrue(rate_limit('chat', '1.2.3.4', now=139).limited)
+        # a client honouring Retry-After gets through
+        self.assertFalse(rate_limit('chat', '1.2.3.4', now=135 + result.retry_after).limited)
+        # rejected requests don't use up the allowance
+        self.assertFalse(rate_limit('chat', '1.2.3.4', now=165).limited)
+
+    def test_retry_after_spans_into_the_next_window(self):
+        for _ in range(3):
+            rate_limit('chat', '1.2.3.4', now=70)
+        result = rate_limit('chat', '1.2.3.4', now=80)
+        self.assertTrue(result.limited)
+        self.assertTrue(rate_limit('chat', '1.2.3.4', now=80 + result.retry_after - 1).limited)
+        self.assertFalse(rate_limit('chat', '1.2.3.4', now=80 + result.retry_after).limited)
+
+    def test_database_backend_shares_counters(self):
+        with self.settings(RATELIMIT_BACKEND='database'):
+            for _ in range(3):
+                rate_limit('chat', '5.6.7.8', now=10)
+            self.assertTrue(rate_limit('chat', '5.6.7.8', now=20).limited)
+            self.assertFalse(rate_limit('chat', '9.9.9.9', now=20).limited)
+
+    def test_chat_endpoint_sends_rate_limit_headers(self):
+        for _ in range(3):
+            res = self.client.post('/api/chat/', {'message': ''}, content_type='application/json')
+        self.assertEqual(res['RateLimit-Limit'], '3')
+        res = self.client.post('/api/chat/', {'message': 'hi'}, content_type='application/json')
+        self.assertEqual(res.status_code, 429)
+        self.assertIn('Retry-After', res)
+
+
+
+class AnalyticsTests(TestCase):
+
+    def setUp(self):
+        reset_indexes()
+        caches['default'].clear()
+        caches['ratelimit'].clear()
+        self.admin = User.objects.create_user(username='adminuser', password='pass123')
+        self.admin.profile.role = 'admin'
+        self.admin.profile.save()
+        self.faq = KnowledgeBase.objects.create(
+            category='Admissions',
+            question='How do I apply?',
+            answer='Apply online at the GSU portal.',
+            keywords='apply, admission, register'
+        )
+
+    def chat(self, message, session_id):
+        self.client.post('/api/chat/', {'message': message, 'session_id': session_id},
+                         content_type='application/json')
+
+    def get_analytics(self):
+        api = APIClient()
+        api.force_authenticate(user=self.admin)
+        return api.get('/api/admin/analytics/').data
+
+    def test_messages_are_classified_and_rolled_up_on_write(self):
+        self.chat('how do I apply for admission', SESSION)
+        self.chat('can I register late?', SESSION)
+        self.chat('where to apply', OTHER_SESSION)
+
+        log = ChatSession.objects.filter(session_id=SESSION).first()
+        self.assertEqual(log.matched_faq_id, self.faq.id)
+        self.assertEqual(log.topic, 'Admissions')
+
+        with self.assertNumQueries(5):  # rollup reads only, however many messages exist
+            data = self.get_analytics()
+        self.assertEqual(data['summary'], {'total_messages': 3, 'total_sessions': 2, 'unmatched_queries': 0})
+        self.assertEqual(data['topics'], [{'topic': 'Admissions', 'count': 3}])
+        self.assertEqual(data['messages_per_session'][0]['messages'], 2)
+
+        # logging a chat doesn't touch the cached dashboard; it expires within CACHE_TTL
+        self.chat('how do I apply', SESSION)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_analytics()['summary']['total_messages'], 3)
+
+    def test_backfill_classifies_existing_rows(self):
+        ChatSession.objects.create(session_id='old', message='apply for admission', response='x')
+        ChatSession.objects.create(session_id='old', message='hello there', response='y')
+        call_command('backfill_analytics', stdout=io.StringIO())
+
+        self.assertEqual(ChatSession.objects.filter(topic='Admissions').count(), 1)
+        stats = DailyChatStats.objects.get()
+        self.assertEqual((stats.messages, stats.new_sessions, stats.unmatched), (2, 1, 1))
+
+
+
+class ChatLogsTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='adminuser', password='pass123')
+        self.admin.profile.role = 'admin'
+        self.admin.profile.save()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        for i in range(5):
+            ChatSession.objects.create(session_id=f's{i % 2}', message=f'question {i}', response='answer')
+
+    def test_keyset_pagination_walks_all_rows_newest_first(self):
+        seen = []
+        cursor = None
+        while True:
+            params = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+            data = self.client.get('/api/admin/chat-logs/', params).data
+            seen += [log['message'] for log in data['results']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, [f'question {i}' for i in range(4, -1, -1)])
+
+    def test_filters_by_session_and_rejects_bad_cursor(self):
+        data = self.client.get('/api/admin/chat-logs/', {'session_id': 's1'}).data
+        self.assertEqual(len(data['results']), 2)
+        res = self.client.get('/api/admin/chat-logs/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(res.status_code, 400)
+
+    def test_streaming_exports(self):
+        res = self.client.get('/api/admin/chat-logs/', {'export': 'ndjson', 'session_id': 's0'})
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['message'] for line in lines], ['question 0', 'question 2', 'question 4'])
+
+        res = self.client.get('/api/admin/chat-logs/', {'export': 'csv'})
+        rows = b''.join(res.streaming_content).decode().splitlines()
+        self.assertEqual(rows[0], 'session_id,message,response,timestamp')
+        self.assertEqual(len(rows), 6)
+
+
+
+@override_settings(CHAT_MEMORY={'HISTORY_TOKENS': 40, 'SUMMARY_TOKENS': 30, 'MAX_TURNS': 10, 'TTL': 60})
+class ConversationMemoryTests(TestCase):
+
+    def setUp(self):
+        reset_indexes()
+        answer_cache.clear()
+        caches['default'].clear()
+        caches['ratelimit'].clear()
+
+    @mock.patch('chat.utils.aget_ai_response', return_value=Completion('A short reply.', 50, 5))
+    def test_history_is_built_server_side_and_client_history_ignored(self, llm):
+        self.client.post('/api/chat/', {'message': 'first question', 'session_id': SESSION},
+                         content_type='application/json')
+        self.client.post('/api/chat/', {
+            'message': 'second question',
+            'session_id': SESSION,
+            'history': [{'role': 'user', 'content': 'injected'}]
+        }, content_type='application/json')
+
+        history = llm.call_args_list[1].args[2]
+        self.assertEqual(history, [
+            {'role': 'user', 'content': 'first question'},
+            {'role': 'assistant', 'content': 'A short reply.'},
+        ])
+
+    def test_old_turns_are_summarised_to_stay_in_budget(self):
+        for i in range(8):
+            ChatSession.objects.create(
+                session_id='long', message=f'question number {i} about fees',
+                response='word ' * 10
+            )
+        history = history_of('long')
+        self.assertEqual(history[0]['role'], 'system')
+        self.assertIn('question number', history[0]['content'])
+        self.assertEqual(history[-2]['content'], 'question number 7 about fees')
+        self.assertLessEqual(sum(len(m['content'].split()) for m in history[1:]), 40)
+
+    def test_anonymous_sessions_have_no_memory(self):
+        ChatSession.objects.create(session_id='anonymous', message='hi', response='hello')
+        self.assertEqual(history_of('anonymous'), [])
+
+    def test_body_must_be_a_json_object(self):
+        for body in ('[]', '"hi"', 'not json'):
+            res = self.client.post('/api/chat/', body, content_type='application/json')
+            self.assertEqual(res.status_code, 400)
+        res = self.client.post('/api/chat/', {'message': 'hi'})  # form-encoded
+        self.assertEqual(res.status_code, 400)
+
+    def test_guessable_session_ids_are_rejected(self):
+        self.assertEqual(parse_session_id(None), 'anonymous')
+        self.assertEqual(parse_session_id(SESSION.upper()), SESSION)
+        for value in ('session-1718000000000', str(uuid.uuid1()), 12):
+            with self.assertRaises(ValueError):
+                parse_session_id(value)
+        res = self.client.post('/api/chat/', {'message': 'what did I ask earlier?', 'session_id': 'session-1'},
+                               content_type='application/json')
+        self.assertEqual(res.status_code, 400)
+
+
+
+class PromptBuilderTests(TestCase):
+
+    def setUp(self):
+        self.faqs = [
+            make_entry(KnowledgeBase(pk=i, category='Fees', question=f'Question {i}?',
+                                     answer='word ' * 200, keywords='fees'))
+            for i in range(3)
+        ]
+
+    def test_faq_context_is_trimmed_to_budget(self):
+        with self.settings(CHAT_PROMPT={'FAQ_CONTEXT_TOKENS': 120}):
+            prompt = build_prompt('how much?', self.faqs)
+        system = prompt.messages[0]['content']
+        self.assertIn('Question 0?', system)
+        self.assertNotIn('Question 2?', system)
+        self.assertTrue(system.endswith('...'))
+        self.assertLess(prompt.tokens, estimate_tokens(system) + 50)
+
+    @mock.patch('chat.utils.aget_ai_response', return_value=Completion('LLM answer', 120, 30))
+    def test_token_usage_is_recorded_per_message(self, llm):
+        reset_indexes()
+        answer_cache.clear()
+        caches['ratelimit'].clear()
+        self.client.post('/api/chat/', {'message': 'something new', 'session_id': SESSION},
+                         content_type='application/json')
+        log = ChatSession.objects.get(session_id=SESSION)
+        self.assertEqual((log.prompt_tokens, log.completion_tokens), (120, 30))
+
+
+
+@override_settings(CHAT_LOG={'MODE': 'buffered', 'BATCH_SIZE': 2, 'FLUSH_INTERVAL': 0.05, 'MAX_QUEUE': 100})
+class BufferedChatLogTests(TransactionTestCase):
+
+    def test_rows_are_bulk_written_in_background_and_drained(self):
+        empty = RetrievalResult(best=None, candidates=[])
+        for i in range(5):
+            async_to_sync(alog_chat)('buffered', f'message {i}', 'reply', empty)
+        chat_log_buffer.drain()
+
+        self.assertEqual(chat_log_buffer.pending(), 0)
+        self.assertEqual(ChatSession.objects.filter(session_id='buffered').count(), 5)
+        self.assertEqual(DailyChatStats.objects.get().messages, 5)
+
+
+
+class ArchiveChatsTests(TestCase):
+
+    def setUp(self):
+        for i in range(3):
+            ChatSession.objects.create(session_id='old', message=f'old {i}', response='x')
+        ChatSession.objects.update(timestamp=timezone.now() - timedelta(days=200))
+        ChatSession.objects.create(session_id='new', message='recent', response='y')
+
+    def test_old_rows_move_to_archive_table(self):
+        call_command('archive_chats', days=90, batch_size=2, stdout=io.StringIO())
+        self.assertEqual(list(ChatSession.objects.values_list('message', flat=True)), ['recent'])
+        self.assertEqual(ArchivedChatSession.objects.filter(session_id='old').count(), 3)
+
+    def test_backfill_keeps_archived_history(self):
+        call_command('archive_chats', days=90, batch_size=2, stdout=io.StringIO())
+        call_command('backfill_analytics', batch_size=2, stdout=io.StringIO())
+
+        self.assertEqual(sum(DailyChatStats.objects.values_list('messages', flat=True)), 4)
+        self.assertEqual(sum(DailyChatStats.objects.values_list('new_sessions', flat=True)), 2)
+        self.assertEqual(SessionStats.objects.get(session_id='old').messages, 3)
+
+    def test_old_rows_move_to_jsonl_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            call_command('archive_chats', days=90, to='jsonl', output_dir=tmp, stdout=io.StringIO())
+            [path] = Path(tmp).glob('*.jsonl.gz')
+            with gzip.open(path, 'rt') as f:
+                rows = [json.loads(line) for line in f]
+        self.assertEqual([row['message'] for row in rows], ['old 0', 'old 1', 'old 2'])
+        self.assertEqual(ChatSession.objects.count(), 1)
+        self.assertEqual(ArchivedChatSession.objects.count(), 0)
+
+
+class FAQListTests(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client = APIClient()
+        KnowledgeBase.objects.create(category='Admissions', question='How do I apply?', answer='Online.', keywords='apply')
+        KnowledgeBase.objects.create(category='Tuition', question='What are the fees?', answer='$500.', keywords='fees')
+
+    def test_default_response_is_the_full_list(self):
+        res = self.client.get('/api/faqs/')
+        self.assertEqual([faq['category'] for faq in res.json()], ['Admissions', 'Tuition'])
+        self.assertIn('max-age=', res['Cache-Control'])
+
+    def test_etag_revalidation_until_an_faq_changes(self):
+        etag = self.client.get('/api/faqs/')['ETag']
+        res = self.client.get('/api/faqs/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            KnowledgeBase.objects.create(category='Tuition', question='Payment plans?', answer='Yes.', keywords='plan')
+        res = self.client.get('/api/faqs/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.json()), 3)
+
+    def test_category_filter_and_pagination(self):
+        res = self.client.get('/api/faqs/', {'category': 'tuition'})
+        self.assertEqual([faq['question'] for faq in res.json()], ['What are the fees?'])
+
+        data = self.client.get('/api/faqs/', {'page': 1, 'page_size': 1}).json()
+        self.assertEqual((data['count'], data['next'], len(data['results'])), (2, 2, 1))
+        data = self.client.get('/api/faqs/', {'page': 2, 'page_size': 1}).json()
+        self.assertIsNone(data['next'])
+
+
+class FAQBulkTests(TestCase):
+
+    def setUp(self):
+        reset_indexes()
+        self.admin = User.objects.create_user(username='adminuser', password='pass123')
+        self.admin.profile.role = 'admin'
+        self.admin.profile.save()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        self.existing = KnowledgeBase.objects.create(
+            category='Tuition', question='What are the fees?', answer='$500.', keywords='fees'
+        )
+
+    def test_json_import_upserts_and_reindexes_once(self):
+        relevant_faqs('fees')  # load the index
+        rows = [
+            {'category': 'Tuition', 'question': 'What are the fees?', 'answer': '$600.', 'keywords': 'fees, cost'},
+            {'category': 'Library', 'question': 'When is it open?', 'answer': '8am.', 'keywords': 'library, hours'},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post('/api/admin/faqs/bulk/', rows, format='json')
+        self.assertEqual(res.data, {'created': 1, 'updated': 1})
+        self.assertEqual(KnowledgeBase.objects.get(pk=self.existing.pk).answer, '$600.')
+        self.assertEqual(relevant_faqs('library')[0].answer, '8am.')
+
+    @override_settings(FAQ_VERSION_TTL=0.05)
+    def test_import_from_another_process_reaches_a_loaded_index(self):
+        self.assertIsNone(retrieve_faqs('parking permit office').best)  # load the index
+        rows = [{'category': 'Campus', 'question': 'Where do I get a parking permit?', 'answer': 'Security office.',
+                 'keywords': 'parking, permit'}]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'faqs.json'
+            path.write_text(json.dumps(rows))
+            # the importing process has a cache and indexes of its own
+            with mock.patch('faq.models.cache', LocMemCache('other-process', {})), \
+                    mock.patch('faq.bulk.faqs_bulk_changed.send'), \
+                    self.captureOnCommitCallbacks(execute=True):
+                call_command('import_faqs', str(path), stdout=io.StringIO())
+        time.sleep(0.1)
+        self.assertEqual(retrieve_faqs('parking permit office').best.answer, 'Security office.')
+        self.assertIn('Security office.', self.client.get('/api/faqs/').content.decode())
+
+    def test_invalid_rows_reject_the_whole_import(self):
+        rows = [{'category': 'Library', 'question': 'Open?', 'answer': '8am.', 'keywords': 'library'}, {'category': 'x'}]
+        res = self.client.post('/api/admin/faqs/bulk/', rows, format='json')
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.data['errors'][0]['row'], 1)
+        self.assertEqual(KnowledgeBase.objects.count(), 1)
+
+    def test_csv_export_round_trips_through_import(self):
+        res = self.client.get('/api/admin/faqs/bulk/', {'export': 'csv'})
+        exported = b''.join(res.streaming_content).decode()
+        self.assertTrue(exported.startswith('id,category,question,answer,keywords'))
+
+        res = self.client.generic('POST', '/api/admin/faqs/bulk/', exported.replace('$500.', '$550.'),
+                                  content_type='text/csv')
+        self.assertEqual(res.data, {'created': 0, 'updated': 1})
+        self.assertEqual(KnowledgeBase.objects.get().answer, '$550.')
+
+    def test_management_commands(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'faqs.json'
+            call_command('export_faqs', output=str(path))
+            self.assertEqual(json.loads(path.read_text())[0]['question'], 'What are the fees?')
+            KnowledgeBase.objects.all().delete()
+            call_command('import_faqs', str(path), stdout=io.StringIO())
+        self.assertEqual(KnowledgeBase.objects.get().answer, '$500.')
+
+
+@override_settings(
+    CHAT_LLM={**settings.CHAT_LLM, 'PROVIDER': 'fake', 'FAKE_LATENCY': 0, 'FAKE_ERROR_RATE': 0},
+    RATELIMIT_RATES={'chat': '1000/s', 'chat_stream': '1000/s'},
+)
+class BenchmarkTests(TestCase):
+
+    def setUp(self):
+        reset_indexes()
+        reset_gateway()
+        answer_cache.clear()
+        caches['ratelimit'].clear()
+
+    def test_percentile_is_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual([percentile(values, p) for p in (50, 95, 99)], [50, 95, 99])
+        self.assertIsNone(percentile([], 50))
+
+    def test_every_scenario_runs_against_synthetic_data(self):
+        rng = random.Random(1)
+        keywords = seed_faqs(30, rng)
+        seed_logs(40, rng)
+        results = run_benchmark(SCENARIOS, 5, 1, keywords)
+
+        self.assertEqual([r['scenario'] for r in results], list(SCENARIOS))
+        self.assertTrue(all(r['errors'] == 0 and r['p99_ms'] is not None for r in results))
+        hits = ChatSession.objects.filter(session_id__in=LOAD_SESSIONS).exclude(topic='').count()
+        self.assertEqual(hits, 5)
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        reset_indexes()
+        caches['ratelimit'].clear()
+        registry.reset()
+        self.admin = User.objects.create_user(username='adminuser', password='pass123')
+        self.admin.profile.role = 'admin'
+        self.admin.profile.save()
+        KnowledgeBase.objects.create(category='Tuition', question='Fees?', answer='$500.', keywords='tuition, fees')
+
+    def test_chat_stages_and_answer_sources_are_exported(self):
+        self.client.post('/api/chat/', {'message': 'tuition fees', 'session_id': SESSION}, content_type='application/json')
+
+        api = APIClient()
+        api.force_authenticate(user=self.admin)
+        body = api.get('/metrics').content.decode()
+        for stage in ('rate_limit', 'retrieval', 'db_write'):
+            self.assertIn(f'chat_stage_duration_seconds_count{{stage="{stage}"}} 1', body)
+        self.assertIn('chat_answers_total{source="faq"} 1', body)
+        self.assertIn('http_request_duration_seconds_count{route="/api/chat/",method="POST",status="200"} 1', body)
+        self.assertIn('# TYPE llm_request_duration_seconds histogram', body)
+
+    @mock.patch('chat.utils.aget_ai_response', side_effect=LLMUnavailable('circuit open'))
+    def test_llm_failures_are_logged_and_counted(self, _):
+        with self.assertLogs('chat.views', 'WARNING') as logs:
+            res = self.client.post('/api/chat/', {'message': 'parking permits', 'session_id': SESSION},
+                                   content_type='application/json')
+        self.assertEqual(res.status_code, 200)
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual((entry['event'], entry['error'], entry['session_id']), ('chat_error', 'LLMUnavailable', SESSION))
+        self.assertFalse(logs.records[0].exc_info)  # expected failures skip the traceback
+        body = registry.render()
+        self.assertIn('chat_errors_total{endpoint="chat",error="LLMUnavailable"} 1', body)
+        self.assertIn('chat_answers_total{source="fallback"} 1', body)
+
+    def test_metrics_endpoint_is_admin_only(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+
+    @override_settings(METRICS={'SLOW_REQUEST': 0})
+    def test_slow_requests_are_logged_with_span_breakdown(self):
+        with self.assertLogs('chat.metrics', 'WARNING') as logs:
+            self.client.post('/api/chat/', {'message': 'tuition fees'}, content_type='application/json')
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual((entry['route'], entry['status']), ('/api/chat/', 200))
+        self.assertIn('retrieval', entry['spans_ms'])
+        self.assertGreater(entry['db_queries'], 0)
+
+    @override_settings(METRICS={'SLOW_REQUEST': 0})
+    async def test_queries_are_counted_under_asgi(self):
+        with self.assertLogs('chat.metrics', 'WARNING') as logs:
+            await self.async_client.post('/api/chat/', {'message': 'tuition fees'}, content_type='application/json')
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertGreater(entry['db_queries'], 0)
+        self.assertIn('db_write', entry['spans_ms'])
+        self.assertIn('http_request_db_queries_count{route="/api/chat/"} 1', registry.render())
+
+
+class TextNormalizationTests(TestCase):
+
+    def setUp(self):
+        reset_indexes()
+
+    def test_keywords_are_normalized_on_save(self):
+        faq = KnowledgeBase.objects.create(category='Fees', question='Q', answer='A', keywords='Tuition Fees, Café!, the')
+        self.assertEqual(faq.normalized_keywords, 'tuition fee,cafe')
+        self.assertEqual(normalize_keywords('Courses, courses'), 'course')
+
+    def test_punctuation_case_and_plurals_still_match(self):
+        faq = KnowledgeBase.objects.create(category='Fees', question='Q', answer='A', keywords='tuition, fee')
+        self.assertEqual(best_faq('TUITION FEES?').id, faq.id)
+
+    def test_multi_word_keywords_match_as_phrases(self):
+        faq = KnowledgeBase.objects.create(category='Aid', question='Q', answer='A', keywords='financial aid, scholarship')
+        self.assertEqual(best_faq('Is financial aid available with a scholarship?').id, faq.id)
+        self.assertIsNone(best_faq('financial help, any aid or scholarship'))
+
+
+class RoleClaimAuthTests(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client = APIClient()
+        self.admin = User.objects.create_user(username='admin', password='pass')
+        self.admin.profile.role = 'admin'
+        self.admin.profile.save()
+        self.student = User.objects.create_user(username='student', password='pass')
+
+    def login(self, username):
+        res = self.client.post('/api/token/', {'username': username, 'password': 'pass'}, format='json')
+        self.assertEqual(res.status_code, 200)
+        return res.json()
+
+    def test_token_carries_role_claim(self):
+        tokens = self.login('admin')
+        payload = json.loads(base64.urlsafe_b64decode(tokens['access'].split('.')[1] + '=='))
+        self.assertEqual(payload['role'], 'admin')
+        self.assertEqual(payload['ver'], Profile.objects.get(user=self.admin).token_version)
+
+    def test_admin_endpoint_needs_no_queries_to_authorize(self):
+        access = self.login('admin')['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.client.get('/api/admin/llm-stats/')  # caches the token version
+        with self.assertNumQueries(0):
+            res = self.client.get('/api/admin/llm-stats/')
+        self.assertEqual(res.status_code, 200)
+
+    def test_student_token_is_forbidden(self):
+        access = self.login('student')['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(self.client.get('/api/admin/llm-stats/').status_code, 403)
+
+    def test_role_change_revokes_tokens(self):
+        tokens = self.login('admin')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+        self.assertEqual(self.client.get('/api/admin/llm-stats/').status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin.profile.role = 'student'
+            self.admin.profile.save()
+
+        self.assertEqual(self.client.get('/api/admin/llm-stats/').status_code, 403)
+        self.client.credentials()
+        res = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(res.status_code, 401)
+
+
+class TieredCacheTests(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        self.cache = caches['default']
+        # a second process: its own local tier over the same shared store
+        self.other = TieredCache('other-process', {'OPTIONS': {'SHARED': 'shared', 'LOCAL_TTL': 60}})
+        self.other.clear()
+
+    def test_local_tier_answers_repeat_reads(self):
+        self.cache.set('faq_list:1', b'body', 30)
+        with mock.patch.object(caches['shared'], 'get', side_effect=AssertionError('went to L2')):
+            self.assertEqual(self.cache.get('faq_list:1'), b'body')
+        self.other.get('faq_list:1')
+        self.assertEqual(self.other.stats()['faq_list']['shared_hits'], 1)
+        self.assertEqual(self.cache.stats()['faq_list']['local_hits'], 1)
+
+    def test_values_are_copies(self):
+        self.cache.set('memo:1', {'turns': []})
+        self.cache.get('memo:1')['turns'].append('x')
+        self.assertEqual(self.cache.get('memo:1'), {'turns': []})
+
+    def test_other_processes_see_changes_within_local_ttl(self):
+        self.cache.set('token_version:1', 0)
+        self.assertEqual(self.other.get('token_version:1'), 0)
+        self.cache.set('token_version:1', 1)
+        self.assertEqual(self.other.get('token_version:1'), 0)  # still inside its L1 bound
+        later = time.monotonic() + 61
+        with mock.patch('core.cache.time.monotonic', return_value=later):
+            self.assertEqual(self.other.get('token_version:1'), 1)
+
+    def test_invalidate_namespace_reaches_other_processes(self):
+        self.cache.set('answer:a', 'one')
+        self.cache.set('faq_list:a', 'kept')
+        self.assertEqual(self.other.get('answer:a'), 'one')
+        self.cache.invalidate_namespace('answer')
+        self.assertIsNone(self.cache.get('answer:a'))
+        self.assertEqual(self.cache.get('faq_list:a'), 'kept')
+        later = time.monotonic() + 61
+        with mock.patch('core.cache.time.monotonic', return_value=later):
+            self.assertIsNone(self.other.get('answer:a'))
+
+    def test_namespaces_can_skip_the_local_tier(self):
+        self.cache.set('chat_memory:s1', {'turns': []})
+        self.assertEqual(self.cache.stats().get('chat_memory', {}).get('local_entries', 0), 0)
+        self.cache.get('chat_memory:s1')
+        self.assertEqual(self.cache.stats()['chat_memory']['shared_hits'], 1)
+
+    def test_counters_stay_in_the_shared_tier(self):
+        self.cache.add('faq_version', 1, timeout=None)
+        self.assertEqual(self.other.incr('faq_version'), 2)
+        self.assertEqual(self.cache.incr('faq_version'), 3)
+
+    def test_async_get_uses_local_tier(self):
+        self.cache.set('faq_version', 4)
+        with mock.patch.object(caches['shared'], 'aget', side_effect=AssertionError('went to L2')):
+            self.assertEqual(asyncio.run(self.cache.aget('faq_version')), 4)
+
+
+class WarmupTests(TestCase):
+
+    def setUp(self):
+        reset_indexes()
+        warmup.state.update(ready=False, error=None)
+        KnowledgeBase.objects.create(
+            category='Fees', question='How much are fees?', answer='See the portal.', keywords='fees'
+        )
+
+    def tearDown(self):
+        warmup.state.update(ready=False, error=None)
+
+    def test_ready_once_warm_up_has_built_the_index(self):
+        with mock.patch('chat.warmup.get_faq_index', side_effect=RuntimeError('database is down')):
+            res = self.client.get('/ready')
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.json(), {'ready': False, 'error': 'database is down'})
+
+        res = self.client.get('/ready')  # retried by the probe
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['faqs'], 1)
+        with self.assertNumQueries(0):
+            retrieve_faqs('what are the fees')
+
+    def test_ready_when_warm_up_is_disabled(self):
+        with self.settings(CHAT_WARMUP={'ENABLED': False}):
+            self.assertEqual(self.client.get('/ready').status_code, 200)
+
+    def test_clean_message_matches_bleach(self):
+        self.assertEqual(clean_message('<script>x</script><b>hi</b>'), '&lt;script&gt;x&lt;/script&gt;<b>hi</b>')
+
+    def test_views_import_without_the_llm_sdk(self):
+        code = (
+            "import os, sys, django; os.environ['DJANGO_SETTINGS_MODULE'] = 'core.settings'; "
+            "django.setup(); import chat.views; print('groq' in sys.modules, 'bleach' in sys.modules)"
+        )
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                             cwd=settings.BASE_DIR)
+        self.assertEqual(out.stdout.split(), ['False', 'False'])
+
+
+class ReplayChatsTests(TestCase):
+
+    def setUp(self):
+        reset_indexes()
+        KnowledgeBase.objects.create(
+            category='Fees', question='How much are tuition fees?', answer='See the portal.',
+            keywords='fees, tuition'
+        )
+        # answered by the FAQ at the time, answered by the LLM, and one no FAQ covers
+        ChatSession.objects.create(session_id='a', message='tuition fees please', response='x')
+        ChatSession.objects.create(session_id='a', message='what are the fees for tuition', response='y',
+                                   prompt_tokens=200, completion_tokens=40)
+        ChatSession.objects.create(session_id='b', message='where is the gym', response='z',
+                                   prompt_tokens=150, completion_tokens=30)
+
+    def test_reports_hits_and_llm_calls_avoided(self):
+        strict, loose = run_replay([parse_config('keyword:3'), parse_config('keyword:1')], ChatSession.objects.all())
+        self.assertEqual((strict['faq_hits'], strict['llm_calls'], strict['llm_calls_avoided']), (0, 3, 0))
+        self.assertEqual((loose['faq_hits'], loose['llm_calls'], loose['logged_llm_calls']), (2, 1, 2))
+        self.assertEqual((loose['llm_calls_avoided'], loose['tokens_avoided']), (1, 240))
+        self.assertEqual(loose['score_distribution'], {'0': 1, '2': 2})
+
+    def test_chunks_stream_in_id_order_up_to_limit(self):
+        chunks = list(iter_chunks(ChatSession.objects.all(), 2, limit=3))
+        self.assertEqual([len(c) for c in chunks], [2, 1])
+        self.assertEqual(chunks[0][0][0], 'tuition fees please')
+
+    def test_unknown_backend_is_rejected(self):
+        with self.assertRaises(ValueError):
+            parse_config('fuzzy')
+
+    def test_command_compares_configs(self):
+        out = io.StringIO()
+        call_command('replay_chats', '--config', 'keyword', '--config', 'tfidf', '--workers', '1', stdout=out)
+        self.assertIn('tokens_avoided', out.getvalue())
+        self.assertIn('tfidf (threshold 0.35)', out.getvalue())
+
+
+class FAQMiningTests(TestCase):
+
+    def setUp(self):
+        reset_indexes()
+        KnowledgeBase.objects.create(
+            category='Fees', question='How much are tuition fees?', answer='See the portal.',
+            keywords='fees, tuition'
+        )
+        self.admin = User.objects.create_user(username='adminuser', password='pass123')
+        self.admin.profile.role = 'admin'
+        self.admin.profile.save()
+        self.student = User.objects.create_user(username='student', password='pass123')
+        self.client = APIClient()
+
+    def log(self, message, tokens=100, age=3600):
+        chat = ChatSession.objects.create(session_id='s', message=message, response='LLM answer',
+                                          prompt_tokens=tokens, completion_tokens=20)
+        # settled past FAQ_MINING['LAG'] unless asked otherwise
+        ChatSession.objects.filter(pk=chat.pk).update(timestamp=timezone.now() - timedelta(seconds=age))
+        return chat
+
+    def test_similar_questions_share_a_cluster(self):
+        a = minhash({'library', 'opening', 'hours', 'weekend'})
+        self.assertEqual(similarity(a, minhash({'library', 'opening', 'hours', 'weekend'})), 1.0)
+        self.assertLess(similarity(a, minhash({'parking', 'permit', 'price'})), 0.3)
+
+        self.log('What are the library opening hours on the weekend?')
+        self.log('library opening hours on weekend')
+        self.log('When are library opening hours at the weekend?')
+        self.log('How do I get a parking permit?')
+        self.log('hello', tokens=None)  # answered without the LLM
+        run = mine_candidates(batch_size=2)
+        self.assertEqual((run.messages, run.created), (4, 2))
+        top = FAQCandidate.objects.order_by('-count').first()
+        self.assertEqual(top.count, 3)
+        self.assertEqual(top.question, 'What are the library opening hours on the weekend?')
+        self.assertEqual(len(top.samples), 2)
+        self.assertIn('library', top.keywords)
+
+    def test_reruns_only_read_new_messages(self):
+        self.log('library opening hours on weekend')
+        self.assertEqual(mine_candidates().messages, 1)
+        self.log('library opening hours weekend')
+        run = mine_candidates()
+        self.assertEqual((run.messages, run.created, run.updated), (1, 0, 1))
+        self.assertEqual(FAQCandidate.objects.get().count, 2)
+        self.assertEqual(mine_candidates().messages, 0)
+
+    def test_runs_stop_at_recent_messages(self):
+        self.log('library opening hours on weekend')
+        recent = self.log('parking permit price', age=0)
+        self.log('library opening hours weekend')
+        run = mine_candidates()
+        # a row logged after the recent one could have committed before an earlier id
+        self.assertEqual((run.messages, run.last_chat_id), (1, recent.pk - 1))
+
+        ChatSession.objects.filter(pk=recent.pk).update(timestamp=timezone.now() - timedelta(hours=1))
+        self.assertEqual(mine_candidates().messages, 2)
+
+    def test_skips_messages_an_faq_now_answers(self):
+        self.log('what are the tuition fees')
+        self.assertEqual(mine_candidates().messages, 0)
+        self.assertFalse(FAQCandidate.objects.exists())
+
+    def test_admin_reviews_candidates(self):
+        for _ in range(3):
+            self.log('library opening hours on weekend')
+        self.log('parking permit')
+        mine_candidates()
+        url = '/api/admin/faq-candidates/'
+        self.client.force_authenticate(user=self.student)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.force_authenticate(user=self.admin)
+        listed = self.client.get(url).json()
+        self.assertEqual([c['count'] for c in listed], [3])
+        self.assertNotIn('signature', listed[0])
+        self.assertEqual(len(self.client.get(url, {'min_count': 1}).json()), 2)
+
+        pk = listed[0]['id']
+        # no similar FAQ suggested a category, so one must be given
+        self.assertEqual(self.client.post(f'{url}{pk}/accept/', {}, format='json').status_code, 400)
+        res = self.client.post(f'{url}{pk}/accept/', {'category': 'Campus'}, format='json')
+        self.assertEqual(res.status_code, 201)
+        faq = KnowledgeBase.objects.get(pk=res.json()['id'])
+        self.assertEqual((faq.category, faq.answer), ('Campus', 'LLM answer'))
+        self.assertEqual(FAQCandidate.objects.get(pk=pk).faq, faq)
+
+        other = FAQCandidate.objects.get(count=1)
+        self.assertEqual(self.client.post(f'{url}{other.pk}/reject/').json()['status'], 'rejected')
+        self.assertEqual(self.client.get(url, {'min_count': 1}).json(), [])
+
+        # a reviewed candidate can't be accepted (again) or rejected
+        self.assertEqual(self.client.post(f'{url}{pk}/accept/', {'category': 'Campus'}, format='json').status_code, 409)
+        self.assertEqual(self.client.post(f'{url}{other.pk}/accept/', {'category': 'Campus'}, format='json').status_code, 409)
+        self.assertEqual(self.client.post(f'{url}{pk}/reject/').status_code, 409)
+        self.assertEqual(KnowledgeBase.objects.filter(category='Campus').count(), 1)
+        self.assertEqual(self.client.post(f'{url}{pk}/accept/', ['x'], format='json').status_code, 400)
@@ -1,8 +1,10 @@
 from django.urls import path
-from .views import ChatView, ChatLogsView, AnalyticsView
+from .views import ChatView, ChatStreamView, ChatLogsView, AnalyticsView, LLMStatsView
 
 urlpatterns = [
     path('chat/', ChatView.as_view()),
+    path('chat/stream/', ChatStreamView.as_view()),
     path('admin/chat-logs/', ChatLogsView.as_view()),
     path('admin/analytics/', AnalyticsView.as_view()),
+    path('admin/llm-stats/', LLMStatsView.as_view()),
 ]
\ No newline at end of file
@@ -1,90 +1,82 @@
-from django.core.cache import cache
-from faq.models import KnowledgeBase
+import threading
+from collections import namedtuple
 from django.conf import settings
-from groq import Groq
-
-client = Groq(api_key=settings.GROQ_API_KEY)
-
-def get_ai_response(user_message, relevant_faqs, history=None):
-    faq_context = ""
-    if relevant_faqs:
-        faq_context = "Here is some relevant information from the GSU knowledge base:\n\n"
-        for faq in relevant_faqs:
-            faq_context += f"Q: {faq.question}\nA: {faq.answer}\n\n"
-
-    system_prompt = """You are GSU SmartAssist, an intelligent chatbot for Gwanda State University (GSU) in Zimbabwe.
-You help students, staff, and prospective applicants with questions about admissions, programmes, fees,
-academic calendar, library services, ICT support, and general university enquiries.
-Be friendly, concise, and professional. If you don't know something specific about GSU,
-say so honestly and suggest they contact the university directly."""
-
-    if faq_context:
-        system_prompt += f"\n\n{faq_context}"
-
-    messages = [{"role": "system", "content": system_prompt}]
-
-    # inject conversation history (excluding the current message)
-    if history:
-        for msg in history[:-1]:  # exclude last since we add it manually below
-            messages.append({
-                "role": msg['role'],
-                "content": msg['content']
-            })
-
-    # add current message
-    messages.append({"role": "user", "content": user_message})
-
-    response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=messages,
-        max_tokens=300,
-        temperature=0.7
-    )
-
-    return response.choices[0].message.content.strip()
-
-def find_relevant_faqs(message, top_n=3):
-    """Return top N FAQs by keyword score, even partial matches."""
-    message_words = set(message.lower().split())
-    scored = []
-
-    for faq in KnowledgeBase.objects.all():
-        keywords = {k.strip().lower() for k in faq.keywords.split(',')}
-        score = len(message_words.intersection(keywords))
-        if score > 0:
-            scored.append((score, faq))
-
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return [faq for _, faq in scored[:top_n]]
-
-def find_best_faq(message):
-    """Return single best match only if score is strong enough."""
-    message_words = set(message.lower().split())
-    best_match = None
-    best_score = 0
-
-    for faq in KnowledgeBase.objects.all():
-        keywords = {k.strip().lower() for k in faq.keywords.split(',')}
-        score = len(message_words.intersection(keywords))
-        if score > best_score:
-            best_score = score
-            best_match = faq
-
-    # only return if at least 2 keywords matched (strong match)
-    if best_score >= 2:
-        return best_match
-    return None
-
-def is_rate_limited(ip, limit=10, window=60):
-    key = f'ratelimit_{ip}'
-    requests = cache.get(key, 0)
-    if requests >= limit:
-        return True
-    cache.set(key, requests + 1, timeout=window)
-    return False
+from .index import get_faq_index, get_match_threshold
+from .answer_cache import answer_cache
+from .llm import get_gateway, Completion
+from .prompt import build_prompt
+from .singleflight import llm_flights
+
+_cleaners = threading.local()
+
+def clean_message(text):
+    """Strip HTML/script tags from user input.
+
+    bleach is imported and its Cleaner built on first use rather than with the
+    module; each thread gets its own Cleaner, as they aren't thread-safe.
+    """
+    cleaner = getattr(_cleaners, 'cleaner', None)
+    if cleaner is None:
+        import bleach
+        cleaner = _cleaners.cleaner = bleach.Cleaner()
+    return cleaner.clean(text)
+
+async def aget_ai_response(user_message, relevant_faqs, history=None):
+    """Ask the LLM; returns a Completion with the answer text and token counts.
+
+    The call waits on the event loop instead of holding a thread.
+    """
+    return await get_gateway().acomplete(build_prompt(user_message, relevant_faqs, history).messages)
+
+async def stream_ai_response(prompt):
+    """Async generator yielding the answer to a built Prompt in chunks as the LLM produces them."""
+    async for token in get_gateway().astream(prompt.messages):
+        yield token
+
+async def aget_cached_ai_response(user_message, relevant_faqs, history=None):
+    """aget_ai_response, but repeat questions with the same FAQ context skip the LLM.
+
+    Identical questions arriving while the first is still waiting on the LLM
+    share that one upstream call instead of each making their own.
+    """
+    key = answer_cache.make_key(user_message, relevant_faqs, history)
+    if key is None:
+        return await aget_ai_response(user_message, relevant_faqs, history)
+    answer = await answer_cache.aget(key)
+    if answer is not None:
+        # no tokens were spent on this one
+        return Completion(answer, 0, 0)
+
+    async def fetch():
+        completion = await aget_ai_response(user_message, relevant_faqs, history)
+        answer_cache.set(key, completion.text, relevant_faqs)
+        return completion
+    return await llm_flights.ado(key, fetch, timeout=settings.CHAT_COALESCE_WAIT)
+
+RetrievalResult = namedtuple('RetrievalResult', ['best', 'candidates'])
+
+def retrieve_faqs(message, top_n=3):
+    """Score the knowledge base once and return the strong match (if any) plus the top N.
+
+    candidates is a list of (score, faq) pairs, best first. Scoring and the
+    strong-match threshold come from settings.CHAT_RETRIEVAL.
+    """
+    index = get_faq_index()
+    return _result(index, index.search(message, top_n))
+
+async def aretrieve_faqs(message, top_n=3):
+    """Async retrieve_faqs; only reloading a stale index touches the database."""
+    index = get_faq_index()
+    return _result(index, await index.asearch(message, top_n))
+
+def _result(index, candidates):
+    best = None
+    if candidates and candidates[0][0] >= get_match_threshold(index):
+        best = candidates[0][1]
+    return RetrievalResult(best=best, candidates=candidates)
 
 def get_client_ip(request):
     forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
     if forwarded:
-        return forwarded.split(',')[0]
+        return forwarded.split(',')[0].strip()
     return request.META.get('REMOTE_ADDR')
@@ -0,0 +1,175 @@
+import math
+from collections import Counter
+import numpy as np
+from faq.text import terms as text_terms
+from .index import FAQIndex, top_candidates
+
+NO_POSTINGS = (np.zeros(0, dtype=np.int32), np.zeros(0))
+
+
+def features(text):
+    """Stemmed words plus character 4-grams, so word variants still overlap."""
+    terms = []
+    for word in text_terms(text):
+        terms.append(word)
+        padded = f' {word} '
+        if len(padded) > 5:
+            terms.extend('#' + padded[i:i + 4] for i in range(len(padded) - 3))
+    return Counter(terms)
+
+
+def feature_weights(entry):
+    text = ' '.join([entry.question, entry.answer, ' '.join(sorted(entry.keywords))])
+    return {term: 1 + math.log(count) for term, count in features(text).items()}
+
+
+class VectorIndex(FAQIndex):
+    """TF-IDF cosine similarity (0..1) over each FAQ's question, answer and keywords.
+
+    Stored sparse: each feature has a posting list of (FAQ slot, term weight)
+    NumPy arrays, so memory follows the amount of text rather than FAQs x
+    vocabulary, and a query only reads the postings of its own features.
+
+    An edit only touches the changed FAQ's postings. With idf = a - log(1 + df)
+    (a = log(1 + FAQ count) + 1), a FAQ's squared norm is
+    a^2 * S0 - 2a * S1 + S2 over S0 = sum(w^2), S1 = sum(w^2 log(1 + df)) and
+    S2 = sum(w^2 log(1 + df)^2); those sums are kept per FAQ, and a feature's
+    df changing only adjusts S1 and S2 of the FAQs that contain it.
+    """
+
+    default_threshold = 0.35
+
+    def _clear(self):
+        self.vocab = {}         # feature -> column
+        self.postings = []      # column -> (slots, weights)
+        self.doc_columns = {}   # faq id -> its features' columns
+        self.slots = {}         # faq id -> slot
+        self.slot_ids = []      # slot -> faq id, None once freed
+        self.free_slots = []
+        self.sums = np.zeros((0, 3))  # per slot: S0, S1, S2
+
+    def _take_slot(self, faq_id):
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.slot_ids[slot] = faq_id
+        else:
+            slot = len(self.slot_ids)
+            self.slot_ids.append(faq_id)
+            if slot >= len(self.sums):
+                grown = np.zeros((max(16, 2 * len(self.sums)), 3))
+                grown[:len(self.sums)] = self.sums
+                self.sums = grown
+        self.slots[faq_id] = slot
+        return slot
+
+    def _shift_df(self, slots, weights, old_df, new_df):
+        """Adjust S1 and S2 of the FAQs in a posting list for its feature's new df."""
+        old, new = math.log1p(old_df), math.log1p(new_df)
+        if len(slots):
+            squared = weights ** 2
+            self.sums[slots, 1] += squared * (new - old)
+            self.sums[slots, 2] += squared * (new * new - old * old)
+        return new
+
+    def _column(self, term):
+        column = self.vocab.get(term)
+        if column is None:
+            column = self.vocab[term] = len(self.postings)
+            self.postings.append(NO_POSTINGS)
+        return column
+
+    def _add(self, entry):
+        weights = feature_weights(entry)
+        slot = self._take_slot(entry.id)
+        columns = []
+        sums = np.zeros(3)
+        for term, weight in weights.items():
+            column = self._column(term)
+            columns.append(column)
+            slots, posting_weights = self.postings[column]
+            log_df = self._shift_df(slots, posting_weights, len(slots), len(slots) + 1)
+            self.postings[column] = (np.append(slots, np.int32(slot)), np.append(posting_weights, weight))
+            squared = weight * weight
+            sums += (squared, squared * log_df, squared * log_df * log_df)
+        self.doc_columns[entry.id] = np.array(columns, dtype=np.int32)
+        self.sums[slot] = sums
+
+    def _add_many(self, entries):
+        # a full load sorts every (column, slot, weight) triple once instead of
+        # appending FAQ by FAQ
+        vocab = self.vocab
+        all_columns, all_weights, lengths = [], [], []
+        for entry in entries:
+            self._take_slot(entry.id)
+            weights = feature_weights(entry)
+            columns = np.fromiter((vocab.setdefault(t, len(vocab)) for t in weights), np.int32, len(weights))
+            self.doc_columns[entry.id] = columns
+            all_columns.append(columns)
+            all_weights.append(np.fromiter(weights.values(), np.float64, len(weights)))
+            lengths.append(len(weights))
+        self.postings.extend([NO_POSTINGS] * (len(vocab) - len(self.postings)))
+        if not all_columns:
+            return
+        columns = np.concatenate(all_columns)
+        weights = np.concatenate(all_weights)
+        slots = np.repeat(np.arange(len(lengths), dtype=np.int32), lengths)
+        order = np.argsort(columns, kind='stable')
+        columns, weights, slots = columns[order], weights[order], slots[order]
+        starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+        ends = np.r_[starts[1:], len(columns)]
+        for column, start, end in zip(columns[starts].tolist(), starts.tolist(), ends.tolist()):
+            self.postings[column] = (slots[start:end], weights[start:end])
+        log_df = np.repeat(np.log1p(ends - starts), ends - starts)
+        squared = weights ** 2
+        size = len(self.sums)
+        self.sums[:, 0] = np.bincount(slots, squared, minlength=size)
+        self.sums[:, 1] = np.bincount(slots, squared * log_df, minlength=size)
+        self.sums[:, 2] = np.bincount(slots, squared * log_df * log_df, minlength=size)
+
+    def _discard(self, entry):
+        columns = self.doc_columns.pop(entry.id, None)
+        if columns is None:
+            return
+        slot = self.slots.pop(entry.id)
+        for column in columns:
+            slots, posting_weights = self.postings[column]
+            keep = slots != slot
+            slots, posting_weights = slots[keep], posting_weights[keep]
+            self._shift_df(slots, posting_weights, len(slots) + 1, len(slots))
+            self.postings[column] = (slots, posting_weights)
+        self.sums[slot] = 0
+        self.slot_ids[slot] = None
+        self.free_slots.append(slot)
+
+    def _score(self, message, top_n):
+        with self._lock:
+            if not self.doc_columns:
+                return []
+            a = math.log(1 + len(self.doc_columns)) + 1
+            matched, contributions, query_norm = [], [], 0.0
+            for term, count in features(message).items():
+                column = self.vocab.get(term)
+                if column is None:
+                    continue
+                slots, weights = self.postings[column]
+                if not len(slots):
+                    continue
+                idf = a - math.log1p(len(slots))
+                query_weight = (1 + math.log(count)) * idf
+                query_norm += query_weight * query_weight
+                matched.append(slots)
+                contributions.append(weights * (query_weight * idf))
+            if not matched:
+                return []
+            dots = np.bincount(np.concatenate(matched), np.concatenate(contributions), minlength=len(self.slot_ids))
+            hit = np.flatnonzero(dots > 0)
+            s0, s1, s2 = self.sums[hit].T
+            norms = np.sqrt(np.maximum(a * a * s0 - 2 * a * s1 + s2, 1e-12))
+            scores = dots[hit] / (norms * math.sqrt(query_norm))
+            # only the best few need a proper ordering
+            if len(scores) > top_n:
+                picked = np.argpartition(-scores, top_n - 1)[:top_n]
+            else:
+                picked = np.arange(len(scores))
+            scored = [(float(scores[i]), self.entries[self.slot_ids[hit[i]]]) for i in picked]
+        return top_candidates(scored, top_n)
@@ -1,144 +1,411 @@
+import base64
+import binascii
+import csv
+import itertools
+import json
+import logging
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
-from .models import ChatSession
-import bleach
-from .utils import get_ai_response,find_relevant_faqs,is_rate_limited,find_best_faq,get_client_ip
-from django.db.models import Count
-from django.db.models.functions import TruncDate
-from faq.models import KnowledgeBase
-
-class ChatView(APIView):
-    permission_classes = [AllowAny]
+from rest_framework.permissions import AllowAny
+from .auth import IsAdminRole
+from .models import ChatSession, DailyChatStats, DailyTopicStats, SessionStats
+from .utils import aget_cached_ai_response,aretrieve_faqs,clean_message,get_client_ip,stream_ai_response
+from .ratelimit import acheck_rate_limit, rate_limit_headers
+from .analytics import DASHBOARD_KEY
+from .answer_cache import answer_cache
+from .llm import LLMError, get_gateway
+from .singleflight import llm_flights
+from .chatlog import alog_chat
+from .memory import aget_history, parse_session_id
+from .prompt import build_prompt, estimate_tokens
+from .metrics import chat_errors, record_answer, registry, span
+from . import warmup
+from django.db.models import Sum
 
-    def post(self, request):
-        ip = get_client_ip(request)
-        if is_rate_limited(ip):
-            return Response(
-                {'error': 'Too many requests. Please slow down and try again in a minute.'},
-                status=429
-            )
+logger = logging.getLogger(__name__)
+
+FALLBACK_RESPONSE = (
+    "I'm sorry, I couldn't find information on that. "
+    "Please contact GSU directly or visit the main website."
+)
+RATE_LIMIT_ERROR = 'Too many requests. Please slow down and try again in a minute.'
+BODY_ERROR = 'Send a JSON object, e.g. {"message": "..."}, as application/json'
+
+
+def json_object(request):
+    """The request body parsed as a JSON object, or None. Form and multipart posts aren't accepted."""
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
 
-        message = request.data.get('message', '').strip()
-        message = bleach.clean(message)  # strips any HTML/script tags
-        session_id = request.data.get('session_id', 'anonymous')
-        history = request.data.get('history', [])
+# Async so that, served through core.asgi, one worker can wait on many LLM calls at once
+@method_decorator(csrf_exempt, name='dispatch')
+class ChatView(View):
+    http_method_names = ['post', 'options']
+
+    async def post(self, request):
+        with span('rate_limit'):
+            limit = await acheck_rate_limit('chat', get_client_ip(request))
+        if limit.limited:
+            return JsonResponse({'error': RATE_LIMIT_ERROR}, status=429, headers=rate_limit_headers(limit))
+
+        data = json_object(request)
+        if data is None:
+            return JsonResponse({'error': BODY_ERROR}, status=400, headers=rate_limit_headers(limit))
+
+        message = str(data.get('message', '')).strip()
+        message = clean_message(message)  # strips any HTML/script tags
 
         if not message:
-            return Response({'error': 'Message is required'}, status=400)
+            return JsonResponse({'error': 'Message is required'}, status=400, headers=rate_limit_headers(limit))
+        try:
+            session_id = parse_session_id(data.get('session_id'))
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400, headers=rate_limit_headers(limit))
 
-        best_match = find_best_faq(message)
-        if best_match:
-            response_text = best_match.answer
+        # conversation history is kept server side; anything the client sends is ignored
+        with span('history'):
+            history = await aget_history(session_id)
+
+        # one scoring pass gives both the direct answer and the LLM context
+        with span('retrieval'):
+            result = await aretrieve_faqs(message, top_n=3)
+        prompt_tokens = completion_tokens = None
+        if result.best:
+            response_text = result.best.answer
+            record_answer('faq')
         else:
             try:
-                relevant_faqs = find_relevant_faqs(message, top_n=3)
-                response_text = get_ai_response(message, relevant_faqs, history)
+                relevant_faqs = [faq for _, faq in result.candidates]
+                with span('llm'):
+                    completion = await aget_cached_ai_response(message, relevant_faqs, history)
+                response_text = completion.text
+                prompt_tokens, completion_tokens = completion.prompt_tokens, completion.completion_tokens
+                record_answer('llm')
             except Exception as e:
-                print(f"AI error: {e}")
-                response_text = (
-                    "I'm sorry, I couldn't find information on that. "
-                    "Please contact GSU directly or visit the main website."
-                )
-
-        ChatSession.objects.create(
-            session_id=session_id,
-            message=message,
-            response=response_text
-        )
+                log_chat_error('chat', session_id, e)
+                response_text = FALLBACK_RESPONSE
+                record_answer('fallback')
 
-        return Response({
+        with span('db_write'):
+            await alog_chat(session_id, message, response_text, result, prompt_tokens, completion_tokens)
+
+        return JsonResponse({
             'response': response_text,
             'session_id': session_id
-        })
+        }, headers=rate_limit_headers(limit))
+
+
+def log_chat_error(endpoint, session_id, error):
+    """Count a failed LLM answer and log it as one JSON line; unexpected errors get a traceback."""
+    chat_errors.inc(endpoint, type(error).__name__)
+    logger.warning(json.dumps({
+        'event': 'chat_error',
+        'endpoint': endpoint,
+        'session_id': session_id,
+        'error': type(error).__name__,
+        'detail': str(error),
+    }), exc_info=not isinstance(error, LLMError))
+
+
+def sse_event(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+# Streaming variant of ChatView - relays LLM tokens as Server-Sent Events.
+# Async so that, served through core.asgi, one worker can hold many open streams.
+@method_decorator(csrf_exempt, name='dispatch')
+class ChatStreamView(View):
+    http_method_names = ['post', 'options']
+
+    async def post(self, request):
+        with span('rate_limit'):
+            limit = await acheck_rate_limit('chat_stream', get_client_ip(request))
+        if limit.limited:
+            return JsonResponse({'error': RATE_LIMIT_ERROR}, status=429, headers=rate_limit_headers(limit))
+
+        data = json_object(request)
+        if data is None:
+            return JsonResponse({'error': BODY_ERROR}, status=400, headers=rate_limit_headers(limit))
+
+        message = clean_message(str(data.get('message', '')).strip())
+
+        if not message:
+            return JsonResponse({'error': 'Message is required'}, status=400, headers=rate_limit_headers(limit))
+        try:
+            session_id = parse_session_id(data.get('session_id'))
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400, headers=rate_limit_headers(limit))
+
+        with span('history'):
+            history = await aget_history(session_id)
+
+        with span('retrieval'):
+            result = await aretrieve_faqs(message, top_n=3)
+        relevant_faqs = [faq for _, faq in result.candidates]
+
+        async def events():
+            prompt_tokens = completion_tokens = None
+            if result.best:
+                # direct FAQ hit - nothing to wait for, send the whole answer at once
+                response_text = result.best.answer
+                record_answer('faq')
+                yield sse_event({'token': response_text})
+            else:
+                key = answer_cache.make_key(message, relevant_faqs, history)
+                response_text = await answer_cache.aget(key) if key else None
+                if response_text is not None:
+                    prompt_tokens = completion_tokens = 0
+                    record_answer('llm')
+                    yield sse_event({'token': response_text})
+                else:
+                    prompt = build_prompt(message, relevant_faqs, history)
+                    tokens = []
+                    # covers the whole stream, including time spent sending tokens to the client
+                    with span('llm'):
+                        try:
+                            async for token in stream_ai_response(prompt):
+                                tokens.append(token)
+                                yield sse_event({'token': token})
+                            response_text = ''.join(tokens).strip()
+                            record_answer('llm')
+                            # streams don't report usage, so log the local estimate
+                            prompt_tokens, completion_tokens = prompt.tokens, estimate_tokens(response_text)
+                            if key:
+                                answer_cache.set(key, response_text, relevant_faqs)
+                        except Exception as e:
+                            log_chat_error('stream', session_id, e)
+                            # keep whatever already reached the user, else apologise
+                            response_text = ''.join(tokens).strip()
+                            record_answer('llm' if response_text else 'fallback')
+                            if not response_text:
+                                response_text = FALLBACK_RESPONSE
+                                yield sse_event({'token': response_text})
+
+            # log the exchange once the full answer is known
+            with span('db_write'):
+                await alog_chat(session_id, message, response_text, result, prompt_tokens, completion_tokens)
+            yield sse_event({'response': response_text, 'session_id': session_id}, event='done')
+
+        response = StreamingHttpResponse(events(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # stop proxies from buffering the stream
+        for header, value in rate_limit_headers(limit).items():
+            response[header] = value
+        return response
+
+
+LOG_FIELDS = ['id', 'session_id', 'message', 'response', 'timestamp']
+LOG_PAGE_SIZE = 50
+LOG_MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(log):
+    raw = f"{log['timestamp'].isoformat()}|{log['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    timestamp, log_id = raw.rsplit('|', 1)
+    parsed = parse_datetime(timestamp)
+    if parsed is None:
+        raise ValueError('bad cursor timestamp')
+    return parsed, int(log_id)
+
+
+def parse_bound(value, end_of_day=False):
+    """Accept a date or datetime; a bare date used as an upper bound covers the whole day."""
+    parsed = parse_datetime(value)
+    if parsed is not None:
+        return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f'invalid date: {value}')
+    if end_of_day:
+        day += timedelta(days=1)
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class Echo:
+    """File-like object whose write() hands the line back, so csv.writer can feed a stream."""
+
+    def write(self, value):
+        return value
 
 
 class ChatLogsView(APIView):
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAdminRole]
 
     def get(self, request):
-        if request.user.profile.role != 'admin':
-            return Response({'error': 'Forbidden'}, status=403)
-        
-        logs = ChatSession.objects.all().order_by('-timestamp')
-        data = [
-            {
-                'session_id': log.session_id,
-                'message': log.message,
-                'response': log.response,
-                'timestamp': log.timestamp
-            }
-            for log in logs
-        ]
-        return Response(data)
+        params = request.query_params
+        logs = ChatSession.objects.all()
+        try:
+            if params.get('session_id'):
+                logs = logs.filter(session_id=params['session_id'])
+            if params.get('since'):
+                logs = logs.filter(timestamp__gte=parse_bound(params['since']))
+            if params.get('until'):
+                logs = logs.filter(timestamp__lt=parse_bound(params['until'], end_of_day=True))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+
+        export = params.get('export')
+        if export in ('ndjson', 'csv'):
+            return self.export(logs.order_by('timestamp', 'id'), export)
+        if export:
+            return Response({'error': 'export must be ndjson or csv'}, status=400)
+
+        # keyset pagination on (timestamp, id), newest first - every page is one index range scan
+        try:
+            limit = min(int(params.get('limit', LOG_PAGE_SIZE)), LOG_MAX_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError
+            if params.get('cursor'):
+                timestamp, log_id = decode_cursor(params['cursor'])
+                logs = logs.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=log_id))
+        except (ValueError, UnicodeDecodeError, binascii.Error):
+            return Response({'error': 'Invalid cursor or limit'}, status=400)
+
+        page = list(logs.order_by('-timestamp', '-id').values(*LOG_FIELDS)[:limit + 1])
+        next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+        return Response({
+            'results': [
+                {
+                    'session_id': log['session_id'],
+                    'message': log['message'],
+                    'response': log['response'],
+                    'timestamp': log['timestamp']
+                }
+                for log in page[:limit]
+            ],
+            'next_cursor': next_cursor,
+        })
+
+    def export(self, logs, fmt):
+        # .iterator() streams rows from a server-side cursor, so memory stays flat however many rows
+        rows = logs.values_list(*LOG_FIELDS).iterator(chunk_size=2000)
+        if fmt == 'ndjson':
+            lines = (
+                json.dumps({
+                    'session_id': session_id,
+                    'message': message,
+                    'response': response,
+                    'timestamp': timestamp.isoformat()
+                }) + '\n'
+                for _, session_id, message, response, timestamp in rows
+            )
+            content_type = 'application/x-ndjson'
+        else:
+            writer = csv.writer(Echo())
+            header = [writer.writerow(['session_id', 'message', 'response', 'timestamp'])]
+            lines = itertools.chain(header, (
+                writer.writerow([session_id, message, response, timestamp.isoformat()])
+                for _, session_id, message, response, timestamp in rows
+            ))
+            content_type = 'text/csv'
+        response = StreamingHttpResponse(lines, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="chat-logs.{fmt}"'
+        return response
 
 class AnalyticsView(APIView):
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAdminRole]
 
     def get(self, request):
-        if request.user.profile.role != 'admin':
-            return Response({'error': 'Forbidden'}, status=403)
+        # dashboards poll this; the rendered figures are reused until chat.analytics
+        # records new messages (or CACHE_TTL passes)
+        data = cache.get(DASHBOARD_KEY)
+        if data is None:
+            data = self.build()
+            cache.set(DASHBOARD_KEY, data, timeout=settings.CHAT_ANALYTICS['CACHE_TTL'])
+        return Response(data)
 
-        # total messages over time
-        messages_over_time = (
-            ChatSession.objects
-            .annotate(date=TruncDate('timestamp'))
-            .values('date')
-            .annotate(count=Count('id'))
-            .order_by('date')
-        )
+    def build(self):
+        # everything here comes from the rollup tables kept by chat.analytics,
+        # so the cost doesn't grow with the size of the chat log
 
-        # most asked topics — based on first word grouping
-        # we detect topic by checking which FAQ keywords appear in the message
-        all_sessions = ChatSession.objects.all()
-        topic_counts = {}
-        unmatched = 0
-
-        for session in all_sessions:
-            message_words = set(session.message.lower().split())
-            best_score = 0
-            best_category = None
-
-            for faq in KnowledgeBase.objects.all():
-                keywords = {k.strip().lower() for k in faq.keywords.split(',')}
-                score = len(message_words.intersection(keywords))
-                if score > best_score:
-                    best_score = score
-                    best_category = faq.category
-
-            if best_category and best_score >= 1:
-                topic_counts[best_category] = topic_counts.get(best_category, 0) + 1
-            else:
-                unmatched += 1
+        # total messages over time
+        daily = DailyChatStats.objects.order_by('date')
+        totals = daily.aggregate(messages=Sum('messages'), unmatched=Sum('unmatched'))
 
-        # messages per session
-        messages_per_session = (
-            ChatSession.objects
-            .values('session_id')
-            .annotate(count=Count('id'))
-            .order_by('-count')[:10]  # top 10 sessions
+        # most asked topics - the FAQ category each message matched when it was logged
+        topics = (
+            DailyTopicStats.objects
+            .values('topic')
+            .annotate(count=Sum('count'))
+            .order_by('-count', 'topic')
         )
 
-        # summary stats
-        total_messages = ChatSession.objects.count()
-        total_sessions = ChatSession.objects.values('session_id').distinct().count()
+        # messages per session
+        messages_per_session = SessionStats.objects.order_by('-messages')[:10]  # top 10 sessions
 
-        return Response({
+        return {
             'summary': {
-                'total_messages': total_messages,
-                'total_sessions': total_sessions,
-                'unmatched_queries': unmatched,
+                'total_messages': totals['messages'] or 0,
+                'total_sessions': SessionStats.objects.count(),
+                'unmatched_queries': totals['unmatched'] or 0,
             },
             'messages_over_time': [
-                {'date': str(item['date']), 'messages': item['count']}
-                for item in messages_over_time
+                {'date': str(item.date), 'messages': item.messages}
+                for item in daily
             ],
             'topics': [
-                {'topic': k, 'count': v}
-                for k, v in sorted(topic_counts.items(), key=lambda x: x[1], reverse=True)
+                {'topic': item['topic'], 'count': item['count']}
+                for item in topics
             ],
             'messages_per_session': [
-                {'session': item['session_id'][:12] + '...', 'messages': item['count']}
+                {'session': item.session_id[:12] + '...', 'messages': item.messages}
                 for item in messages_per_session
             ]
-        })
\ No newline at end of file
+        }
+
+
+class LLMStatsView(APIView):
+    permission_classes = [IsAdminRole]
+
+    def get(self, request):
+        return Response({
+            'llm': get_gateway().stats(),
+            'answer_cache': answer_cache.stats(),
+            'coalescing': llm_flights.stats(),
+            'cache': cache.stats(),
+        })
+
+
+# Prometheus scrape target; figures are per server process like the stats above
+class MetricsView(APIView):
+    permission_classes = [IsAdminRole]
+
+    def get(self, request):
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# readiness probe for load balancers and orchestrators: 503 until the startup
+# warm-up (chat.warmup) has finished; a failed warm-up is retried here
+class ReadyView(APIView):
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def get(self, request):
+        if not warmup.is_ready() and not warmup.warm_up():
+            return Response({'ready': False, 'error': warmup.state['error']}, status=503)
+        state = warmup.state
+        return Response({
+            'ready': True,
+            'warmed_up_at': state['finished_at'],
+            'warmup_ms': state['duration_ms'],
+            'faqs': state['faqs'],
+        })
@@ -0,0 +1,56 @@
+import gc
+import logging
+import time
+from django.conf import settings
+from django.db import connections
+from django.urls import get_resolver
+from django.utils import timezone
+from .index import get_faq_index
+from .llm import get_gateway
+from .utils import clean_message
+
+logger = logging.getLogger(__name__)
+
+# what the readiness endpoint reports
+state = {'ready': False, 'finished_at': None, 'duration_ms': None, 'faqs': None, 'error': None}
+
+
+def warm_up():
+    """Do the work every worker would otherwise repeat on its first requests:
+    import the views (and the LLM SDK), build the FAQ index, set up bleach."""
+    started = time.perf_counter()
+    try:
+        get_resolver().url_patterns
+        get_gateway().provider.preload()
+        clean_message('')
+        index = get_faq_index()
+        index.rebuild()
+    except Exception as e:
+        # not fatal: the worker builds what it needs on first use instead
+        logger.warning('Warm-up failed: %s', e)
+        state['error'] = str(e)
+        return False
+    state.update(
+        ready=True,
+        finished_at=timezone.now(),
+        duration_ms=round((time.perf_counter() - started) * 1000, 1),
+        faqs=len(index.entries),
+        error=None,
+    )
+    return True
+
+
+def warm_up_at_startup():
+    """Called from core.wsgi / core.asgi. With gunicorn --preload that is once, in
+    the master, before it forks; the workers then share the index copy-on-write,
+    which gc.freeze() keeps the garbage collector from undoing."""
+    if not settings.CHAT_WARMUP['ENABLED']:
+        return
+    warm_up()
+    # an open database connection must not be shared with forked workers
+    connections.close_all()
+    gc.freeze()
+
+
+def is_ready():
+    return state['ready'] or not settings.CHAT_WARMUP['ENABLED']
@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_asgi_application()
+
+# import the views and build the FAQ index before serving; with gunicorn --preload
+# this happens once in the master and the workers share it (see chat.warmup)
+from chat.warmup import warm_up_at_startup  # noqa: E402
+
+warm_up_at_startup()
@@ -0,0 +1,275 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+MISSING = object()
+
+
+def namespace_of(key):
+    """'faq_list:3:ab12' -> 'faq_list'. Keys without a colon are their own namespace."""
+    return key.partition(':')[0]
+
+
+def throwaway_caches(cache_settings):
+    """A copy of CACHES with every store swapped for a fresh in-process one.
+
+    For the test suite and the benchmark, which clear caches freely and must
+    never reach a real Redis.
+    """
+    throwaway = {}
+    for alias, config in cache_settings.items():
+        if config['BACKEND'] == 'core.cache.TieredCache':
+            throwaway[alias] = {**config, 'LOCATION': f'throwaway-{alias}'}
+        else:
+            throwaway[alias] = {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': f'throwaway-{alias}',
+            }
+    return throwaway
+
+
+class LocalTier:
+    """The in-process half of a TieredCache: a bounded LRU of pickled values, the
+    namespace generations last read from the shared store, and lookup counts.
+
+    One per cache alias and process - Django hands each thread its own cache
+    object, so this state lives at module level like LocMemCache's.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.generations = {}
+        self.stats = {}
+
+    def count(self, namespace, result):
+        with self.lock:
+            counts = self.stats.setdefault(namespace, {'local_hits': 0, 'shared_hits': 0, 'misses': 0})
+            counts[result] += 1
+
+
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+class TieredCache(BaseCache):
+    """A bounded in-process LRU (L1) in front of a shared cache (L2, another CACHES alias).
+
+    Reads are served from L1 for at most LOCAL_TTL seconds, so a value changed
+    by another process is seen within that bound; writes go through to L2.
+    Namespaces (the part of a key before the first colon) can have their own
+    local TTL in LOCAL_TTL_BY_NAMESPACE, 0 keeping them out of L1 altogether.
+
+    invalidate_namespace() drops every key in a namespace at once by bumping a
+    generation counter in L2 that is folded into the shared keys; other
+    processes pick up the new generation, and stop serving their L1 copies,
+    within LOCAL_TTL.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options['SHARED']
+        self.local_ttl = float(options.get('LOCAL_TTL', 2))
+        self.local_max_entries = int(options.get('LOCAL_MAX_ENTRIES', 5000))
+        self.local_ttl_by_namespace = options.get('LOCAL_TTL_BY_NAMESPACE', {})
+        with _tiers_lock:
+            self.local = _tiers.setdefault(location or 'default', LocalTier())
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _ttl(self, namespace, timeout=DEFAULT_TIMEOUT):
+        ttl = self.local_ttl_by_namespace.get(namespace, self.local_ttl)
+        if timeout is not DEFAULT_TIMEOUT and timeout is not None:
+            ttl = min(ttl, timeout)
+        return ttl
+
+    # generations
+
+    def _generation_key(self, namespace):
+        return f'cache_generation:{namespace}'
+
+    def _cached_generation(self, namespace):
+        with self.local.lock:
+            item = self.local.generations.get(namespace)
+        if item is not None and item[1] > time.monotonic():
+            return item[0]
+        return None
+
+    def _remember_generation(self, namespace, generation):
+        with self.local.lock:
+            self.local.generations[namespace] = (generation, time.monotonic() + self.local_ttl)
+
+    def _generation(self, namespace):
+        generation = self._cached_generation(namespace)
+        if generation is None:
+            generation = self.shared.get(self._generation_key(namespace), 0)
+            self._remember_generation(namespace, generation)
+        return generation
+
+    async def _ageneration(self, namespace):
+        generation = self._cached_generation(namespace)
+        if generation is None:
+            generation = await self.shared.aget(self._generation_key(namespace), 0)
+            self._remember_generation(namespace, generation)
+        return generation
+
+    def _shared_key(self, key, generation):
+        return f'{key}#{generation}' if generation else key
+
+    def invalidate_namespace(self, namespace):
+        """Make every key in namespace a miss, in this process now and in others within LOCAL_TTL."""
+        key = self._generation_key(namespace)
+        try:
+            generation = self.shared.incr(key)
+        except ValueError:
+            self.shared.add(key, 1, timeout=None)
+            generation = self.shared.get(key, 1)
+        self._remember_generation(namespace, generation)
+        with self.local.lock:
+            for local_key in [k for k, item in self.local.entries.items() if item[2] == namespace]:
+                del self.local.entries[local_key]
+
+    # L1
+
+    def _local_get(self, local_key, generation):
+        now = time.monotonic()
+        with self.local.lock:
+            item = self.local.entries.get(local_key)
+            if item is None:
+                return MISSING
+            if item[1] <= now or item[3] != generation:
+                del self.local.entries[local_key]
+                return MISSING
+            self.local.entries.move_to_end(local_key)
+            return pickle.loads(item[0])
+
+    def _local_set(self, local_key, value, namespace, generation, timeout=DEFAULT_TIMEOUT):
+        ttl = self._ttl(namespace, timeout)
+        if ttl <= 0:
+            return
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.local.lock:
+            self.local.entries[local_key] = (pickled, time.monotonic() + ttl, namespace, generation)
+            self.local.entries.move_to_end(local_key)
+            while len(self.local.entries) > self.local_max_entries:
+                self.local.entries.popitem(last=False)
+
+    def _local_delete(self, local_key):
+        with self.local.lock:
+            self.local.entries.pop(local_key, None)
+
+    def _keys(self, key, version, generation):
+        shared_key = self._shared_key(key, generation)
+        return shared_key, self.shared.make_and_validate_key(shared_key, version=version)
+
+    # cache API
+
+    def get(self, key, default=None, version=None):
+        namespace = namespace_of(key)
+        generation = self._generation(namespace)
+        shared_key, local_key = self._keys(key, version, generation)
+        value = self._local_get(local_key, generation)
+        if value is not MISSING:
+            self.local.count(namespace, 'local_hits')
+            return value
+        value = self.shared.get(shared_key, MISSING, version=version)
+        if value is MISSING:
+            self.local.count(namespace, 'misses')
+            return default
+        self.local.count(namespace, 'shared_hits')
+        self._local_set(local_key, value, namespace, generation)
+        return value
+
+    async def aget(self, key, default=None, version=None):
+        # an L1 hit answers without leaving the event loop
+        namespace = namespace_of(key)
+        generation = await self._ageneration(namespace)
+        shared_key, local_key = self._keys(key, version, generation)
+        value = self._local_get(local_key, generation)
+        if value is not MISSING:
+            self.local.count(namespace, 'local_hits')
+            return value
+        value = await self.shared.aget(shared_key, MISSING, version=version)
+        if value is MISSING:
+            self.local.count(namespace, 'misses')
+            return default
+        self.local.count(namespace, 'shared_hits')
+        self._local_set(local_key, value, namespace, generation)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        namespace = namespace_of(key)
+        generation = self._generation(namespace)
+        shared_key, local_key = self._keys(key, version, generation)
+        self.shared.set(shared_key, value, timeout, version=version)
+        if timeout is not None and timeout is not DEFAULT_TIMEOUT and timeout <= 0:
+            self._local_delete(local_key)
+        else:
+            self._local_set(local_key, value, namespace, generation, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        namespace = namespace_of(key)
+        generation = self._generation(namespace)
+        shared_key, local_key = self._keys(key, version, generation)
+        added = self.shared.add(shared_key, value, timeout, version=version)
+        if added:
+            self._local_set(local_key, value, namespace, generation, timeout)
+        else:
+            self._local_delete(local_key)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        # counters are only ever changed in L2, which keeps incr atomic when L2 is Redis
+        namespace = namespace_of(key)
+        generation = self._generation(namespace)
+        shared_key, local_key = self._keys(key, version, generation)
+        try:
+            value = self.shared.incr(shared_key, delta, version=version)
+        except ValueError:
+            self._local_delete(local_key)
+            raise
+        self._local_set(local_key, value, namespace, generation)
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        generation = self._generation(namespace_of(key))
+        shared_key, _ = self._keys(key, version, generation)
+        return self.shared.touch(shared_key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        generation = self._generation(namespace_of(key))
+        shared_key, local_key = self._keys(key, version, generation)
+        self._local_delete(local_key)
+        return self.shared.delete(shared_key, version=version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version=version) is not MISSING
+
+    def clear(self):
+        with self.local.lock:
+            self.local.entries.clear()
+            self.local.generations.clear()
+            self.local.stats.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+    def stats(self):
+        """Lookups in this process by namespace: L1 hits, L2 hits and misses."""
+        with self.local.lock:
+            stats = {namespace: dict(counts) for namespace, counts in sorted(self.local.stats.items())}
+            entries = {}
+            for item in self.local.entries.values():
+                entries[item[2]] = entries.get(item[2], 0) + 1
+        for namespace, counts in stats.items():
+            lookups = counts['local_hits'] + counts['shared_hits'] + counts['misses']
+            counts['hit_ratio'] = (counts['local_hits'] + counts['shared_hits']) / lookups if lookups else 0.0
+            counts['local_entries'] = entries.get(namespace, 0)
+        return stats
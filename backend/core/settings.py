@@ -53,6 +53,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'chat.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -61,7 +62,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.middleware.AsyncWhiteNoiseMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -150,14 +151,176 @@ STATIC_URL = 'static/'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # trusts the signed token instead of loading the user; admin checks use its role claim (chat.auth)
+        'rest_framework_simplejwt.authentication.JWTStatelessUserAuthentication',
     )
 }
 
-RATELIMIT_USE_CACHE = 'default'
+SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'chat.auth.RoleTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'chat.auth.RoleTokenRefreshSerializer',
+}
+
+REDIS_URL = os.getenv('REDIS_URL')
+
+# rate limiting (chat.ratelimit). 'cache' keeps counters in the RATELIMIT_USE_CACHE
+# cache, Redis when REDIS_URL is set; 'database' keeps them in the RateLimitCounter
+# table. Without Redis that cache is per process, so each worker would allow the full
+# rate: the default is then 'database', shared by all workers.
+# RATELIMIT_RATES is requests/period per route.
+RATELIMIT_BACKEND = os.getenv('RATELIMIT_BACKEND', 'cache' if REDIS_URL else 'database')
+RATELIMIT_USE_CACHE = 'ratelimit'
+RATELIMIT_RATES = {
+    'chat': os.getenv('RATELIMIT_CHAT', '10/min'),
+    'chat_stream': os.getenv('RATELIMIT_CHAT_STREAM', '10/min'),
+}
+
+# public FAQ list: rendered bodies are cached per FAQ version for CACHE_TTL seconds,
+# browsers and nginx may reuse a response for MAX_AGE seconds before revalidating
+FAQ_LIST = {
+    'CACHE_TTL': int(os.getenv('FAQ_LIST_CACHE_TTL', '3600')),
+    'MAX_AGE': int(os.getenv('FAQ_LIST_MAX_AGE', '60')),
+    'PAGE_SIZE': 50,
+    'MAX_PAGE_SIZE': 200,
+}
+
+# the FAQ version lives in the database; each process re-reads it at most every
+# FAQ_VERSION_TTL seconds, so FAQ changes made by another process (worker, management
+# command) reach its index and FAQ list within that bound. With Redis the process that
+# made the change shares the new version at once.
+FAQ_VERSION_TTL = float(os.getenv('FAQ_VERSION_TTL', '2'))
+
+# how chat messages are matched against the knowledge base:
+# 'keyword' counts exact keyword hits, 'tfidf' ranks by TF-IDF cosine similarity.
+# THRESHOLD is the score needed to answer straight from an FAQ (None = backend default).
+CHAT_RETRIEVAL = {
+    'BACKEND': os.getenv('CHAT_RETRIEVAL_BACKEND', 'keyword'),
+    'THRESHOLD': float(os.getenv('CHAT_MATCH_THRESHOLD')) if os.getenv('CHAT_MATCH_THRESHOLD') else None,
+}
+
+# `manage.py mine_faq_candidates`: LLM-answered messages whose estimated term overlap
+# (Jaccard) reaches SIMILARITY join one candidate FAQ. The review endpoint lists
+# candidates seen at least MIN_COUNT times; SAMPLES other phrasings are kept per candidate.
+# A run stops at the first message logged less than LAG seconds ago: a row with a lower id
+# may still be in an uncommitted transaction (another worker's bulk insert, say), and a run
+# that moved past it would never mine it. Keep LAG well above the longest such transaction.
+FAQ_MINING = {
+    'SIMILARITY': float(os.getenv('FAQ_MINING_SIMILARITY', '0.5')),
+    'MIN_COUNT': int(os.getenv('FAQ_MINING_MIN_COUNT', '3')),
+    'LAG': float(os.getenv('FAQ_MINING_LAG', '60')),
+    'SAMPLES': 5,
+}
 
+# 'default' keeps a small in-process copy (L1) of what it stores in 'shared' (L2).
+# L2 is Redis when REDIS_URL is set, and other processes' changes show up within
+# LOCAL_TTL seconds; namespaces listed in LOCAL_TTL_BY_NAMESPACE get their own bound,
+# 0 meaning always read from L2. Without Redis, L2 is per-process memory too, so
+# workers don't see each other's cache changes (token versions, say) until
+# entries expire: set REDIS_URL whenever more than one worker serves traffic.
 CACHES = {
     'default': {
+        'BACKEND': 'core.cache.TieredCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'LOCAL_TTL': float(os.getenv('CACHE_LOCAL_TTL', '2')),
+            'LOCAL_MAX_ENTRIES': int(os.getenv('CACHE_LOCAL_MAX_ENTRIES', '5000')),
+            # a session's next turn may land on any worker
+            'LOCAL_TTL_BY_NAMESPACE': {'chat_memory': 0},
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'LOCATION': 'shared',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'ratelimit': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ratelimit',
+    },
+}
+
+# LLM gateway. TIMEOUT is the deadline in seconds for a whole call including retries;
+# the circuit breaker opens after BREAKER_THRESHOLD failures in a row and retries
+# upstream after BREAKER_RESET seconds. PROVIDER 'fake' answers offline after
+# FAKE_LATENCY seconds, for load tests.
+CHAT_LLM = {
+    'PROVIDER': os.getenv('CHAT_LLM_PROVIDER', 'groq'),
+    'MODEL': os.getenv('CHAT_LLM_MODEL', 'llama-3.1-8b-instant'),
+    'MAX_TOKENS': 300,
+    'TEMPERATURE': 0.7,
+    'TIMEOUT': float(os.getenv('CHAT_LLM_TIMEOUT', '15')),
+    'MAX_RETRIES': int(os.getenv('CHAT_LLM_MAX_RETRIES', '2')),
+    'BACKOFF': 0.25,
+    'POOL_SIZE': int(os.getenv('CHAT_LLM_POOL_SIZE', '20')),
+    'BREAKER_THRESHOLD': 5,
+    'BREAKER_RESET': 30,
+    'FAKE_LATENCY': float(os.getenv('CHAT_LLM_FAKE_LATENCY', '0.5')),
+    'FAKE_ERROR_RATE': float(os.getenv('CHAT_LLM_FAKE_ERROR_RATE', '0')),
+}
+
+# cache of LLM answers, keyed on the normalised question and the FAQs given as context.
+# Every message after a session's first comes with history, so HISTORY decides how much
+# repeat traffic the cache (and request coalescing) still sees:
+#   'followup' - only follow-ups ("is it free?", short messages) are keyed on the history;
+#                stand-alone questions share one answer whatever was asked before it
+#   'key'      - always key on the history: no stale context, but few hits past turn one
+#   'bypass'   - never cache a message that has history
+CHAT_ANSWER_CACHE = {
+    'ENABLED': os.getenv('CHAT_ANSWER_CACHE', 'True') == 'True',
+    'TTL': int(os.getenv('CHAT_ANSWER_CACHE_TTL', '3600')),
+    # per worker: past this the least recently used answer it stored is deleted
+    'MAX_ENTRIES': int(os.getenv('CHAT_ANSWER_CACHE_SIZE', '1000')),
+    'HISTORY': os.getenv('CHAT_ANSWER_CACHE_HISTORY', 'followup'),
+}
+
+# admin analytics: the dashboard is cached for CACHE_TTL seconds, so new chats show up within that
+CHAT_ANALYTICS = {
+    'CACHE_TTL': int(os.getenv('CHAT_ANALYTICS_CACHE_TTL', '60')),
+}
+
+# token budget for the knowledge base excerpts included in the LLM prompt
+CHAT_PROMPT = {
+    'FAQ_CONTEXT_TOKENS': int(os.getenv('CHAT_FAQ_CONTEXT_TOKENS', '500')),
+}
+
+# server-side conversation memory sent to the LLM with each message. The most recent
+# turns are kept verbatim up to HISTORY_TOKENS; older ones are folded into a short
+# summary of up to SUMMARY_TOKENS. MAX_TURNS caps how many rows are loaded per session.
+CHAT_MEMORY = {
+    'HISTORY_TOKENS': int(os.getenv('CHAT_HISTORY_TOKENS', '600')),
+    'SUMMARY_TOKENS': int(os.getenv('CHAT_SUMMARY_TOKENS', '150')),
+    'MAX_TURNS': 10,
+    'TTL': 3600,
+}
+
+# how chat messages are written to the log. 'sync' inserts each row before responding;
+# 'buffered' queues rows for a background thread that bulk-inserts them every
+# BATCH_SIZE rows or FLUSH_INTERVAL seconds (and on shutdown).
+CHAT_LOG = {
+    'MODE': os.getenv('CHAT_LOG_MODE', 'sync'),
+    'BATCH_SIZE': int(os.getenv('CHAT_LOG_BATCH_SIZE', '100')),
+    'FLUSH_INTERVAL': float(os.getenv('CHAT_LOG_FLUSH_INTERVAL', '1.0')),
+    'MAX_QUEUE': 10000,
+}
+
+# identical questions that arrive while the first is still waiting on the LLM share its
+# answer; this is the longest (seconds) they wait before falling back
+CHAT_COALESCE_WAIT = float(os.getenv('CHAT_COALESCE_WAIT', '20'))
+
+# startup warm-up (chat.warmup): core.wsgi / core.asgi build the FAQ index and import
+# the views before the first request; /ready answers 503 until that has finished
+CHAT_WARMUP = {
+    'ENABLED': os.getenv('CHAT_WARMUP', 'True') == 'True',
+}
+
+# request metrics (chat.metrics, served at /metrics); requests slower than
+# SLOW_REQUEST seconds are logged with a per-stage breakdown
+METRICS = {
+    'SLOW_REQUEST': float(os.getenv('SLOW_REQUEST_SECONDS', '1.0')),
 }
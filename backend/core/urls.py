@@ -1,9 +1,12 @@
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from chat.views import MetricsView, ReadyView
 
 urlpatterns = [
     path('api/', include('faq.urls')),
     path('api/token/', TokenObtainPairView.as_view()),       # login
     path('api/token/refresh/', TokenRefreshView.as_view()),  # refresh token
     path('api/', include('chat.urls')),
+    path('metrics', MetricsView.as_view()),                  # prometheus, admin only
+    path('ready', ReadyView.as_view()),                      # readiness probe
 ]
\ No newline at end of file
@@ -0,0 +1,111 @@
+import csv
+import io
+import json
+from django.db import transaction
+from .models import KnowledgeBase, bump_faq_version, faqs_bulk_changed
+from .serializers import KnowledgeBaseSerializer
+from .text import normalize_keywords
+
+FIELDS = ['id', 'category', 'question', 'answer', 'keywords']
+FORMATS = ('json', 'csv')
+
+
+class FAQImportError(Exception):
+    """Raised with a list of per-row problems; nothing is written."""
+
+    def __init__(self, errors):
+        super().__init__(f'{len(errors)} invalid rows')
+        self.errors = errors
+
+
+def parse_rows(text, fmt):
+    """Turn a JSON array or a CSV document (with a header row) into a list of dicts."""
+    if fmt == 'csv':
+        return list(csv.DictReader(io.StringIO(text)))
+    try:
+        rows = json.loads(text)
+    except ValueError as e:
+        raise FAQImportError([{'row': None, 'error': f'Invalid JSON: {e}'}])
+    return rows
+
+
+def import_faqs(rows):
+    """Validate every row, then create or update them all in one transaction.
+
+    A row updates an existing FAQ when its id matches one, or otherwise when an
+    FAQ with the same category and question exists; anything else is created.
+    The FAQ version is bumped and the retrieval indexes rebuilt once at the end
+    instead of once per row.
+    """
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise FAQImportError([{'row': None, 'error': 'Expected a list of FAQ objects'}])
+
+    serializer = KnowledgeBaseSerializer(data=rows, many=True)
+    if not serializer.is_valid():
+        errors = serializer.errors
+        # recent DRF versions key list errors by row index, older ones return a list
+        items = errors.items() if isinstance(errors, dict) else enumerate(errors)
+        raise FAQImportError([{'row': i, 'error': error} for i, error in items if error])
+
+    existing = {faq.pk: faq for faq in KnowledgeBase.objects.all()}
+    by_question = {(faq.category, faq.question): faq for faq in existing.values()}
+    to_create = []
+    to_update = {}
+    for row, data in zip(rows, serializer.validated_data):
+        faq = existing.get(_row_id(row)) or by_question.get((data['category'], data['question']))
+        if faq is None:
+            faq = KnowledgeBase(**data)
+            to_create.append(faq)
+        else:
+            for field, value in data.items():
+                setattr(faq, field, value)
+            if faq.pk is not None:
+                to_update[faq.pk] = faq
+        # later rows with the same question update this one rather than duplicating it
+        by_question[(faq.category, faq.question)] = faq
+
+    # bulk queries don't call save(), so normalise the keywords here
+    for faq in to_create + list(to_update.values()):
+        faq.normalized_keywords = normalize_keywords(faq.keywords)
+    with transaction.atomic():
+        KnowledgeBase.objects.bulk_create(to_create)
+        KnowledgeBase.objects.bulk_update(
+            list(to_update.values()), ['category', 'question', 'answer', 'keywords', 'normalized_keywords']
+        )
+        # bulk queries skip the model signals, so announce the change once ourselves
+        transaction.on_commit(_announce)
+    return {'created': len(to_create), 'updated': len(to_update)}
+
+
+def _row_id(row):
+    try:
+        return int(row.get('id'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _announce():
+    bump_faq_version()
+    faqs_bulk_changed.send(sender=KnowledgeBase)
+
+
+class Echo:
+    """File-like object whose write() hands the line back, so csv.writer can feed a stream."""
+
+    def write(self, value):
+        return value
+
+
+def export_faqs(fmt):
+    """Yield every FAQ as a JSON array or CSV document, a row at a time."""
+    rows = KnowledgeBase.objects.order_by('id').values_list(*FIELDS).iterator(chunk_size=2000)
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(FIELDS)
+        for row in rows:
+            yield writer.writerow(row)
+        return
+    yield '['
+    for i, row in enumerate(rows):
+        yield (',\n' if i else '\n') + json.dumps(dict(zip(FIELDS, row)))
+    yield '\n]\n'
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from faq.bulk import FORMATS, export_faqs
+
+
+class Command(BaseCommand):
+    help = 'Write every FAQ as a JSON array or CSV, in the format import_faqs reads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, default='json')
+        parser.add_argument('--output', help='File to write (default: stdout).')
+
+    def handle(self, *args, **options):
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as out:
+                out.writelines(export_faqs(options['format']))
+        else:
+            for chunk in export_faqs(options['format']):
+                self.stdout.write(chunk, ending='')
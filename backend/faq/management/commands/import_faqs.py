@@ -0,0 +1,27 @@
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from faq.bulk import FORMATS, FAQImportError, import_faqs, parse_rows
+
+
+class Command(BaseCommand):
+    help = 'Create or update FAQs from a JSON array or CSV file in one transaction.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension.')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        fmt = options['format'] or ('csv' if path.suffix.lower() == '.csv' else 'json')
+        try:
+            rows = parse_rows(path.read_text(encoding='utf-8-sig'), fmt)
+            result = import_faqs(rows)
+        except OSError as e:
+            raise CommandError(e)
+        except FAQImportError as e:
+            for problem in e.errors:
+                self.stderr.write(f"row {problem['row']}: {problem['error']}")
+            raise CommandError(f'{len(e.errors)} invalid rows, nothing was imported.')
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported FAQs: {result['created']} created, {result['updated']} updated."
+        ))
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.2 on 2026-10-17 23:11
+
+from django.db import migrations, models
+
+from faq.text import normalize_keywords
+
+
+def fill_normalized_keywords(apps, schema_editor):
+    KnowledgeBase = apps.get_model('faq', 'KnowledgeBase')
+    faqs = list(KnowledgeBase.objects.all())
+    for faq in faqs:
+        faq.normalized_keywords = normalize_keywords(faq.keywords)
+    KnowledgeBase.objects.bulk_update(faqs, ['normalized_keywords'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faq', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knowledgebase',
+            name='normalized_keywords',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_normalized_keywords, migrations.RunPython.noop),
+    ]
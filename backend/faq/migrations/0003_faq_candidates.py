@@ -0,0 +1,46 @@
+# Generated by Django 6.0.2 on 2026-10-17 23:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faq', '0002_knowledgebase_normalized_keywords'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CandidateMiningRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('last_chat_id', models.BigIntegerField(default=0)),
+                ('messages', models.PositiveIntegerField(default=0)),
+                ('created', models.PositiveIntegerField(default=0)),
+                ('updated', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FAQCandidate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question', models.TextField()),
+                ('answer', models.TextField()),
+                ('keywords', models.CharField(blank=True, max_length=255)),
+                ('category', models.CharField(blank=True, max_length=100)),
+                ('count', models.PositiveIntegerField(default=1)),
+                ('samples', models.JSONField(default=list)),
+                ('term_counts', models.JSONField(default=dict)),
+                ('signature', models.BinaryField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('accepted', 'Accepted'), ('rejected', 'Rejected')], default='pending', max_length=10)),
+                ('first_seen', models.DateTimeField()),
+                ('last_seen', models.DateTimeField()),
+                ('faq', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='faq.knowledgebase')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', '-count'], name='faq_candidate_queue_idx')],
+            },
+        ),
+    ]
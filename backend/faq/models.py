@@ -1,10 +1,122 @@
-from django.db import models
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+from .text import normalize_keywords
+
+FAQ_VERSION_KEY = 'faq_version'
+
+# sent after a bulk import commits, since bulk_create/bulk_update skip post_save
+faqs_bulk_changed = Signal()
 
 class KnowledgeBase(models.Model):
     category = models.CharField(max_length=100)
     question = models.TextField()
     answer = models.TextField()
     keywords = models.CharField(max_length=255)
+    # keywords run through faq.text once here instead of on every lookup
+    normalized_keywords = models.CharField(max_length=255, blank=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        self.normalized_keywords = normalize_keywords(self.keywords)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'keywords' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'normalized_keywords'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
-        return self.question
\ No newline at end of file
+        return self.question
+
+# a cluster of similar questions the LLM had to answer, proposed as a new FAQ.
+# Filled by `manage.py mine_faq_candidates`; admins accept or reject them.
+class FAQCandidate(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('accepted', 'Accepted'),
+        ('rejected', 'Rejected'),
+    ]
+    question = models.TextField()                   # the first message seen in the cluster
+    answer = models.TextField()                     # the LLM's answer to it
+    keywords = models.CharField(max_length=255, blank=True)  # most common terms across the cluster
+    category = models.CharField(max_length=100, blank=True)  # of the closest existing FAQ, if any
+    count = models.PositiveIntegerField(default=1)  # messages in the cluster
+    samples = models.JSONField(default=list)        # a few other phrasings
+    term_counts = models.JSONField(default=dict)
+    signature = models.BinaryField()                # MinHash of the first message's terms
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    faq = models.ForeignKey(KnowledgeBase, null=True, blank=True, on_delete=models.SET_NULL)
+    first_seen = models.DateTimeField()
+    last_seen = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # the review queue: pending clusters, most frequent first
+            models.Index(fields=['status', '-count'], name='faq_candidate_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.question} ({self.count})"
+
+# one run of the candidate miner; the last run's last_chat_id is where the next one starts
+class CandidateMiningRun(models.Model):
+    started_at = models.DateTimeField(auto_now_add=True)
+    last_chat_id = models.BigIntegerField(default=0)
+    messages = models.PositiveIntegerField(default=0)   # LLM-answered messages clustered
+    created = models.PositiveIntegerField(default=0)    # new candidates
+    updated = models.PositiveIntegerField(default=0)    # existing candidates that grew
+
+# the FAQ version in the database, where every process sees it: one row, bumped on each change.
+# Processes keep a copy in the cache for FAQ_VERSION_TTL seconds, so an edit made elsewhere
+# (another worker, `manage.py import_faqs`) is noticed within that bound even without Redis.
+class FAQVersion(models.Model):
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(null=True, blank=True)
+
+def _state(row):
+    return (row[0], row[1]) if row is not None else (0, None)
+
+def get_faq_state():
+    """(version, updated_at) of the knowledge base."""
+    state = cache.get(FAQ_VERSION_KEY)
+    if state is None:
+        state = _state(FAQVersion.objects.filter(pk=1).values_list('version', 'updated_at').first())
+        # add, not set: a bump that lands meanwhile must not be overwritten with the older value
+        cache.add(FAQ_VERSION_KEY, state, timeout=settings.FAQ_VERSION_TTL)
+    return state
+
+async def aget_faq_state():
+    state = await cache.aget(FAQ_VERSION_KEY)
+    if state is None:
+        state = _state(await FAQVersion.objects.filter(pk=1).values_list('version', 'updated_at').afirst())
+        await cache.aadd(FAQ_VERSION_KEY, state, timeout=settings.FAQ_VERSION_TTL)
+    return state
+
+def get_faq_version():
+    return get_faq_state()[0]
+
+async def aget_faq_version():
+    return (await aget_faq_state())[0]
+
+def get_faq_updated_at():
+    return get_faq_state()[1]
+
+def bump_faq_version():
+    # lets every process know its in-memory copy of the FAQs is out of date
+    now = timezone.now()
+    with transaction.atomic():
+        if not FAQVersion.objects.filter(pk=1).update(version=F('version') + 1, updated_at=now):
+            FAQVersion.objects.get_or_create(pk=1, defaults={'version': 0})
+            FAQVersion.objects.filter(pk=1).update(version=F('version') + 1, updated_at=now)
+        # the row stays locked until commit, so this is our own increment
+        state = _state(FAQVersion.objects.filter(pk=1).values_list('version', 'updated_at').first())
+    cache.set(FAQ_VERSION_KEY, state, timeout=settings.FAQ_VERSION_TTL)
+    return state[0]
+
+# bump the version whenever an FAQ is added, edited or removed
+@receiver(post_save, sender=KnowledgeBase)
+@receiver(post_delete, sender=KnowledgeBase)
+def faq_changed(sender, instance, **kwargs):
+    transaction.on_commit(bump_faq_version)
@@ -1,7 +1,15 @@
 from rest_framework import serializers
-from .models import KnowledgeBase
+from .models import FAQCandidate, KnowledgeBase
 
 class KnowledgeBaseSerializer(serializers.ModelSerializer):
     class Meta:
         model = KnowledgeBase
-        fields = '__all__'
\ No newline at end of file
+        fields = ['id', 'category', 'question', 'answer', 'keywords']
+
+class FAQCandidateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = FAQCandidate
+        fields = [
+            'id', 'question', 'answer', 'keywords', 'category', 'count',
+            'samples', 'first_seen', 'last_seen', 'status', 'faq',
+        ]
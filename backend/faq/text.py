@@ -0,0 +1,66 @@
+import re
+import unicodedata
+
+# one normalisation for everything that compares user text with the knowledge base:
+# keyword matching, TF-IDF retrieval and the answer cache key
+
+WORD_RE = re.compile(r'\w+')
+
+STOPWORDS = frozenset("""
+a an and are at be can do does for from how i in is it me my of on or
+the to what when where which who why will with you your
+""".split())
+
+
+def fold(text):
+    """Lower-case and strip accents, so "Café" and "cafe" compare equal."""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def words(text):
+    """Folded words with punctuation removed: "Fees?" -> ["fees"]."""
+    return WORD_RE.findall(fold(text))
+
+
+def stem(word):
+    # light plural folding so "fees"/"fee" and "courses"/"course" share a term
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def terms(text):
+    """Stemmed words without stopwords - the unit both matchers compare."""
+    return [stem(word) for word in words(text) if word not in STOPWORDS]
+
+
+def normalize(text):
+    """Canonical form of a message: folded words joined by single spaces."""
+    return ' '.join(words(text))
+
+
+def normalize_keywords(raw):
+    """"Tuition Fees, apply!" -> "tuition fee,apply".
+
+    Each comma-separated keyword becomes a phrase of terms; duplicates and
+    keywords made only of stopwords are dropped.
+    """
+    phrases = []
+    for keyword in raw.split(','):
+        phrase = ' '.join(terms(keyword))
+        if phrase and phrase not in phrases:
+            phrases.append(phrase)
+    return ','.join(phrases)
+
+
+def phrases_in(text, max_words):
+    """Every run of up to max_words consecutive terms in text, as space-joined phrases."""
+    found = set()
+    text_terms = terms(text)
+    for size in range(1, max_words + 1):
+        for i in range(len(text_terms) - size + 1):
+            found.add(' '.join(text_terms[i:i + size]))
+    return found
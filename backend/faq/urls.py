@@ -1,8 +1,15 @@
 from django.urls import path
-from .views import FAQListView, FAQAdminView, FAQAdminDetailView
+from .views import (
+    FAQListView, FAQAdminView, FAQAdminDetailView, FAQBulkView,
+    FAQCandidateListView, FAQCandidateAcceptView, FAQCandidateRejectView,
+)
 
 urlpatterns = [
     path('faqs/', FAQListView.as_view()),
     path('admin/faqs/', FAQAdminView.as_view()),
     path('admin/faqs/<int:pk>/', FAQAdminDetailView.as_view()),
-]
\ No newline at end of file
+    path('admin/faqs/bulk/', FAQBulkView.as_view()),
+    path('admin/faq-candidates/', FAQCandidateListView.as_view()),
+    path('admin/faq-candidates/<int:pk>/accept/', FAQCandidateAcceptView.as_view()),
+    path('admin/faq-candidates/<int:pk>/reject/', FAQCandidateRejectView.as_view()),
+]
@@ -1,25 +1,91 @@
+import hashlib
+import json
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from .models import KnowledgeBase
-from .serializers import KnowledgeBaseSerializer
+from rest_framework.permissions import AllowAny
+from chat.auth import IsAdminRole
+from .bulk import FORMATS, FAQImportError, export_faqs, import_faqs, parse_rows
+from .models import FAQCandidate, KnowledgeBase, get_faq_version, get_faq_updated_at
+from .serializers import FAQCandidateSerializer, KnowledgeBaseSerializer
+
+
+def _positive_int(value, default=None):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return default
+    return value if value > 0 else default
+
+
+def render_faq_list(category, page, page_size):
+    """Serialize one view of the FAQ list to JSON bytes.
+
+    Without a page the body is the plain list the FAQ page has always used;
+    with one it is wrapped with the total count and the next page number.
+    """
+    faqs = KnowledgeBase.objects.order_by('id')
+    if category:
+        faqs = faqs.filter(category__iexact=category)
+    if page is None:
+        data = KnowledgeBaseSerializer(faqs, many=True).data
+    else:
+        count = faqs.count()
+        start = (page - 1) * page_size
+        data = {
+            'count': count,
+            'page': page,
+            'next': page + 1 if start + page_size < count else None,
+            'results': KnowledgeBaseSerializer(faqs[start:start + page_size], many=True).data,
+        }
+    return json.dumps(data).encode()
+
 
 # Public - anyone can read FAQs
 class FAQListView(APIView):
+    """Rendered bodies are cached per FAQ version, so a page load costs one cache
+    read until an admin edits something; clients revalidate with the ETag."""
     permission_classes = [AllowAny]
 
     def get(self, request):
-        faqs = KnowledgeBase.objects.all()
-        serializer = KnowledgeBaseSerializer(faqs, many=True)
-        return Response(serializer.data)
+        config = settings.FAQ_LIST
+        category = request.query_params.get('category', '').strip()
+        page = _positive_int(request.query_params.get('page'))
+        page_size = None
+        if page is not None:
+            page_size = min(_positive_int(request.query_params.get('page_size'), config['PAGE_SIZE']),
+                            config['MAX_PAGE_SIZE'])
+
+        view = hashlib.blake2b(f'{category.lower()}|{page}|{page_size}'.encode(), digest_size=8).hexdigest()
+        key = f'faq_list:{get_faq_version()}:{view}'
+        cached = cache.get(key)
+        if cached is None:
+            body = render_faq_list(category, page, page_size)
+            etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+            last_modified = get_faq_updated_at() or timezone.now()
+            cached = (body, etag, int(last_modified.timestamp()))
+            cache.set(key, cached, config['CACHE_TTL'])
+        body, etag, last_modified = cached
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, public=True, max_age=config['MAX_AGE'])
+        return response
 
 # Admin only - manage FAQs
 class FAQAdminView(APIView):
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAdminRole]
 
     def post(self, request):
-        if request.user.profile.role != 'admin':
-            return Response({'error': 'Forbidden'}, status=403)
         serializer = KnowledgeBaseSerializer(data=request.data)
         if serializer.is_valid():
             serializer.save()
@@ -27,11 +93,9 @@ class FAQAdminView(APIView):
         return Response(serializer.errors, status=400)
 
 class FAQAdminDetailView(APIView):
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAdminRole]
 
     def put(self, request, pk):
-        if request.user.profile.role != 'admin':
-            return Response({'error': 'Forbidden'}, status=403)
         faq = KnowledgeBase.objects.get(pk=pk)
         serializer = KnowledgeBaseSerializer(faq, data=request.data)
         if serializer.is_valid():
@@ -40,7 +104,91 @@ class FAQAdminDetailView(APIView):
         return Response(serializer.errors, status=400)
 
     def delete(self, request, pk):
-        if request.user.profile.role != 'admin':
-            return Response({'error': 'Forbidden'}, status=403)
         KnowledgeBase.objects.get(pk=pk).delete()
-        return Response(status=204)
\ No newline at end of file
+        return Response(status=204)
+
+class FAQBulkView(APIView):
+    """Import many FAQs in one request (JSON array or CSV) and export them all for backups."""
+    permission_classes = [IsAdminRole]
+
+    def get(self, request):
+        fmt = request.query_params.get('export', 'json')
+        if fmt not in FORMATS:
+            return Response({'error': 'export must be json or csv'}, status=400)
+        content_type = 'text/csv' if fmt == 'csv' else 'application/json'
+        response = StreamingHttpResponse(export_faqs(fmt), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="faqs.{fmt}"'
+        return response
+
+    def post(self, request):
+        try:
+            if request.content_type.startswith('text/csv'):
+                rows = parse_rows(request.body.decode('utf-8-sig'), 'csv')
+            elif request.content_type.startswith('multipart/'):
+                upload = request.FILES.get('file')
+                if upload is None:
+                    return Response({'error': 'Upload the file as "file"'}, status=400)
+                fmt = 'csv' if upload.name.lower().endswith('.csv') else 'json'
+                rows = parse_rows(upload.read().decode('utf-8-sig'), fmt)
+            else:
+                rows = request.data
+            result = import_faqs(rows)
+        except FAQImportError as e:
+            return Response({'errors': e.errors}, status=400)
+        except UnicodeDecodeError:
+            return Response({'error': 'File must be UTF-8'}, status=400)
+        return Response(result)
+
+class FAQCandidateListView(APIView):
+    """The review queue of mined FAQ candidates, most frequent first."""
+    permission_classes = [IsAdminRole]
+
+    def get(self, request):
+        status = request.query_params.get('status', 'pending')
+        if status not in dict(FAQCandidate.STATUS_CHOICES):
+            return Response({'error': 'status must be pending, accepted or rejected'}, status=400)
+        try:
+            min_count = int(request.query_params.get('min_count', settings.FAQ_MINING['MIN_COUNT']))
+        except ValueError:
+            return Response({'error': 'min_count must be an integer'}, status=400)
+        candidates = FAQCandidate.objects.filter(status=status, count__gte=min_count).order_by('-count', 'id')
+        return Response(FAQCandidateSerializer(candidates, many=True).data)
+
+class FAQCandidateAcceptView(APIView):
+    """Turn a candidate into an FAQ; question, answer, keywords and category may be edited on the way."""
+    permission_classes = [IsAdminRole]
+
+    def post(self, request, pk):
+        if not isinstance(request.data, dict):
+            return Response({'error': 'Send a JSON object'}, status=400)
+        with transaction.atomic():
+            # locked so two concurrent accepts can't both create an FAQ
+            candidate = FAQCandidate.objects.select_for_update().get(pk=pk)
+            if candidate.status != 'pending':
+                return Response({'error': f'Candidate is already {candidate.status}'}, status=409)
+            data = {
+                'question': candidate.question,
+                'answer': candidate.answer,
+                'keywords': candidate.keywords,
+                'category': candidate.category,
+            }
+            data.update({k: v for k, v in request.data.items() if k in data})
+            serializer = KnowledgeBaseSerializer(data=data)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=400)
+            candidate.faq = serializer.save()
+            candidate.status = 'accepted'
+            candidate.save(update_fields=['faq', 'status'])
+        return Response(serializer.data, status=201)
+
+class FAQCandidateRejectView(APIView):
+    permission_classes = [IsAdminRole]
+
+    def post(self, request, pk):
+        candidate = FAQCandidate.objects.get(pk=pk)
+        # conditional, so it can't overwrite a concurrent accept
+        if not FAQCandidate.objects.filter(pk=pk, status='pending').update(status='rejected'):
+            candidate.refresh_from_db(fields=['status'])
+            return Response({'error': f'Candidate is already {candidate.status}'}, status=409)
+        candidate.status = 'rejected'
+        return Response(FAQCandidateSerializer(candidate).data)
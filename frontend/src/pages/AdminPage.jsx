@@ -6,6 +6,7 @@ function AdminPage() {
     const [activeTab, setActiveTab] = useState('faqs');
     const [faqs, setFaqs] = useState([]);
     const [logs, setLogs] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
     const [loading, setLoading] = useState(false);
     const [error, setError] = useState('');
 
@@ -32,11 +33,13 @@ function AdminPage() {
         }
     };
 
-    const fetchLogs = async () => {
+    // logs come one page at a time; pass the cursor to append the next page
+    const fetchLogs = async (cursor = null) => {
         setLoading(true);
         try {
-            const res = await api.get('/admin/chat-logs/');
-            setLogs(res.data);
+            const res = await api.get('/admin/chat-logs/', { params: cursor ? { cursor } : {} });
+            setLogs(prev => cursor ? [...prev, ...res.data.results] : res.data.results);
+            setNextCursor(res.data.next_cursor);
         } catch {
             setError('Failed to load chat logs');
         } finally {
@@ -186,6 +189,11 @@ function AdminPage() {
                             <p style={styles.keywords}>{new Date(log.timestamp).toLocaleString()}</p>
                         </div>
                     ))}
+                    {nextCursor && (
+                        <button style={styles.button} onClick={() => fetchLogs(nextCursor)} disabled={loading}>
+                            Load more
+                        </button>
+                    )}
                 </div>
             )}
         </div>
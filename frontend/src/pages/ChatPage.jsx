@@ -10,8 +10,9 @@ function ChatPage() {
     const [loading, setLoading] = useState(false);
     const bottomRef = useRef(null);
 
-    // generate a simple session id once per page load
-    const sessionId = useState(() => 'session-' + Date.now())[0];
+    // a random session id once per page load; the server hands this session's
+    // history to whoever sends the id, so it must not be guessable
+    const sessionId = useState(() => crypto.randomUUID())[0];
 
     // scroll to bottom whenever messages change
     useEffect(() => {
@@ -22,20 +23,15 @@ function ChatPage() {
         if (!input.trim()) return;
 
         const userMessage = { from: 'user', text: input };
-        const updatedMessages = [...messages, userMessage];
         setMessages(prev => [...prev, userMessage]);
         setInput('');
         setLoading(true);
 
         try {
+            // the server keeps the conversation history for this session_id
             const res = await api.post('/chat/', {
                 message: input,
-                session_id: sessionId,
-                // send last 10 messages as history (sliding window)
-                history: updatedMessages.slice(-10).map(m => ({
-                    role: m.from === 'user' ? 'user' : 'assistant',
-                    content: m.text
-                }))
+                session_id: sessionId
             });
 
             const botMessage = { from: 'bot', text: res.data.response };